@@ -0,0 +1,187 @@
+"""
+Implementations of the graph visualization result shaping before they were optimized, kept as the
+baseline the optimized versions in src.graph_query and src.chunkid_entities are measured against.
+Only used by the benchmarks; do not import from application code.
+"""
+
+import logging
+
+from neo4j import time
+
+
+def process_node(node):
+    """
+    Processes a node from a Neo4j database, extracting its ID, labels, and properties,
+    while omitting certain properties like 'embedding' and 'text'.
+
+    Returns:
+    dict: A dictionary with the node's element ID, labels, and other properties,
+          with datetime objects formatted as ISO strings.
+    """
+    try:
+        labels = set(node.labels)
+        labels.discard("__Entity__")
+        if not labels:
+            labels.add('*')
+        
+        node_element = {
+            "element_id": node.element_id,
+            "labels": list(labels),
+            "properties": {}
+        }
+        # logging.info(f"Processing node with element ID: {node.element_id}")
+
+        for key in node:
+            if key in ["embedding", "text", "summary"]:
+                continue
+            value = node.get(key)
+            if isinstance(value, time.DateTime):
+                node_element["properties"][key] = value.isoformat()
+                # logging.debug(f"Processed datetime property for {key}: {value.isoformat()}")
+            else:
+                node_element["properties"][key] = value
+
+        return node_element
+    except Exception as e:
+        logging.error("graph_query module:An unexpected error occurred while processing the node")
+
+def extract_node_elements(records):
+    """
+    Extracts and processes unique nodes from a list of records, avoiding duplication by tracking seen element IDs.
+
+    Returns:
+    list of dict: A list containing processed node dictionaries.
+    """
+    node_elements = []
+    seen_element_ids = set()  
+
+    try:
+        for record in records:
+            nodes = record.get("nodes", [])
+            if not nodes:
+                # logging.debug(f"No nodes found in record: {record}")
+                continue
+
+            for node in nodes:
+                if node.element_id in seen_element_ids:
+                    # logging.debug(f"Skipping already processed node with ID: {node.element_id}")
+                    continue
+                seen_element_ids.add(node.element_id)
+                node_element = process_node(node) 
+                node_elements.append(node_element)
+                # logging.info(f"Processed node with ID: {node.element_id}")
+
+        return node_elements
+    except Exception as e:
+        logging.error("graph_query module: An error occurred while extracting node elements from records")
+
+def extract_relationships(records):
+    """
+    Extracts and processes relationships from a list of records, ensuring that each relationship is processed
+    only once by tracking seen element IDs.
+
+    Returns:
+    list of dict: A list containing dictionaries of processed relationships.
+    """
+    all_relationships = []
+    seen_element_ids = set()
+
+    try:
+        for record in records:
+            relationships = []
+            relations = record.get("rels", [])
+            if not relations:
+                continue
+
+            for relation in relations:
+                if relation.element_id in seen_element_ids:
+                    # logging.debug(f"Skipping already processed relationship with ID: {relation.element_id}")
+                    continue
+                seen_element_ids.add(relation.element_id)
+
+                try:
+                    nodes = relation.nodes
+                    if len(nodes) < 2:
+                        logging.warning(f"Relationship with ID {relation.element_id} does not have two nodes.")
+                        continue
+
+                    relationship = {
+                        "element_id": relation.element_id,
+                        "type": relation.type,
+                        "start_node_element_id": process_node(nodes[0])["element_id"],
+                        "end_node_element_id": process_node(nodes[1])["element_id"],
+                    }
+                    relationships.append(relationship)
+
+                except Exception as inner_e:
+                    logging.error(f"graph_query module: Failed to process relationship with ID {relation.element_id}. Error: {inner_e}", exc_info=True)
+            all_relationships.extend(relationships)
+        return all_relationships
+    except Exception as e:
+        logging.error("graph_query module: An error occurred while extracting relationships from records", exc_info=True)
+
+
+def extract_graph_elements(records):
+    """
+    Shapes GRAPH_QUERY records as get_graph_results did when the query returned whole nodes and relationships.
+
+    Returns:
+    tuple: The list of node dictionaries and the list of relationship dictionaries.
+    """
+    return extract_node_elements(records), extract_relationships(records)
+
+
+def process_records(records):
+    """
+    Processes a record to extract and organize node and relationship data.
+    """
+    try:            
+        nodes = []
+        relationships = []
+        seen_nodes = set()
+        seen_relationships = set()
+
+        for record in records:
+            for element in record["entities"]:
+                start_node = element['startNode']
+                end_node = element['endNode']
+                relationship = element['relationship']
+
+                if start_node['element_id'] not in seen_nodes:
+                    if "labels" in start_node.keys():
+                        labels = set(start_node["labels"])
+                        labels.discard("__Entity__")
+                        if not labels:
+                            labels.add('*')
+                        start_node["labels"] = list(labels)
+                    nodes.append(start_node)
+                    seen_nodes.add(start_node['element_id'])
+
+                if end_node['element_id'] not in seen_nodes:
+                    if "labels" in end_node.keys():
+                        labels = set(end_node["labels"])
+                        labels.discard("__Entity__")
+                        if not labels:
+                            labels.add('*')
+                        end_node["labels"] = list(labels)
+                    nodes.append(end_node)
+                    seen_nodes.add(end_node['element_id'])
+
+                if relationship['element_id'] not in seen_relationships:
+                    relationships.append({
+                        "element_id": relationship['element_id'],
+                        "type": relationship['type'],
+                        "start_node_element_id": start_node['element_id'],
+                        "end_node_element_id": end_node['element_id']
+                    })
+                    seen_relationships.add(relationship['element_id'])
+        output = {
+            "nodes": nodes,
+            "relationships": relationships
+        }
+
+        return output
+    except Exception as e:
+        logging.error(f"chunkid_entities module: An error occurred while extracting the nodes and relationships from records: {e}")
+
+
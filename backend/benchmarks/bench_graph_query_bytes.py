@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Compares the Bolt payload of the graph visualization query when it returns whole nodes, as it did before,
+with the projection of display properties GRAPH_QUERY now returns.
+
+Usage:
+    python benchmarks/bench_graph_query_bytes.py [--scales 1000 3000 10000] [--dimension 384]
+    python benchmarks/bench_graph_query_bytes.py --neo4j-uri bolt://localhost:7687 --username neo4j --password ... --documents a.pdf b.pdf
+
+Without a database, synthetic graphs of the given numbers of nodes and relationships are measured, one
+chunk in ten carrying an embedding and its text. With one, both queries run on the given documents.
+Payload sizes are the PackStream encoded sizes of the returned values, which is what Bolt sends.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from neo4j import time as neo4j_time
+from neo4j.graph import Node, Relationship
+
+from graph_records import build_graph_records, distinct, project_node, project_relationship
+from src.graph_query import get_node_projection_params
+from src.shared.constants import GRAPH_CHUNK_LIMIT, GRAPH_PATHS_QUERY, GRAPH_QUERY
+
+# The end of GRAPH_QUERY before it projected display properties
+LEGACY_GRAPH_QUERY = GRAPH_PATHS_QUERY + """
+CALL {{
+  WITH paths
+  UNWIND paths AS path
+  UNWIND nodes(path) AS node
+  WITH distinct node
+  RETURN collect(node) AS nodes
+}}
+
+CALL {{
+  WITH paths
+  UNWIND paths AS path
+  UNWIND relationships(path) AS rel
+  RETURN collect(distinct rel) AS rels
+}}
+
+RETURN nodes, rels
+"""
+
+
+def header_size(length, tiny=16):
+    if length < tiny:
+        return 1
+    return 2 if length < 0x100 else 3 if length < 0x10000 else 5
+
+
+def int_size(value):
+    if -16 <= value < 128:
+        return 1
+    if -128 <= value < 128:
+        return 2
+    return 3 if -0x8000 <= value < 0x8000 else 5 if -0x80000000 <= value < 0x80000000 else 9
+
+
+def packstream_size(value):
+    """Returns the size in bytes of a value encoded with PackStream, as sent by Bolt 5."""
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, int):
+        return int_size(value)
+    if isinstance(value, float):
+        return 9
+    if isinstance(value, str):
+        encoded = len(value.encode("utf-8"))
+        return (1 if encoded < 16 else header_size(encoded)) + encoded
+    if isinstance(value, (list, tuple, frozenset, set)):
+        return header_size(len(value)) + sum(packstream_size(item) for item in value)
+    if isinstance(value, dict):
+        return header_size(len(value)) + sum(packstream_size(key) + packstream_size(item) for key, item in value.items())
+    if isinstance(value, Node):
+        # Structure of id, labels, properties and element id
+        return 2 + int_size(value.id) + packstream_size(list(value.labels)) + packstream_size(dict(value)) + packstream_size(value.element_id)
+    if isinstance(value, Relationship):
+        # Structure of id, start and end ids, type, properties, and the three element ids
+        return (2 + int_size(value.id) + 2 * 9 + packstream_size(value.type) + packstream_size(dict(value))
+                + packstream_size(value.element_id) + packstream_size(value.start_node.element_id)
+                + packstream_size(value.end_node.element_id))
+    if isinstance(value, neo4j_time.DateTime):
+        # Structure of seconds, nanoseconds and time zone
+        return 2 + 9 + 5 + 5
+    return packstream_size(str(value))
+
+
+def measure_synthetic(scale, dimension):
+    records = build_graph_records(scale)
+    nodes = distinct(node for record in records for node in record["nodes"])
+    relationships = distinct(relationship for record in records for relationship in record["rels"])
+    for node in nodes:
+        if "embedding" in node:
+            node._properties["embedding"] = [0.1] * dimension
+    before = packstream_size({"nodes": nodes, "rels": relationships})
+    after = packstream_size({"nodes": [project_node(node) for node in nodes],
+                             "rels": [project_relationship(relationship) for relationship in relationships]})
+    return {"nodes": len(nodes), "relationships": len(relationships), "before": before, "after": after}
+
+
+def measure_database(args):
+    from neo4j import GraphDatabase
+
+    with GraphDatabase.driver(args.neo4j_uri, auth=(args.username, args.password)) as driver:
+        results = {}
+        for name, query, params in (("before", LEGACY_GRAPH_QUERY, {}), ("after", GRAPH_QUERY, get_node_projection_params())):
+            start = time.perf_counter()
+            records, _, _ = driver.execute_query(query.format(graph_chunk_limit=GRAPH_CHUNK_LIMIT), document_names=args.documents,
+                                                 database_=args.database, **params)
+            results[f"{name}_seconds"] = time.perf_counter() - start
+            results[name] = sum(packstream_size(record.values()) for record in records)
+            results["nodes"] = sum(len(record["nodes"]) for record in records)
+            results["relationships"] = sum(len(record["rels"]) for record in records)
+    return results
+
+
+def report(label, result):
+    saved = 1 - result["after"] / result["before"] if result["before"] else 0
+    print(f"{label:>12} {result['nodes']:>8} {result['relationships']:>14} {result['before'] / 1e6:>12.2f} "
+          f"{result['after'] / 1e6:>11.2f} {saved:>8.1%}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1000, 3000, 10000], help="nodes and relationships of the synthetic graphs")
+    parser.add_argument("--dimension", type=int, default=384, help="embedding dimension of the synthetic chunks")
+    parser.add_argument("--neo4j-uri", help="measure the queries on this database instead of synthetic graphs")
+    parser.add_argument("--username", default=os.environ.get("NEO4J_USERNAME", "neo4j"))
+    parser.add_argument("--password", default=os.environ.get("NEO4J_PASSWORD"))
+    parser.add_argument("--database", default=os.environ.get("NEO4J_DATABASE", "neo4j"))
+    parser.add_argument("--documents", nargs="+", default=[], help="fileName of the documents to visualize")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    print(f"{'graph':>12} {'nodes':>8} {'relationships':>14} {'before (MB)':>12} {'after (MB)':>11} {'saved':>8}")
+    if args.neo4j_uri:
+        result = measure_database(args)
+        report("database", result)
+        print(f"query time: {result['before_seconds']:.2f}s before, {result['after_seconds']:.2f}s after")
+        return
+    for scale in args.scales:
+        report("synthetic", measure_synthetic(scale, args.dimension))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of processing_source with a deterministic fake LLM and fake embeddings.
+
+Usage:
+    python benchmarks/bench_ingestion.py [--chunks 10 100 1000 10000] [--llm-latency-ms 50] [--output results.json]
+    python benchmarks/bench_ingestion.py --chunks 1000 --neo4j-uri bolt://localhost:7687 --neo4j-password password
+
+Every chunk size runs the full extraction path (chunking, chunk writes, embedding, LLM extraction
+through the extraction scheduler, graph writes, chunk-entity links and counts) on a synthetic text
+document. Without --neo4j-uri the graph is an in-memory stand-in that accepts every query after
+--graph-latency-ms; with it, use a disposable Neo4j container since the benchmark documents and
+their entities are left in the database.
+
+Nothing is downloaded: the LLM and embedding model are fakes, and when the gpt2 tiktoken encoding is
+not cached locally, chunks are split on a byte tokenizer instead (reported as "tokenizer").
+
+With several chunk sizes, each one runs in its own process so that peak RSS is measured per size.
+Results are printed as JSON: per-stage busy time, chunks/sec, LLM requests and peak RSS.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+from functools import partial
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FAKE_MODEL = "fake"
+WORDS = ("graph", "entity", "relationship", "document", "chunk", "person", "organization", "place", "event",
+         "neo4j", "knowledge", "extraction", "model", "vector", "index", "community", "source", "node")
+
+
+def get_peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class ByteEncoding:
+    """Offline stand-in for a tiktoken encoding where every UTF-8 byte is one token."""
+
+    name = "bytes"
+
+    def encode_ordinary(self, text):
+        return list(text.encode("utf-8"))
+
+    def decode(self, tokens):
+        return bytes(tokens).decode("utf-8", errors="ignore")
+
+
+def get_encoding():
+    import tiktoken
+    try:
+        return tiktoken.get_encoding("gpt2")
+    except Exception as e:
+        logging.warning(f"gpt2 encoding is not available offline ({e}), splitting on bytes")
+        return ByteEncoding()
+
+
+def synthetic_pages(chunk_count, token_chunk_size, encoding):
+    """Yields chunk_count unique pages that each fit in one chunk of token_chunk_size tokens."""
+    from langchain.docstore.document import Document
+    page_tokens = max(1, token_chunk_size - 2)
+    for page_number in range(chunk_count):
+        rng = random.Random(page_number)
+        words = [f"page{page_number}"]
+        while len(words) < page_tokens:
+            words.append(f"{rng.choice(WORDS)}{rng.randrange(1000)}")
+        tokens = encoding.encode_ordinary(" ".join(words))[:page_tokens]
+        yield Document(page_content=encoding.decode(tokens), metadata={"source": "benchmark"})
+
+
+class FakeEmbeddings:
+    """Deterministic embeddings derived from a hash of each text, with an optional delay per call."""
+
+    def __init__(self, dimension, latency_seconds=0.0):
+        self.dimension = dimension
+        self.latency_seconds = latency_seconds
+
+    def _embed(self, text):
+        rng = random.Random(hashlib.sha1(text.encode("utf-8")).digest())
+        return [rng.uniform(-1, 1) for _ in range(self.dimension)]
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency_seconds)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class FakeChatModel:
+    model_name = FAKE_MODEL
+
+    def get_name(self):
+        return "FakeChatModel"
+
+
+class FakeGraphTransformer:
+    """
+    Replaces LLMGraphTransformer: each request waits latency_seconds and returns nodes_per_request
+    entities from a vocabulary of entity_vocabulary ids, linked by relationships_per_request relationships.
+    """
+
+    latency_seconds = 0.05
+    nodes_per_request = 8
+    relationships_per_request = 6
+    entity_vocabulary = 5000
+
+    def __init__(self, **kwargs):
+        pass
+
+    async def aprocess_response(self, document):
+        from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
+        await asyncio.sleep(self.latency_seconds)
+        rng = random.Random(hashlib.sha1(document.page_content.encode("utf-8")).digest())
+        nodes = [Node(id=f"Entity {rng.randrange(self.entity_vocabulary)}", type=rng.choice(("Person", "Organization", "Place")))
+                 for _ in range(self.nodes_per_request)]
+        relationships = [Relationship(source=nodes[index % len(nodes)], target=nodes[(index + 1) % len(nodes)], type="RELATED_TO")
+                         for index in range(self.relationships_per_request)] if len(nodes) > 1 else []
+        return GraphDocument(nodes=nodes, relationships=relationships, source=document)
+
+
+class StandInGraph:
+    """
+    In-memory replacement of Neo4jGraph for the extraction path: every query waits latency_seconds and
+    returns no rows, except the Document status and vector index lookups. Writes are only counted.
+    """
+
+    def __init__(self, latency_seconds=0.0):
+        self.latency_seconds = latency_seconds
+        self._database = "neo4j"
+        self.documents = {}
+        self.queries = 0
+        self.query_time = 0.0
+        self.entities_written = 0
+        self.relationships_written = 0
+        self._driver = SimpleNamespace(execute_query=self._execute_write)
+
+    def _wait(self):
+        start = time.perf_counter()
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        self.queries += 1
+        self.query_time += time.perf_counter() - start
+
+    def query(self, query, params=None, session_params=None):
+        self._wait()
+        params = params or {}
+        if "d.is_cancelled as is_cancelled" in query:
+            document = self.documents.get(params.get("file_name"))
+            if document is None:
+                return []
+            return [{"Status": document.get("status", "New"), "is_cancelled": False, "nodeCount": 0, "relationshipCount": 0,
+                     "processed_chunk": document.get("processed_chunk", 0), "total_chunks": document.get("total_chunks", 0),
+                     "model": document.get("model"), "created_time": None}]
+        if query.lstrip().startswith("MERGE(d:Document") and "fn" in params:
+            # create_source_node
+            self.documents[params["fn"]] = {"status": params.get("st"), "model": params.get("model")}
+        elif "props" in params and "fileName" in params["props"]:
+            # update_source_node
+            self.documents.setdefault(params["props"]["fileName"], {}).update(params["props"])
+        if query.lstrip().startswith("SHOW INDEXES"):
+            return [{"name": "vector"}]
+        return []
+
+    def _execute_write(self, query, params=None, database_=None):
+        self._wait()
+        rows = (params or {}).get("rows", [])
+        nodes = relationships = 0
+        records = []
+        if "HAS_ENTITY" in query:
+            relationships = len(rows)
+        elif "]->(target)" in query:
+            relationships = len(rows)
+            self.relationships_written += relationships
+        else:
+            nodes = len(rows)
+            self.entities_written += nodes
+            records = [SimpleNamespace(data=lambda row=row: {"id": row["id"], "element_id": f"4:entity:{row['id']}"}) for row in rows]
+        counters = SimpleNamespace(nodes_created=nodes, relationships_created=relationships, nodes_deleted=0, relationships_deleted=0,
+                                   properties_set=0)
+        return SimpleNamespace(records=records, summary=SimpleNamespace(counters=counters))
+
+
+def configure(args):
+    """Sets the environment and installs the fakes; must run before src.main is imported."""
+    os.environ["IS_EMBEDDING"] = "TRUE"
+    os.environ["EMBEDDING_MODEL"] = FAKE_MODEL
+    os.environ["MAX_TOKEN_CHUNK_SIZE"] = str(max(args.chunks) * args.token_chunk_size * 2)
+    os.environ["TRACING_ENABLED"] = "False"
+    if not args.with_caches:
+        os.environ["EXTRACTION_CACHE_ENABLED"] = "False"
+        os.environ["EMBEDDING_CACHE_ENABLED"] = "False"
+
+    import src.shared.common_fn as common_fn
+    common_fn.load_embedding_model = lambda name: (FakeEmbeddings(args.embedding_dimension, args.embedding_latency_ms / 1000),
+                                                   args.embedding_dimension)
+
+    import src.llm as llm
+    FakeGraphTransformer.latency_seconds = args.llm_latency_ms / 1000
+    FakeGraphTransformer.nodes_per_request = args.nodes_per_request
+    FakeGraphTransformer.relationships_per_request = args.relationships_per_request
+    llm.get_llm = lambda model: (FakeChatModel(), FAKE_MODEL)
+    llm.LLMGraphTransformer = FakeGraphTransformer
+
+    encoding = get_encoding()
+    import src.create_chunks as create_chunks
+    create_chunks.TokenArrayChunker = partial(create_chunks.TokenArrayChunker, encoding=encoding)
+
+    import src.main as extraction
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    return extraction, encoding
+
+
+async def run_case(extraction, encoding, args, chunk_count):
+    from src.entities.source_node import sourceNode
+    from src.graphDB_dataAccess import graphDBdataAccess
+    from src.shared.extraction_scheduler import get_extraction_scheduler
+
+    file_name = f"benchmark-{chunk_count}-{int(time.time())}.txt"
+    if args.neo4j_uri:
+        graph = extraction.create_graph_database_connection(args.neo4j_uri, args.neo4j_user, args.neo4j_password, args.neo4j_database)
+    else:
+        graph = StandInGraph(args.graph_latency_ms / 1000)
+        extraction.create_graph_database_connection = lambda *connection: graph
+
+    source_node = sourceNode()
+    source_node.file_name = file_name
+    source_node.file_type = "txt"
+    source_node.file_source = "local file"
+    source_node.model = FAKE_MODEL
+    source_node.created_at = datetime.now()
+    graphDBdataAccess(graph).create_source_node(source_node)
+
+    scheduler = get_extraction_scheduler(FAKE_MODEL)
+    start = time.perf_counter()
+    uri_latency, response = await extraction.processing_source(
+        args.neo4j_uri, args.neo4j_user, args.neo4j_password, args.neo4j_database, FAKE_MODEL, file_name,
+        synthetic_pages(chunk_count, args.token_chunk_size, encoding), "", "", args.token_chunk_size, args.chunk_overlap,
+        args.chunks_to_combine)
+    elapsed = time.perf_counter() - start
+
+    chunks = int(uri_latency.get("total_chunks") or 0)
+    result = {
+        "chunks_requested": chunk_count,
+        "chunks": chunks,
+        "status": response.get("status"),
+        "elapsed_seconds": round(elapsed, 3),
+        "chunks_per_second": round(chunks / elapsed, 2) if elapsed else None,
+        "chunking_seconds": float(uri_latency.get("create_list_chunk_and_document", 0)),
+        "stage_busy_seconds": {stage: float(busy) for stage, busy in uri_latency.get("pipeline_stage_busy_time", {}).items()},
+        "llm_requests": scheduler.requests,
+        "llm_retries": scheduler.retries,
+        "node_count": response.get("nodeCount"),
+        "relationship_count": response.get("relationshipCount"),
+        "peak_rss_mb": get_peak_rss_mb(),
+        "graph": "neo4j" if args.neo4j_uri else "stand-in",
+        "tokenizer": encoding.name,
+    }
+    if isinstance(graph, StandInGraph):
+        result["graph_queries"] = graph.queries
+        result["graph_query_seconds"] = round(graph.query_time, 3)
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[10, 100, 1000, 10000], help="chunk counts to benchmark")
+    parser.add_argument("--token-chunk-size", type=int, default=200)
+    parser.add_argument("--chunk-overlap", type=int, default=20)
+    parser.add_argument("--chunks-to-combine", type=int, default=1)
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="delay of every fake LLM request")
+    parser.add_argument("--nodes-per-request", type=int, default=8)
+    parser.add_argument("--relationships-per-request", type=int, default=6)
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0, help="delay of every fake embed_documents call")
+    parser.add_argument("--embedding-dimension", type=int, default=384)
+    parser.add_argument("--graph-latency-ms", type=float, default=0.0, help="delay of every query on the stand-in graph")
+    parser.add_argument("--with-caches", action="store_true", help="keep the extraction and embedding caches enabled")
+    parser.add_argument("--neo4j-uri", help="run against this Neo4j instead of the in-memory stand-in")
+    parser.add_argument("--neo4j-user", default="neo4j")
+    parser.add_argument("--neo4j-password", default="password")
+    parser.add_argument("--neo4j-database", default="neo4j")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the application's INFO logs")
+    return parser.parse_args(argv)
+
+
+def run_in_subprocess(argv, chunk_count):
+    """Runs one chunk count in a fresh interpreter so that its peak RSS is not shared with other sizes."""
+    child_argv = list(argv)
+    chunks_index = child_argv.index("--chunks") if "--chunks" in child_argv else None
+    if chunks_index is not None:
+        end = chunks_index + 1
+        while end < len(child_argv) and not child_argv[end].startswith("--"):
+            end += 1
+        del child_argv[chunks_index:end]
+    if "--output" in child_argv:
+        output_index = child_argv.index("--output")
+        del child_argv[output_index:output_index + 2]
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), *child_argv, "--chunks", str(chunk_count)],
+                               check=True, stdout=subprocess.PIPE, text=True)
+    return json.loads(completed.stdout)[0]
+
+
+def main():
+    argv = sys.argv[1:]
+    args = parse_args(argv)
+    if len(args.chunks) > 1:
+        results = [run_in_subprocess(argv, chunk_count) for chunk_count in args.chunks]
+    else:
+        extraction, encoding = configure(args)
+        results = [asyncio.run(run_case(extraction, encoding, args, args.chunks[0]))]
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
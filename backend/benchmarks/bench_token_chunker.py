@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the token-array chunker against langchain's TokenTextSplitter.
+
+Usage:
+    python benchmarks/bench_token_chunker.py [path/to/large.pdf] [--chunk-size 200] [--chunk-overlap 20] [--repeat 3]
+
+Without a PDF a synthetic 500 page document is used. Both splitters must produce the same chunks.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_text_splitters import TokenTextSplitter
+
+from src.shared.token_chunker import TokenArrayChunker
+
+
+def load_pages(pdf_path):
+    if pdf_path:
+        from langchain_community.document_loaders import PyMuPDFLoader
+        return [page.page_content for page in PyMuPDFLoader(pdf_path).lazy_load()]
+    paragraph = ("Neo4j is a graph database management system. Knowledge graphs connect entities such as "
+                 "people, organizations and places through typed relationships extracted from documents. ")
+    return [paragraph * 40 for _ in range(500)]
+
+
+def best_of(repeat, func):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", nargs="?", help="PDF file to chunk page by page")
+    parser.add_argument("--chunk-size", type=int, default=200)
+    parser.add_argument("--chunk-overlap", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pdf)
+    print(f"{len(pages)} pages, {sum(len(page) for page in pages)} characters")
+
+    text_splitter = TokenTextSplitter(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+    chunker = TokenArrayChunker(args.chunk_size, args.chunk_overlap)
+
+    splitter_time, splitter_chunks = best_of(args.repeat, lambda: [chunk for page in pages for chunk in text_splitter.split_text(page)])
+    chunker_time, chunker_chunks = best_of(args.repeat, lambda: [chunk for page in pages for chunk in chunker.split_text(page)])
+
+    if splitter_chunks != chunker_chunks:
+        raise SystemExit("Chunkers produced different chunks")
+    print(f"{len(chunker_chunks)} chunks of {args.chunk_size} tokens with {args.chunk_overlap} overlap")
+    print(f"TokenTextSplitter: {splitter_time:.3f}s")
+    print(f"TokenArrayChunker: {chunker_time:.3f}s ({splitter_time / chunker_time:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Synthetic records shaped like the results of GRAPH_QUERY, before and after it projected display
+properties, and of the chunk entities queries, for the graph visualization benchmarks.
+"""
+
+import random
+
+from neo4j import time
+from neo4j.graph import Graph, Node
+
+from src.graph_query import EXCLUDED_NODE_PROPERTIES
+
+SCALES = (1_000, 10_000, 100_000)
+ELEMENTS_PER_RECORD = 50
+ENTITY_LABELS = ("Person", "Organization", "Place", "Event")
+
+
+def build_graph_records(scale: int, duplicate_ratio: float = 0.2, seed: int = 0):
+    """
+    Returns GRAPH_QUERY records, as returned before display properties were projected, with `scale` distinct nodes and `scale` distinct relationships, split
+    into records of ELEMENTS_PER_RECORD nodes and relationships. About `duplicate_ratio` of each record's
+    elements were already returned by an earlier record, as documents share chunks' entities.
+    Chunks carry text and embedding properties and documents a DateTime, like the real graph.
+    """
+    rng = random.Random(seed)
+    graph = Graph()
+    nodes = []
+    for index in range(scale):
+        element_id = f"4:node:{index}"
+        if index % 10 == 0:
+            node = Node(graph, element_id, index, ["Chunk"], {
+                "id": f"chunk{index}", "position": index, "length": 1000, "text": "chunk text " * 100,
+                "embedding": [0.1] * 384, "fileName": "document.pdf"})
+        elif index % 100 == 1:
+            node = Node(graph, element_id, index, ["Document"], {
+                "fileName": f"document{index}.pdf", "status": "Completed", "createdAt": time.DateTime(2024, 1, 1, 12, 0, 0)})
+        else:
+            node = Node(graph, element_id, index, ["__Entity__", rng.choice(ENTITY_LABELS)], {
+                "id": f"Entity {index}", "description": "An entity extracted from the document"})
+        nodes.append(node)
+
+    relationship_types = [graph.relationship_type(name) for name in ("HAS_ENTITY", "PART_OF", "RELATED_TO")]
+    relationships = []
+    for index in range(scale):
+        relationship = rng.choice(relationship_types)(graph, f"5:rel:{index}", index, {})
+        relationship._start_node = nodes[index]
+        relationship._end_node = nodes[rng.randrange(scale)]
+        relationships.append(relationship)
+
+    return _split_into_records(rng, nodes, relationships, duplicate_ratio, lambda node_batch, relationship_batch:
+                               {"nodes": node_batch, "rels": relationship_batch})
+
+
+def project_node(node):
+    """Builds in Python the map GRAPH_NODE_PROJECTION returns for a node when no whitelist is set."""
+    return {"element_id": node.element_id, "labels": list(node.labels),
+            "properties": {key: value for key, value in node.items() if key not in EXCLUDED_NODE_PROPERTIES}}
+
+
+def project_relationship(relationship):
+    """Builds in Python the map GRAPH_RELATIONSHIP_PROJECTION returns for a relationship."""
+    return {"element_id": relationship.element_id, "type": relationship.type,
+            "start_node_element_id": relationship.start_node.element_id, "end_node_element_id": relationship.end_node.element_id}
+
+
+def distinct(items):
+    return list({item.element_id: item for item in items}.values())
+
+
+def project_graph_records(records):
+    """
+    Returns the single record GRAPH_QUERY now returns for the graph of build_graph_records: its distinct
+    nodes and relationships, in first seen order, as projected maps. process_projected_node mutates the
+    node maps, so every call builds new ones.
+    """
+    nodes = distinct(node for record in records for node in record["nodes"])
+    relationships = distinct(relationship for record in records for relationship in record["rels"])
+    return [{"nodes": [project_node(node) for node in nodes],
+             "rels": [project_relationship(relationship) for relationship in relationships]}]
+
+
+def build_entity_records(scale: int, duplicate_ratio: float = 0.2, seed: int = 0):
+    """
+    Returns chunk entities records, as read by chunkid_entities.process_records, with `scale` distinct
+    relationships between node maps. Node maps are mutated by process_records, so every call builds new ones.
+    """
+    rng = random.Random(seed)
+    node_maps = [{"element_id": f"4:node:{index}", "labels": ["__Entity__", rng.choice(ENTITY_LABELS)],
+                  "id": f"Entity {index}", "description": "An entity extracted from the document"}
+                 for index in range(scale)]
+    elements = [{"startNode": node_maps[index], "endNode": node_maps[rng.randrange(scale)],
+                 "relationship": {"element_id": f"5:rel:{index}", "type": "RELATED_TO"}}
+                for index in range(scale)]
+    return _split_into_records(rng, elements, None, duplicate_ratio, lambda element_batch, _: {"entities": element_batch})
+
+
+def _split_into_records(rng, first, second, duplicate_ratio, make_record):
+    records = []
+    duplicates = int(ELEMENTS_PER_RECORD * duplicate_ratio)
+    for start in range(0, len(first), ELEMENTS_PER_RECORD):
+        end = start + ELEMENTS_PER_RECORD
+        first_batch = first[start:end]
+        second_batch = second[start:end] if second is not None else None
+        if start and duplicates:
+            first_batch = first_batch + rng.sample(first[:start], min(duplicates, start))
+            if second_batch is not None:
+                second_batch = second_batch + rng.sample(second[:start], min(duplicates, start))
+        records.append(make_record(first_batch, second_batch))
+    return records
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Records the timings the graph visualization regression guard compares against.
+
+Usage:
+    python benchmarks/record_graph_query_baselines.py [--repeat 5] [--output benchmarks/graph_query_baselines.json]
+
+Every function is timed in its optimized and baseline version at 1k, 10k and 100k nodes and relationships,
+keeping the best of `--repeat` runs, or of more at the smaller scales. Run it again and commit the file whenever an optimization lands, so
+that test_optimized_keeps_its_recorded_speedup guards the new speedup.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import neo4j
+
+import baseline_graph_query
+from graph_records import SCALES, build_entity_records, build_graph_records, project_graph_records
+from src import chunkid_entities, graph_query
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "graph_query_baselines.json")
+
+GRAPH_FUNCTIONS = {
+    "extract_graph_elements": (graph_query.extract_graph_elements, baseline_graph_query.extract_graph_elements),
+}
+ENTITY_FUNCTIONS = {
+    "process_records": (chunkid_entities.process_records, baseline_graph_query.process_records),
+}
+FUNCTIONS = {**GRAPH_FUNCTIONS, **ENTITY_FUNCTIONS}
+VERSIONS = {"optimized": 0, "baseline": 1}
+
+_graph_records = {}
+
+
+def graph_records(scale):
+    if scale not in _graph_records:
+        _graph_records[scale] = build_graph_records(scale)
+    return _graph_records[scale]
+
+
+def function_args(name, version, scale):
+    """
+    Returns new arguments of a function for one run, as the optimized versions mutate the node maps they read.
+    The optimized extract_graph_elements reads projected maps and its baseline the whole nodes.
+    """
+    if name in GRAPH_FUNCTIONS:
+        records = graph_records(scale)
+        return (project_graph_records(records),) if version == "optimized" else (records,)
+    return (build_entity_records(scale),)
+
+
+def best_time(func, make_args, repeat=5):
+    """Returns the best of `repeat` timings, with garbage collection off like timeit, as its pauses depend on what else is in memory."""
+    best = float("inf")
+    for _ in range(repeat):
+        args = make_args()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            func(*args)
+            best = min(best, time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return best
+
+
+def measure(name, scale, repeat=5) -> dict:
+    """
+    Returns the best time in seconds of the optimized and baseline versions of a function at one scale.
+    Small scales run in a millisecond or so, so they are repeated more to keep the best time stable.
+    """
+    repeat = max(repeat, repeat * SCALES[-1] // (10 * scale))
+    return {version: best_time(FUNCTIONS[name][index], lambda: function_args(name, version, scale), repeat)
+            for version, index in VERSIONS.items()}
+
+
+def load_baselines(path=BASELINES_PATH) -> dict:
+    """Returns the recorded timings by function name and scale, as written by record_baselines."""
+    with open(path) as file:
+        return json.load(file)
+
+
+def record_baselines(repeat=5, scales=SCALES) -> dict:
+    timings = {}
+    for name in FUNCTIONS:
+        timings[name] = {}
+        for scale in scales:
+            timings[name][str(scale)] = measure(name, scale, repeat)
+            print(f"{name}[{scale}]: " + ", ".join(f"{version} {seconds:.4f}s" for version, seconds in timings[name][str(scale)].items()),
+                  file=sys.stderr)
+    return {
+        "environment": {"python": platform.python_version(), "neo4j": neo4j.__version__, "machine": platform.machine(),
+                        "repeat": repeat},
+        "timings": timings,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=BASELINES_PATH)
+    args = parser.parse_args()
+    baselines = record_baselines(args.repeat)
+    with open(args.output, "w") as file:
+        json.dump(baselines, file, indent=2)
+        file.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks of the graph visualization result shaping, run with pytest-benchmark.
+
+Usage:
+    pytest benchmarks/test_bench_graph_query.py --benchmark-autosave
+    pytest benchmarks/test_bench_graph_query.py --benchmark-compare
+
+Every function is measured in its optimized and baseline version at 1k, 10k and 100k nodes and
+relationships; benchmarks are grouped by function and scale so both versions are reported side by side.
+The optimized extract_graph_elements shapes the projected record GRAPH_QUERY now returns and its
+baseline the whole nodes and relationships the query returned before.
+test_optimized_keeps_its_recorded_speedup runs without pytest-benchmark and fails when an optimized
+version lost its speedup over the baseline, as recorded in graph_query_baselines.json by
+record_graph_query_baselines.py. Comparing speedups measured on the same machine, rather than seconds,
+lets the guard run anywhere; set BENCHMARK_REGRESSION_GUARD=0 to skip it on a machine too busy for timings.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip("neo4j")
+
+from graph_records import SCALES, build_entity_records
+from record_graph_query_baselines import (ENTITY_FUNCTIONS, FUNCTIONS, GRAPH_FUNCTIONS, VERSIONS, function_args,
+                                          load_baselines, measure)
+
+# Allowed loss of a recorded speedup, which absorbs timing noise on shared machines
+REGRESSION_TOLERANCE = 1.5
+# Measurements taken before failing, as a busy machine can slow down one of them; a real regression fails every one
+GUARD_ATTEMPTS = 3
+
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError:
+    @pytest.fixture
+    def benchmark():
+        pytest.skip("pytest-benchmark is not installed")
+
+
+def sort_labels(nodes):
+    return [{**node, "labels": sorted(node["labels"])} for node in nodes]
+
+
+@pytest.mark.parametrize("name", GRAPH_FUNCTIONS)
+def test_optimized_matches_baseline_graph_functions(name):
+    optimized, baseline = GRAPH_FUNCTIONS[name]
+    expected_nodes, expected_relationships = baseline(*function_args(name, "baseline", SCALES[0]))
+    nodes, relationships = optimized(*function_args(name, "optimized", SCALES[0]))
+    assert sort_labels(nodes) == sort_labels(expected_nodes)
+    assert relationships == expected_relationships
+
+
+def test_optimized_matches_baseline_process_records():
+    optimized, baseline = ENTITY_FUNCTIONS["process_records"]
+    expected = baseline(build_entity_records(SCALES[0]))
+    result = optimized(build_entity_records(SCALES[0]))
+    assert sort_labels(result["nodes"]) == sort_labels(expected["nodes"])
+    assert result["relationships"] == expected["relationships"]
+
+
+@pytest.mark.skipif(os.environ.get("BENCHMARK_REGRESSION_GUARD", "").lower() in ("false", "0", "no"),
+                    reason="wall-clock guard disabled by BENCHMARK_REGRESSION_GUARD")
+@pytest.mark.parametrize("scale", SCALES)
+@pytest.mark.parametrize("name", FUNCTIONS)
+def test_optimized_keeps_its_recorded_speedup(name, scale):
+    recorded = load_baselines()["timings"][name][str(scale)]
+    recorded_speedup = recorded["baseline"] / recorded["optimized"]
+    for _ in range(GUARD_ATTEMPTS):
+        timings = measure(name, scale)
+        speedup = timings["baseline"] / timings["optimized"]
+        if speedup * REGRESSION_TOLERANCE >= recorded_speedup:
+            break
+    assert speedup * REGRESSION_TOLERANCE >= recorded_speedup, (
+        f"{name}[{scale}] is {speedup:.2f}x faster than its baseline, against {recorded_speedup:.2f}x when recorded "
+        f"(optimized {timings['optimized']:.4f}s, baseline {timings['baseline']:.4f}s)")
+
+
+@pytest.mark.parametrize("version", VERSIONS)
+@pytest.mark.parametrize("scale", SCALES)
+@pytest.mark.parametrize("name", GRAPH_FUNCTIONS)
+def test_bench_graph_functions(benchmark, name, scale, version):
+    func = GRAPH_FUNCTIONS[name][VERSIONS[version]]
+    benchmark.group = f"{name}[{scale}]"
+    benchmark.extra_info["version"] = version
+    # process_projected_node mutates the node maps, so every round gets new records built outside the timing
+    benchmark.pedantic(func, setup=lambda: (function_args(name, version, scale), {}), rounds=5)
+
+
+@pytest.mark.parametrize("version", VERSIONS)
+@pytest.mark.parametrize("scale", SCALES)
+def test_bench_process_records(benchmark, scale, version):
+    func = ENTITY_FUNCTIONS["process_records"][VERSIONS[version]]
+    benchmark.group = f"process_records[{scale}]"
+    benchmark.extra_info["version"] = version
+    # process_records mutates the node maps, so every round gets new records built outside the timing
+    benchmark.pedantic(func, setup=lambda: ((build_entity_records(scale),), {}), rounds=5)
@@ -1,4 +1,5 @@
-from fastapi import FastAPI, File, UploadFile, Form, Request, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, Request, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from fastapi_health import health
 from fastapi.middleware.cors import CORSMiddleware
 from src.main import *
@@ -12,7 +13,7 @@ from langserve import add_routes
 from langchain_google_vertexai import ChatVertexAI
 from src.api_response import create_api_response
 from src.graphDB_dataAccess import graphDBdataAccess
-from src.graph_query import get_graph_results,get_chunktext_results,visualize_schema
+from src.graph_query import get_graph_results,get_chunktext_results,visualize_schema,parse_document_names,stream_graph_results
 from src.chunkid_entities import get_entities_from_chunkids
 from src.post_processing import create_vector_fulltext_indexes, create_entity_embedding, graph_schema_consolidation
 from sse_starlette.sse import EventSourceResponse
@@ -35,6 +36,12 @@ from langchain_neo4j import Neo4jGraph
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.requests import Request
 from src.environment_config import get_env_var, env_config
+from src.job_queue import get_job_queue, is_job_queue_enabled
+from src.shared.database_key import get_database_key
+from src.shared.driver_registry import close_shared_connections, connection_lease_scope, ConnectionLeaseMiddleware
+from src.shared.progress_bus import get_progress_bus, get_progress_key, publish_progress
+from src.shared.tracing import activate_span, deactivate_span, flush_tracing, start_span, trace_span
+from src.shared.metrics import MetricsMiddleware, render_metrics, update_job_queue_metrics
 
 # Initialize environment configuration
 env_config.log_configuration_summary()
@@ -113,6 +120,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 app.add_middleware(SessionMiddleware, secret_key=os.urandom(24))
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ConnectionLeaseMiddleware)
 
 is_gemini_enabled = os.environ.get("GEMINI_ENABLED", "False").lower() in ("true", "1", "yes")
 if is_gemini_enabled:
@@ -120,8 +129,39 @@ if is_gemini_enabled:
 
 app.add_api_route("/health", health([healthy_condition, healthy]))
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics of the API, LLM, embedding and Neo4j calls and of the extraction job queue."""
+    if is_job_queue_enabled():
+        update_job_queue_metrics(await asyncio.to_thread(get_job_queue().count_active_jobs))
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
 
 
+
+async def run_extract_job(payload):
+    # Workers run outside any request, so the job holds its own leases on the drivers it borrows
+    with connection_lease_scope():
+        return await run_extract(**payload)
+
+@app.on_event("startup")
+async def start_extract_workers():
+    if is_job_queue_enabled():
+        get_job_queue().start(run_extract_job)
+
+@app.on_event("shutdown")
+async def stop_extract_workers():
+    if is_job_queue_enabled():
+        await get_job_queue().stop()
+
+@app.on_event("shutdown")
+async def close_neo4j_drivers():
+    close_shared_connections()
+
+@app.on_event("shutdown")
+async def flush_spans():
+    await asyncio.to_thread(flush_tracing)
+
 @app.post("/url/scan")
 async def create_source_knowledge_graph_url(
     uri=Form(None),
@@ -222,6 +262,61 @@ async def extract_knowledge_graph_from_file(
     additional_instructions=Form(None),
     email=Form(None)
 ):
+    """
+    Creates a Neo4jGraph from the source based on the model.
+
+    When EXTRACT_JOB_QUEUE_ENABLED is set the request is stored in the extraction job queue and the
+    response returns the job id and queue position immediately; progress is reported by
+    /update_extract_status and the result by /extract_job/{job_id}. Otherwise the extraction runs
+    within the request.
+
+    Args:
+          uri: URI of the graph to extract
+          userName: Username to use for graph creation
+          password: Password to use for graph creation
+          file: File object containing the PDF file
+          model: Type of model to use ('Diffbot'or'OpenAI GPT')
+
+    Returns:
+          Nodes and Relations created in Neo4j databse for the pdf file, or the queued job
+    """
+    params = dict(
+        uri=uri,
+        userName=userName,
+        password=password,
+        model=model,
+        database=database,
+        source_url=source_url,
+        aws_access_key_id=aws_access_key_id,
+        aws_secret_access_key=aws_secret_access_key,
+        wiki_query=wiki_query,
+        gcs_project_id=gcs_project_id,
+        gcs_bucket_name=gcs_bucket_name,
+        gcs_bucket_folder=gcs_bucket_folder,
+        gcs_blob_filename=gcs_blob_filename,
+        source_type=source_type,
+        file_name=file_name,
+        allowedNodes=allowedNodes,
+        allowedRelationship=allowedRelationship,
+        token_chunk_size=token_chunk_size,
+        chunk_overlap=chunk_overlap,
+        chunks_to_combine=chunks_to_combine,
+        language=language,
+        access_token=access_token,
+        retry_condition=retry_condition,
+        additional_instructions=additional_instructions,
+        email=email,
+    )
+    if is_job_queue_enabled():
+        job_queue = get_job_queue()
+        if source_type == 'local file':
+            params['file_name'] = sanitize_filename(file_name)
+        job_id = job_queue.enqueue(params, model, get_database_key(uri, database), params['file_name'])
+        return create_api_response('Success', data={'job_id': job_id, 'fileName': params['file_name'], 'status': 'Queued',
+                                                    'queuePosition': job_queue.get_queue_position(job_id)}, file_source=source_type)
+    return await run_extract(**params)
+
+async def run_extract(uri, userName, password, model, database, source_url, aws_access_key_id, aws_secret_access_key, wiki_query, gcs_project_id, gcs_bucket_name, gcs_bucket_folder, gcs_blob_filename, source_type, file_name, allowedNodes, allowedRelationship, token_chunk_size, chunk_overlap, chunks_to_combine, language, access_token, retry_condition, additional_instructions, email):
     """
     Calls 'extract_graph_from_file' in a new thread to create Neo4jGraph from a
     PDF file based on the model.
@@ -236,6 +331,10 @@ async def extract_knowledge_graph_from_file(
     Returns:
           Nodes and Relations created in Neo4j databse for the pdf file
     """
+    # Root span of the extraction; the load, chunk and batch spans of the file are nested under it
+    extract_span = start_span("extract", {"file_name": file_name, "source_type": source_type, "model": model,
+                                          "retry_condition": retry_condition, "token_chunk_size": token_chunk_size})
+    span_token = activate_span(extract_span)
     try:
         start_time = time.time()
         graph = create_graph_database_connection(uri, userName, password, database)   
@@ -263,12 +362,16 @@ async def extract_knowledge_graph_from_file(
             return create_api_response('Failed',message='source_type is other than accepted source')
         extract_api_time = time.time() - start_time
         if result is not None:
-            logging.info("Going for counting nodes and relationships in extract")
-            count_node_time = time.time()
-            graph = create_graph_database_connection(uri, userName, password, database)   
-            graphDb_data_Access = graphDBdataAccess(graph)
-            count_response = graphDb_data_Access.update_node_relationship_count(file_name)
-            logging.info("Nodes and Relationship Counts updated")
+            # processing_source returns the counts of its final recount; only recount when it did not run
+            if 'chunkNodeCount' not in result:
+                logging.info("Going for counting nodes and relationships in extract")
+                count_node_time = time.time()
+                graph = create_graph_database_connection(uri, userName, password, database)   
+                graphDb_data_Access = graphDBdataAccess(graph)
+                count_response = graphDb_data_Access.update_node_relationship_count(file_name)
+                logging.info("Nodes and Relationship Counts updated")
+            else:
+                count_response = None
             if count_response :
                 result['chunkNodeCount'] = count_response[file_name].get('chunkNodeCount',"0")
                 result['chunkRelCount'] =  count_response[file_name].get('chunkRelCount',"0")
@@ -296,11 +399,14 @@ async def extract_knowledge_graph_from_file(
             result['language'] = language
             result['retry_condition'] = retry_condition
             result['email'] = email
+            extract_span.set_attributes(status=result.get('status'), total_chunks=uri_latency.get('total_chunks'),
+                                        node_count=result.get('nodeCount'), relationship_count=result.get('relationshipCount'))
         logger.log_struct(result, "INFO")
         result.update(uri_latency)
         logging.info(f"extraction completed in {extract_api_time:.2f} seconds for file name {file_name}")
         return create_api_response('Success', data=result, file_source= source_type)
     except LLMGraphBuilderException as e:
+        extract_span.record_error(e)
         error_message = str(e)
         graph = create_graph_database_connection(uri, userName, password, database)   
         graphDb_data_Access = graphDBdataAccess(graph)
@@ -308,6 +414,7 @@ async def extract_knowledge_graph_from_file(
         if source_type == 'local file':
             failed_file_process(uri,file_name, merged_file_path)
         node_detail = graphDb_data_Access.get_current_status_document_node(file_name)
+        publish_progress(uri, database, file_name, status=node_detail[0]['Status'])
         # Set the status "Completed" in logging becuase we are treating these error already handled by application as like custom errors.
         json_obj = {'api_name':'extract','message':error_message,'file_created_at':formatted_time(node_detail[0]['created_time']),'error_message':error_message, 'file_name': file_name,'status':'Completed',
                     'db_url':uri, 'userName':userName, 'database':database,'success_count':1, 'source_type': source_type, 'source_url':source_url, 'wiki_query':wiki_query, 'logging_time': formatted_time(datetime.now(timezone.utc)),'email':email,
@@ -316,6 +423,7 @@ async def extract_knowledge_graph_from_file(
         logging.exception(f'File Failed in extraction: {e}')
         return create_api_response("Failed", message = error_message, error=error_message, file_name=file_name)
     except Exception as e:
+        extract_span.record_error(e)
         message=f"Failed To Process File:{file_name} or LLM Unable To Parse Content "
         error_message = str(e)
         graph = create_graph_database_connection(uri, userName, password, database)   
@@ -324,6 +432,7 @@ async def extract_knowledge_graph_from_file(
         if source_type == 'local file':
             failed_file_process(uri,file_name, merged_file_path)
         node_detail = graphDb_data_Access.get_current_status_document_node(file_name)
+        publish_progress(uri, database, file_name, status=node_detail[0]['Status'])
         
         json_obj = {'api_name':'extract','message':message,'file_created_at':formatted_time(node_detail[0]['created_time']),'error_message':error_message, 'file_name': file_name,'status':'Failed',
                     'db_url':uri, 'userName':userName, 'database':database,'failed_count':1, 'source_type': source_type, 'source_url':source_url, 'wiki_query':wiki_query, 'logging_time': formatted_time(datetime.now(timezone.utc)),'email':email,
@@ -332,6 +441,8 @@ async def extract_knowledge_graph_from_file(
         logging.exception(f'File Failed in extraction: {e}')
         return create_api_response('Failed', message=message + error_message[:100], error=error_message, file_name = file_name)
     finally:
+        deactivate_span(span_token)
+        extract_span.end()
         gc.collect()
             
 @app.post("/sources_list")
@@ -395,7 +506,14 @@ async def post_processing(uri=Form(None), userName=Form(None), password=Form(Non
         graph = create_graph_database_connection(uri, userName, password, database)   
         graphDb_data_Access = graphDBdataAccess(graph)
         document_name = ""
-        count_response = graphDb_data_Access.update_node_relationship_count(document_name)
+
+        def log_recount_progress(counted, total):
+            # Recounting every document after communities can take minutes on large databases
+            logger.log_struct({'api_name': 'post_processing/recount_documents', 'db_url': uri, 'userName': userName, 'database': database,
+                               'counted_documents': counted, 'total_documents': total,
+                               'logging_time': formatted_time(datetime.now(timezone.utc)), 'email': email}, "INFO")
+
+        count_response = await asyncio.to_thread(graphDb_data_Access.update_node_relationship_count, document_name, log_recount_progress)
         if count_response:
             count_response = [{"filename": filename, **counts} for filename, counts in count_response.items()]
             logging.info(f'Updated source node with community related counts')
@@ -421,14 +539,15 @@ async def chat_bot(uri=Form(None),model=Form(None),userName=Form(None), password
     logging.info(f"QA_RAG called at {datetime.now()}")
     qa_rag_start_time = time.time()
     try:
-        if mode == "graph":
-            graph = Neo4jGraph( url=uri,username=userName,password=password,database=database,sanitize = True, refresh_schema=True)
-        else:
+        with trace_span("chat", {"mode": mode, "model": model}) as chat_span:
             graph = create_graph_database_connection(uri, userName, password, database)
-        
-        graph_DB_dataAccess = graphDBdataAccess(graph)
-        write_access = graph_DB_dataAccess.check_account_access(database=database)
-        result = await asyncio.to_thread(QA_RAG,graph=graph,model=model,question=question,document_names=document_names,session_id=session_id,mode=mode,write_access=write_access)
+            if mode == "graph":
+                graph.refresh_schema()
+            
+            graph_DB_dataAccess = graphDBdataAccess(graph)
+            write_access = graph_DB_dataAccess.check_account_access(database=database)
+            result = await asyncio.to_thread(QA_RAG,graph=graph,model=model,question=question,document_names=document_names,session_id=session_id,mode=mode,write_access=write_access)
+            chat_span.set_attributes(total_tokens=result.get("info", {}).get("total_tokens"))
 
         total_call_time = time.time() - qa_rag_start_time
         logging.info(f"Total Response time is  {total_call_time:.2f} seconds")
@@ -538,6 +657,41 @@ async def graph_query(
         return create_api_response(job_status, message=message, error=error_message)
     finally:
         gc.collect()
+
+@app.post("/graph_query_stream")
+async def graph_query_stream(
+    uri: str = Form(None),
+    database: str = Form(None),
+    userName: str = Form(None),
+    password: str = Form(None),
+    document_names: str = Form(None),
+    page_size: int = Form(None),
+    email=Form(None)
+):
+    """Streams the graph of /graph_query as NDJSON, one page of nodes and relationships per line and a last line with done set."""
+    if not uri or not userName or not password or not database:
+        return create_api_response('Failed', message="Missing required parameters: uri, userName, password, database",
+                                   error="Required parameters are missing")
+    try:
+        parse_document_names(document_names)
+    except ValueError as ve:
+        logging.error(f'Validation error in graph query stream: {ve}')
+        return create_api_response('Failed', message="Invalid input parameters", error=str(ve))
+
+    def generate():
+        start = time.time()
+        try:
+            for page in stream_graph_results(uri, userName, password, database, document_names, page_size=page_size):
+                yield json.dumps(page) + "\n"
+        except Exception as e:
+            logging.exception(f'Exception in graph query stream: {e}')
+            yield json.dumps({"status": "Failed", "message": "Unable to get graph query response", "error": str(e)}) + "\n"
+        json_obj = {'api_name':'graph_query_stream','db_url':uri, 'userName':userName, 'database':database, 'document_names':document_names,
+                    'logging_time': formatted_time(datetime.now(timezone.utc)), 'elapsed_api_time':f'{time.time() - start:.2f}','email':email}
+        logger.log_struct(json_obj, "INFO")
+
+    # A sync generator is iterated in the thread pool, one driver record batch at a time
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
     
 
 @app.post("/clear_chat_bot")
@@ -641,11 +795,28 @@ def encode_password(pwd):
     encoded_pwd_bytes = base64.b64encode(data_bytes)
     return encoded_pwd_bytes
 
+# Fields streamed by /update_extract_status, keyed by the progress bus field name (the Document node
+# property) with the column returned by get_current_status_document_node
+SSE_STATUS_COLUMNS = {
+    'status': 'Status', 'processingTime': 'processingTime', 'nodeCount': 'nodeCount',
+    'relationshipCount': 'relationshipCount', 'model': 'model', 'total_chunks': 'total_chunks',
+    'fileSize': 'fileSize', 'processed_chunk': 'processed_chunk', 'fileSource': 'fileSource',
+    'chunkNodeCount': 'chunkNodeCount', 'chunkRelCount': 'chunkRelCount', 'entityNodeCount': 'entityNodeCount',
+    'entityEntityRelCount': 'entityEntityRelCount', 'communityNodeCount': 'communityNodeCount',
+    'communityRelCount': 'communityRelCount',
+}
+
 @app.get("/update_extract_status/{file_name}")
 async def update_extract_status(request: Request, file_name: str, uri:str=None, userName:str=None, password:str=None, database:str=None):
     async def generate():
-        status = ''
-        
+        # Progress of extractions running in this process arrives through the progress bus. Neo4j is
+        # only polled as a fallback, for jobs running in another process, with an exponential backoff
+        # that restarts from the minimum interval whenever a poll finds a change.
+        min_poll_interval = float(os.environ.get('EXTRACT_STATUS_POLL_MIN_INTERVAL', 1))
+        max_poll_interval = float(os.environ.get('EXTRACT_STATUS_POLL_MAX_INTERVAL', 30))
+        last_status = ''
+        document_status = {}
+
         if password is not None and password != "null":
             decoded_password = decode_password(password)
         else:
@@ -654,42 +825,76 @@ async def update_extract_status(request: Request, file_name: str, uri:str=None,
         url = uri
         if url and " " in url:
             url= url.replace(" ","+")
-            
+
         graph = create_graph_database_connection(url, userName, decoded_password, database)
         graphDb_data_Access = graphDBdataAccess(graph)
+        progress_bus = get_progress_bus()
+        progress_key = get_progress_key(url, database, file_name)
+        version, _ = progress_bus.get(progress_key)
+        poll_interval = min_poll_interval
+        poll_database = True
         while True:
             try:
                 if await request.is_disconnected():
                     logging.info(" SSE Client disconnected")
                     break
-                # get the current status of document node
-                
-                else:
-                    result = graphDb_data_Access.get_current_status_document_node(file_name)
+                if poll_database:
+                    result = await asyncio.to_thread(graphDb_data_Access.get_current_status_document_node, file_name)
                     if len(result) > 0:
-                        status = json.dumps({'fileName':file_name, 
-                        'status':result[0]['Status'],
-                        'processingTime':result[0]['processingTime'],
-                        'nodeCount':result[0]['nodeCount'],
-                        'relationshipCount':result[0]['relationshipCount'],
-                        'model':result[0]['model'],
-                        'total_chunks':result[0]['total_chunks'],
-                        'fileSize':result[0]['fileSize'],
-                        'processed_chunk':result[0]['processed_chunk'],
-                        'fileSource':result[0]['fileSource'],
-                        'chunkNodeCount' : result[0]['chunkNodeCount'],
-                        'chunkRelCount' : result[0]['chunkRelCount'],
-                        'entityNodeCount' : result[0]['entityNodeCount'],
-                        'entityEntityRelCount' : result[0]['entityEntityRelCount'],
-                        'communityNodeCount' : result[0]['communityNodeCount'],
-                        'communityRelCount' : result[0]['communityRelCount']
-                        })
+                        polled_status = {key: result[0][column] for key, column in SSE_STATUS_COLUMNS.items()}
+                        if polled_status != document_status:
+                            document_status = polled_status
+                            poll_interval = min_poll_interval
+                        else:
+                            poll_interval = min(poll_interval * 2, max_poll_interval)
+                update = await progress_bus.wait_for_update(progress_key, version, poll_interval)
+                poll_database = update is None
+                if update is not None:
+                    version, published = update
+                    document_status.update({key: value for key, value in published.items() if key in SSE_STATUS_COLUMNS})
+                if not document_status:
+                    continue
+                job_status = {}
+                if is_job_queue_enabled():
+                    job_queue = get_job_queue()
+                    job = await asyncio.to_thread(job_queue.get_latest_job, get_database_key(url, database), file_name)
+                    if job is not None:
+                        job_status = {'jobId': job['job_id'], 'jobStatus': job['status'],
+                                      'queuePosition': await asyncio.to_thread(job_queue.get_queue_position, job['job_id'])}
+                status = json.dumps({**job_status, 'fileName':file_name, **document_status}, default=str)
+                if status != last_status:
+                    last_status = status
                     yield status
             except asyncio.CancelledError:
                 logging.info("SSE Connection cancelled")
-    
+                break
+
     return EventSourceResponse(generate(),ping=60)
 
+@app.post("/extract_job/{job_id}")
+async def get_extract_job(job_id: str, uri=Form(None), userName=Form(None), password=Form(None), database=Form(None)):
+    """
+    Returns the status, queue position and, once finished, the /extract response of a queued extraction job.
+    Only the credentials of the user and database the job was queued for can read it.
+    """
+    if not is_job_queue_enabled():
+        return create_api_response('Failed', message='Extraction job queue is not enabled')
+    job_queue = get_job_queue()
+    job = await asyncio.to_thread(job_queue.get_job, job_id)
+    # Jobs of other users or databases are reported as missing so that job ids cannot be probed
+    not_found = create_api_response('Failed', message=f'Extraction job {job_id} not found')
+    if job is None or job['database_key'] != get_database_key(uri, database) or job['payload'].get('userName') != userName:
+        return not_found
+    try:
+        await asyncio.to_thread(create_graph_database_connection, uri, userName, password, database)
+    except Exception as e:
+        logging.warning(f"Extraction job {job_id} requested with credentials that do not connect: {e}")
+        return not_found
+    queue_position = await asyncio.to_thread(job_queue.get_queue_position, job_id)
+    return create_api_response('Success', data={'job_id': job_id, 'fileName': job['file_name'], 'status': job['status'],
+                                                'queuePosition': queue_position,
+                                                'result': job['result'], 'error': job['error']})
+
 @app.post("/delete_document_and_entities")
 async def delete_document_and_entities(uri=Form(None), 
                                        userName=Form(None), 
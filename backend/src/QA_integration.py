@@ -36,6 +36,8 @@ from src.llm import get_llm
 from src.shared.common_fn import load_embedding_model
 from src.shared.constants import *
 from src.environment_config import get_env_var, env_config
+from src.shared.metrics import record_llm_request
+from src.shared.tracing import trace_span
 
 # Load environment configuration
 env_config.log_configuration_summary()
@@ -252,11 +254,17 @@ def process_documents(docs, question, messages, llm, model,chat_mode_settings):
         
         rag_chain = get_rag_chain(llm=llm)
         
-        ai_response = rag_chain.invoke({
-            "messages": messages[:-1],
-            "context": formatted_docs,
-            "input": question
-        })
+        start_generation = time.perf_counter()
+        try:
+            ai_response = rag_chain.invoke({
+                "messages": messages[:-1],
+                "context": formatted_docs,
+                "input": question
+            })
+        except Exception:
+            record_llm_request(model, "chat", time.perf_counter() - start_generation, "error")
+            raise
+        generation_time = time.perf_counter() - start_generation
 
         result = {'sources': list(), 'nodedetails': dict(), 'entities': dict()}
         node_details = {"chunkdetails":list(),"entitydetails":list(),"communitydetails":list()}
@@ -278,6 +286,7 @@ def process_documents(docs, question, messages, llm, model,chat_mode_settings):
 
         content = ai_response.content
         total_tokens = get_total_tokens(ai_response, llm)
+        record_llm_request(model, "chat", generation_time, "success", total_tokens)
         
         predict_time = time.time() - start_time
         logging.info(f"Final response predicted in {predict_time:.2f} seconds")
@@ -454,10 +463,14 @@ def process_chat_response(messages, history, question, model, graph, document_na
     try:
         llm, doc_retriever, model_version = setup_chat(model, graph, document_names, chat_mode_settings)
         
-        docs,transformed_question = retrieve_documents(doc_retriever, messages)  
+        with trace_span("chat.retrieval", {"mode": chat_mode_settings["mode"], "selected_documents": len(document_names)}) as retrieval_span:
+            docs,transformed_question = retrieve_documents(doc_retriever, messages)  
+            retrieval_span.set_attributes(documents=len(docs or []))
 
         if docs:
-            content, result, total_tokens,formatted_docs = process_documents(docs, question, messages, llm, model, chat_mode_settings)
+            with trace_span("chat.generation", {"model": model, "documents": len(docs)}) as generation_span:
+                content, result, total_tokens,formatted_docs = process_documents(docs, question, messages, llm, model, chat_mode_settings)
+                generation_span.set_attributes(total_tokens=total_tokens, context_bytes=len(formatted_docs.encode('utf-8')))
         else:
             content = "I couldn't find any relevant documents to answer your question."
             result = {"sources": list(), "nodedetails": list(), "entities": list()}
@@ -595,7 +608,9 @@ def process_graph_response(model, graph, question, messages, history):
     try:
         graph_chain, qa_llm, model_version = create_graph_chain(model, graph)
         
-        graph_response = get_graph_response(graph_chain, question)
+        with trace_span("chat.graph_query", {"model": model}) as graph_query_span:
+            graph_response = get_graph_response(graph_chain, question)
+            graph_query_span.set_attributes(cypher_query=(graph_response or {}).get("cypher_query"))
         
         ai_response_content = graph_response.get("response", "Something went wrong")
         ai_response = AIMessage(content=ai_response_content)
@@ -3,6 +3,13 @@ from src.graph_query import *
 from src.shared.constants import * 
 import re
 
+def remove_entity_label(node):
+    """Drops the __Entity__ base label of a node map, which becomes '*' when it had no other label."""
+    labels = node.get("labels")
+    if labels is not None:
+        node["labels"] = [label for label in labels if label != "__Entity__"] or ['*']
+    return node
+
 def process_records(records):
     """
     Processes a record to extract and organize node and relationship data.
@@ -18,35 +25,26 @@ def process_records(records):
                 start_node = element['startNode']
                 end_node = element['endNode']
                 relationship = element['relationship']
+                start_node_element_id = start_node['element_id']
+                end_node_element_id = end_node['element_id']
+
+                if start_node_element_id not in seen_nodes:
+                    nodes.append(remove_entity_label(start_node))
+                    seen_nodes.add(start_node_element_id)
+
+                if end_node_element_id not in seen_nodes:
+                    nodes.append(remove_entity_label(end_node))
+                    seen_nodes.add(end_node_element_id)
 
-                if start_node['element_id'] not in seen_nodes:
-                    if "labels" in start_node.keys():
-                        labels = set(start_node["labels"])
-                        labels.discard("__Entity__")
-                        if not labels:
-                            labels.add('*')
-                        start_node["labels"] = list(labels)
-                    nodes.append(start_node)
-                    seen_nodes.add(start_node['element_id'])
-
-                if end_node['element_id'] not in seen_nodes:
-                    if "labels" in end_node.keys():
-                        labels = set(end_node["labels"])
-                        labels.discard("__Entity__")
-                        if not labels:
-                            labels.add('*')
-                        end_node["labels"] = list(labels)
-                    nodes.append(end_node)
-                    seen_nodes.add(end_node['element_id'])
-
-                if relationship['element_id'] not in seen_relationships:
+                relationship_element_id = relationship['element_id']
+                if relationship_element_id not in seen_relationships:
                     relationships.append({
-                        "element_id": relationship['element_id'],
+                        "element_id": relationship_element_id,
                         "type": relationship['type'],
-                        "start_node_element_id": start_node['element_id'],
-                        "end_node_element_id": end_node['element_id']
+                        "start_node_element_id": start_node_element_id,
+                        "end_node_element_id": end_node_element_id
                     })
-                    seen_relationships.add(relationship['element_id'])
+                    seen_relationships.add(relationship_element_id)
         output = {
             "nodes": nodes,
             "relationships": relationships
@@ -1,11 +1,13 @@
 import logging
 from graphdatascience import GraphDataScience
+from src.shared.driver_registry import get_shared_driver
 from src.llm import get_llm
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser 
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
-from src.shared.common_fn import load_embedding_model
+from src.shared.common_fn import load_embedding_model,get_embedding_batch_size,embed_documents_in_batches
+from src.shared.embedding_cache import embed_texts_with_cache
 
 
 COMMUNITY_PROJECTION_NAME = "communities"
@@ -198,11 +200,7 @@ def get_gds_driver(uri, username, password, database):
             database= os.getenv('NEO4J_DATABASE')
             password= os.getenv('NEO4J_PASSWORD')
             
-        gds = GraphDataScience(
-            endpoint=uri,
-            auth=(username, password),
-            database=database
-        )
+        gds = GraphDataScience.from_neo4j_driver(get_shared_driver(uri, username, password, database), auth=(username, password), database=database)
         logging.info("Successfully created GDS driver.")
         return gds
     except Exception as e:
@@ -349,6 +347,31 @@ def create_community_summaries(gds, model):
         logging.error(f"Failed to create community summaries: {e}")
         raise
 
+def embed_community_summaries(embedding_model, embeddings, dimension, rows, embedding_batch_size):
+    """
+    Embeds the summaries of a batch of communities with batched embed_documents calls. When the batch
+    fails, every summary is embedded on its own so that one failing summary only leaves its own
+    embedding empty.
+
+    Returns:
+        list: one embedding per row, None for the summaries that could not be embedded.
+    """
+    embed_func = lambda missing: embed_documents_in_batches(embeddings, missing, embedding_batch_size)
+    try:
+        vectors, cache_hits = embed_texts_with_cache(embedding_model, embeddings, dimension, [row['text'] for row in rows], embed_func)
+        logging.info(f"Community embeddings served from cache: {cache_hits}/{len(rows)}")
+        return vectors
+    except Exception as e:
+        logging.warning(f"Failed to embed the summaries of {len(rows)} communities in one batch, embedding them one by one: {e}")
+    vectors = []
+    for row in rows:
+        try:
+            vectors.extend(embed_texts_with_cache(embedding_model, embeddings, dimension, [row['text']], embed_func)[0])
+        except Exception as e:
+            logging.error(f"Failed to embed text for community ID {row['communityId']}: {e}")
+            vectors.append(None)
+    return vectors
+
 def create_community_embeddings(gds):
     try:
         embedding_model = os.getenv('EMBEDDING_MODEL')
@@ -361,14 +384,12 @@ def create_community_embeddings(gds):
         logging.info(f"Fetched {len(rows)} communities.")
         
         batch_size = 100
+        embedding_batch_size = get_embedding_batch_size(embedding_model)
         for i in range(0, len(rows), batch_size):
             batch_rows = rows[i:i+batch_size]            
-            for row in batch_rows:
-                try:
-                    row['embedding'] = embeddings.embed_query(row['text'])
-                except Exception as e:
-                    logging.error(f"Failed to embed text for community ID {row['communityId']}: {e}")
-                    row['embedding'] = None
+            vectors = embed_community_summaries(embedding_model, embeddings, dimension, batch_rows, embedding_batch_size)
+            for row, vector in zip(batch_rows, vectors):
+                row['embedding'] = vector
             
             try:
                 logging.info("Writing embeddings to the database.")
@@ -1,10 +1,12 @@
-from langchain_text_splitters import TokenTextSplitter
 from langchain.docstore.document import Document
 from langchain_neo4j import Neo4jGraph
 import logging
 from src.document_sources.youtube import get_chunks_with_timestamps, get_calculated_timestamps
 import re
 import os
+import itertools
+import copy
+from src.shared.token_chunker import TokenArrayChunker
 
 logging.basicConfig(format="%(asctime)s - %(message)s", level="INFO")
 
@@ -14,6 +16,55 @@ class CreateChunksofDocument:
         self.pages = pages
         self.graph = graph
 
+    @staticmethod
+    def split_documents(chunker: TokenArrayChunker, documents, max_chunks: int):
+        """
+        Splits documents with the token-array chunker, keeping a copy of each document's metadata
+        on its chunks like TokenTextSplitter.split_documents. Stops after max_chunks chunks,
+        so windows past the cap are never decoded.
+        """
+        chunks = []
+        for document in documents:
+            remaining = max_chunks - len(chunks)
+            if remaining <= 0:
+                break
+            for text in chunker.split_text(document.page_content, max_chunks=remaining):
+                chunks.append(Document(page_content=text, metadata=copy.deepcopy(document.metadata)))
+        return chunks
+
+    def iter_chunks(self, token_chunk_size, chunk_overlap):
+        """
+        Generator version of split_file_into_chunks. `self.pages` may be any iterable of pages;
+        each page is split as it arrives and page loading stops once MAX_TOKEN_CHUNK_SIZE is reached,
+        so only the current page is held in memory.
+
+        Youtube transcripts need every page to compute timestamps and are split in one go.
+        """
+        pages = iter(self.pages)
+        first_page = next(pages, None)
+        if first_page is None:
+            return
+        if 'length' in first_page.metadata:
+            self.pages = [first_page, *pages]
+            yield from self.split_file_into_chunks(token_chunk_size, chunk_overlap)
+            return
+
+        logging.info("Split file into smaller chunks")
+        chunker = TokenArrayChunker(chunk_size=token_chunk_size, chunk_overlap=chunk_overlap)
+        MAX_TOKEN_CHUNK_SIZE = int(os.getenv('MAX_TOKEN_CHUNK_SIZE', 10000))
+        chunk_to_be_created = int(MAX_TOKEN_CHUNK_SIZE / token_chunk_size)
+        with_page_number = 'page' in first_page.metadata
+        chunk_count = 0
+        for i, document in enumerate(itertools.chain([first_page], pages)):
+            if chunk_count >= chunk_to_be_created:
+                return
+            for chunk in self.split_documents(chunker, [document], chunk_to_be_created - chunk_count):
+                chunk_count += 1
+                if with_page_number:
+                    yield Document(page_content=chunk.page_content, metadata={'page_number':i + 1})
+                else:
+                    yield chunk
+
     def split_file_into_chunks(self,token_chunk_size, chunk_overlap):
         """
         Split a list of documents(file pages) into chunks of fixed size.
@@ -25,7 +76,7 @@ class CreateChunksofDocument:
             A list of chunks each of which is a langchain Document.
         """
         logging.info("Split file into smaller chunks")
-        text_splitter = TokenTextSplitter(chunk_size=token_chunk_size, chunk_overlap=chunk_overlap)
+        chunker = TokenArrayChunker(chunk_size=token_chunk_size, chunk_overlap=chunk_overlap)
         MAX_TOKEN_CHUNK_SIZE = int(os.getenv('MAX_TOKEN_CHUNK_SIZE', 10000))
         chunk_to_be_created = int(MAX_TOKEN_CHUNK_SIZE / token_chunk_size)
         
@@ -36,20 +87,20 @@ class CreateChunksofDocument:
                 if len(chunks) >= chunk_to_be_created:
                     break
                 else:
-                    for chunk in text_splitter.split_documents([document]):
+                    for chunk in self.split_documents(chunker, [document], chunk_to_be_created - len(chunks)):
                         chunks.append(Document(page_content=chunk.page_content, metadata={'page_number':page_number}))    
         
         elif 'length' in self.pages[0].metadata:
             if len(self.pages) == 1  or (len(self.pages) > 1 and self.pages[1].page_content.strip() == ''): 
                 match = re.search(r'(?:v=)([0-9A-Za-z_-]{11})\s*',self.pages[0].metadata['source'])
                 youtube_id=match.group(1)   
-                chunks_without_time_range = text_splitter.split_documents([self.pages[0]])
+                chunks_without_time_range = self.split_documents(chunker, [self.pages[0]], chunk_to_be_created)
                 chunks = get_calculated_timestamps(chunks_without_time_range[:chunk_to_be_created], youtube_id)
             else: 
-                chunks_without_time_range = text_splitter.split_documents(self.pages)
+                chunks_without_time_range = self.split_documents(chunker, self.pages, chunk_to_be_created)
                 chunks = get_chunks_with_timestamps(chunks_without_time_range[:chunk_to_be_created])
         else:
-            chunks = text_splitter.split_documents(self.pages)
+            chunks = self.split_documents(chunker, self.pages, chunk_to_be_created)
             
         chunks = chunks[:chunk_to_be_created]
         return chunks
\ No newline at end of file
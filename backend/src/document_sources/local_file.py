@@ -12,6 +12,8 @@ class ListLoader(BaseLoader):
        self.documents = documents
    def load(self):
        return self.documents
+   def lazy_load(self):
+       return iter(self.documents)
    
 def detect_encoding(file_path):
    """Detects the file encoding to avoid UnicodeDecodeError."""
@@ -43,6 +45,18 @@ def load_document_content(file_path):
         return loader,encoding_flag
     
 def get_documents_from_file_by_path(file_path,file_name):
+    file_name, pages, file_extension = iter_documents_from_file_by_path(file_path, file_name)
+    try:
+        pages = list(pages)
+    except Exception as e:
+        raise Exception(f'Error while reading the file content or metadata, {e}')
+    return file_name, pages , file_extension
+
+def iter_documents_from_file_by_path(file_path,file_name):
+    """
+    Same as get_documents_from_file_by_path, but pages are produced lazily by the loader,
+    so only the pages that are being chunked are held in memory.
+    """
     file_path = Path(file_path)
     if not file_path.exists():
         logging.info(f'File {file_name} does not exist')
@@ -52,20 +66,33 @@ def get_documents_from_file_by_path(file_path,file_name):
         loader, encoding_flag = load_document_content(file_path)
         file_extension = file_path.suffix.lower()
         if file_extension == ".pdf" or (file_extension == ".txt" and encoding_flag):
-            pages = loader.load()
+            pages = loader.lazy_load()
         else:
-            unstructured_pages = loader.load()
-            pages = get_pages_with_page_numbers(unstructured_pages)
+            pages = iter_pages_with_page_numbers(loader.lazy_load())
     except Exception as e:
         raise Exception(f'Error while reading the file content or metadata, {e}')
     return file_name, pages , file_extension
 
 def get_pages_with_page_numbers(unstructured_pages):
-    pages = []
+    return list(iter_pages_with_page_numbers(unstructured_pages))
+
+def _with_is_last(iterable):
+    iterator = iter(iterable)
+    try:
+        current = next(iterator)
+    except StopIteration:
+        return
+    for following in iterator:
+        yield current, False
+        current = following
+    yield current, True
+
+def iter_pages_with_page_numbers(unstructured_pages):
+    """Groups unstructured elements into pages, yielding each page as soon as it is complete."""
     page_number = 1
     page_content=''
     metadata = {}
-    for page in unstructured_pages:
+    for index, (page, is_last) in enumerate(_with_is_last(unstructured_pages)):
         if  'page_number' in page.metadata:
             if page.metadata['page_number']==page_number:
                 page_content += page.page_content
@@ -74,15 +101,15 @@ def get_pages_with_page_numbers(unstructured_pages):
                 
             if page.metadata['page_number']>page_number:
                 page_number+=1
-                pages.append(Document(page_content = page_content))
+                yield Document(page_content = page_content)
                 page_content='' 
                 
-            if page == unstructured_pages[-1]:
-                pages.append(Document(page_content = page_content))
+            if is_last:
+                yield Document(page_content = page_content)
                     
-        elif page.metadata['category']=='PageBreak' and page!=unstructured_pages[0]:
+        elif page.metadata['category']=='PageBreak' and index != 0:
             page_number+=1
-            pages.append(Document(page_content = page_content, metadata=metadata))
+            yield Document(page_content = page_content, metadata=metadata)
             page_content=''
             metadata={}
         
@@ -91,6 +118,5 @@ def get_pages_with_page_numbers(unstructured_pages):
             metadata_with_custom_page_number = {'source':page.metadata['source'],
                             'page_number':1, 'filename':page.metadata['filename'],
                             'filetype':page.metadata['filetype']}
-            if page == unstructured_pages[-1]:
-                    pages.append(Document(page_content = page_content, metadata=metadata_with_custom_page_number))
-    return pages                
+            if is_last:
+                    yield Document(page_content = page_content, metadata=metadata_with_custom_page_number)
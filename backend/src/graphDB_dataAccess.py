@@ -1,11 +1,14 @@
 import logging
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from neo4j.exceptions import TransientError
 from langchain_neo4j import Neo4jGraph
 from src.shared.common_fn import create_gcs_bucket_folder_name_hashed, delete_uploaded_local_file, load_embedding_model
 from src.document_sources.gcs_bucket import delete_file_from_gcs
-from src.shared.constants import BUCKET_UPLOAD,NODEREL_COUNT_QUERY_WITH_COMMUNITY, NODEREL_COUNT_QUERY_WITHOUT_COMMUNITY
+from src.shared.metrics import get_query_name, record_deadlock_retry, time_neo4j_query
+from src.shared.constants import (BUCKET_UPLOAD, NODEREL_COUNT_QUERY_FOR_DOCUMENTS, NODEREL_COUNT_QUERY_WITHOUT_COMMUNITY,
+                                  DOCUMENT_COUNTS_WRITE_QUERY, DOCUMENT_ENTITY_KEYS_QUERY, RECOUNT_PARTITION_SIZE, RECOUNT_MAX_CONCURRENCY)
 from src.entities.source_node import sourceNode
 from src.communities import MAX_COMMUNITY_LEVELS
 import json
@@ -256,14 +259,17 @@ class graphDBdataAccess:
                 else:
                     return {'message':"Connection Successful","gds_status": gds_status,"write_access":write_access}
 
-    def execute_query(self, query, param=None,max_retries=3, delay=2):
+    def execute_query(self, query, param=None,max_retries=3, delay=2, query_name=None):
+        query_name = get_query_name(query_name)
         retries = 0
         while retries < max_retries:
             try:
-                return self.graph.query(query, param,session_params={"database":self.graph._database})
+                with time_neo4j_query(query_name):
+                    return self.graph.query(query, param,session_params={"database":self.graph._database})
             except TransientError as e:
                 if "DeadlockDetected" in str(e):
                     retries += 1
+                    record_deadlock_retry(query_name)
                     logging.info(f"Deadlock detected. Retrying {retries}/{max_retries} in {delay} seconds...")
                     time.sleep(delay)  # Wait before retrying
                 else:
@@ -488,12 +494,12 @@ class graphDBdataAccess:
         return "Drop and Re-Create vector index succesfully"
 
 
-    def update_node_relationship_count(self,document_name):
+    def update_node_relationship_count(self,document_name, progress_callback=None):
         logging.info("updating node and relationship count")
         label_query = """CALL db.labels"""
         community_flag = {'label': '__Community__'} in self.execute_query(label_query)
         if (not document_name) and (community_flag):
-            result = self.execute_query(NODEREL_COUNT_QUERY_WITH_COMMUNITY)
+            return self.recount_documents(progress_callback=progress_callback)
         elif (not document_name) and (not community_flag):
              return []
         else:
@@ -503,53 +509,67 @@ class graphDBdataAccess:
         if result:
             for record in result:
                 filename = record.get("filename",None)
-                chunkNodeCount = int(record.get("chunkNodeCount",0))
-                chunkRelCount = int(record.get("chunkRelCount",0))
-                entityNodeCount = int(record.get("entityNodeCount",0))
-                entityEntityRelCount = int(record.get("entityEntityRelCount",0))
-                if (not document_name) and (community_flag):
-                    communityNodeCount = int(record.get("communityNodeCount",0))
-                    communityRelCount = int(record.get("communityRelCount",0))
-                else:
-                    communityNodeCount = 0
-                    communityRelCount = 0
-                nodeCount = int(chunkNodeCount) + int(entityNodeCount) + int(communityNodeCount)
-                relationshipCount = int(chunkRelCount) + int(entityEntityRelCount) + int(communityRelCount)
-                update_query = """
-                MATCH (d:Document {fileName: $filename})
-                SET d.chunkNodeCount = $chunkNodeCount,
-                    d.chunkRelCount = $chunkRelCount,
-                    d.entityNodeCount = $entityNodeCount,
-                    d.entityEntityRelCount = $entityEntityRelCount,
-                    d.communityNodeCount = $communityNodeCount,
-                    d.communityRelCount = $communityRelCount,
-                    d.nodeCount = $nodeCount,
-                    d.relationshipCount = $relationshipCount
-                """
-                self.execute_query(update_query,{
-                    "filename": filename,
-                    "chunkNodeCount": chunkNodeCount,
-                    "chunkRelCount": chunkRelCount,
-                    "entityNodeCount": entityNodeCount,
-                    "entityEntityRelCount": entityEntityRelCount,
-                    "communityNodeCount": communityNodeCount,
-                    "communityRelCount": communityRelCount,
-                    "nodeCount" : nodeCount,
-                    "relationshipCount" : relationshipCount
-                    })
-                
-                response[filename] = {"chunkNodeCount": chunkNodeCount,
-                    "chunkRelCount": chunkRelCount,
-                    "entityNodeCount": entityNodeCount,
-                    "entityEntityRelCount": entityEntityRelCount,
-                    "communityNodeCount": communityNodeCount,
-                    "communityRelCount": communityRelCount,
-                    "nodeCount" : nodeCount,
-                    "relationshipCount" : relationshipCount
-                    }
+                response[filename] = self._document_counts(record)
+                self.update_document_counts(filename, response[filename])
 
         return response
-    
+
+    @staticmethod
+    def _document_counts(record):
+        counts = {field: int(record.get(field) or 0) for field in ("chunkNodeCount", "chunkRelCount", "entityNodeCount",
+                                                                  "entityEntityRelCount", "communityNodeCount", "communityRelCount")}
+        counts["nodeCount"] = counts["chunkNodeCount"] + counts["entityNodeCount"] + counts["communityNodeCount"]
+        counts["relationshipCount"] = counts["chunkRelCount"] + counts["entityEntityRelCount"] + counts["communityRelCount"]
+        return counts
+
+    def recount_documents(self, partition_size=None, max_concurrency=None, progress_callback=None):
+        """
+        Recounts the nodes and relationships, communities included, of every Document.
+
+        Documents are counted in partitions of `partition_size` by up to `max_concurrency` concurrent
+        queries, and all counts are written back with a single UNWIND query.
+
+        Args:
+            progress_callback: called with the number of documents counted so far and the total after every
+                partition, logs the progress when None.
+        Returns:
+            dict: counts by file name, as update_node_relationship_count.
+        """
+        partition_size = partition_size or int(os.environ.get('RECOUNT_PARTITION_SIZE', RECOUNT_PARTITION_SIZE))
+        max_concurrency = max_concurrency or int(os.environ.get('RECOUNT_MAX_CONCURRENCY', RECOUNT_MAX_CONCURRENCY))
+        start = time.time()
+        filenames = [record["filename"] for record in self.execute_query(
+            "MATCH (d:Document) WHERE d.fileName IS NOT NULL RETURN d.fileName AS filename")]
+        partitions = [filenames[i:i + partition_size] for i in range(0, len(filenames), partition_size)]
+        progress_callback = progress_callback or (
+            lambda counted, total: logging.info(f"Recounted nodes and relationships of {counted}/{total} documents"))
+        response = {}
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            futures = [executor.submit(self.execute_query, NODEREL_COUNT_QUERY_FOR_DOCUMENTS, {"filenames": partition})
+                       for partition in partitions]
+            for future in as_completed(futures):
+                for record in future.result():
+                    response[record["filename"]] = self._document_counts(record)
+                progress_callback(len(response), len(filenames))
+        if response:
+            self.execute_query(DOCUMENT_COUNTS_WRITE_QUERY, {"rows": [{"filename": filename, **counts} for filename, counts in response.items()]})
+        logging.info(f"Recounted {len(response)} documents in {len(partitions)} partitions, time taken: {time.time() - start:.2f} seconds")
+        return response
+
+    def get_document_entity_keys(self, filename):
+        """
+        Returns:
+            tuple: the ids of the document's entities and the (source id, type, target id) of the relationships between them.
+        """
+        result = self.execute_query(DOCUMENT_ENTITY_KEYS_QUERY, {"document_name": filename})
+        if not result:
+            return [], []
+        return result[0]["entity_ids"], [tuple(key) for key in result[0]["relationship_keys"]]
+
+    def update_document_counts(self, filename, counts):
+        """Sets the node and relationship count properties of a Document from a counts dict."""
+        self.execute_query(DOCUMENT_COUNTS_WRITE_QUERY, {"rows": [{"filename": filename, **counts}]})
+
     def get_nodelabels_relationships(self):
         node_query = """
                     CALL db.labels() YIELD label
@@ -1,14 +1,15 @@
 import logging
 from neo4j import time 
-from neo4j import GraphDatabase
 import os
 import json
 
-from src.shared.constants import GRAPH_CHUNK_LIMIT,GRAPH_QUERY,CHUNK_TEXT_QUERY,COUNT_CHUNKS_QUERY,SCHEMA_VISUALIZATION_QUERY
+from src.shared.driver_registry import get_shared_driver
+from src.shared.constants import GRAPH_CHUNK_LIMIT,GRAPH_QUERY,GRAPH_STREAM_QUERY,GRAPH_STREAM_PAGE_SIZE,CHUNK_TEXT_QUERY,COUNT_CHUNKS_QUERY,SCHEMA_VISUALIZATION_QUERY
 
 def get_graphDB_driver(uri, username, password,database="neo4j"):
     """
-    Creates and returns a Neo4j database driver instance configured with the provided credentials.
+    Returns the process-wide Neo4j driver for the provided credentials, creating it on first use.
+    The driver is shared between requests and must not be closed by the caller.
 
     Returns:
     Neo4j.Driver: A driver object for interacting with the Neo4j database.
@@ -21,11 +22,7 @@ def get_graphDB_driver(uri, username, password,database="neo4j"):
             database= os.getenv('NEO4J_DATABASE')
             password= os.getenv('NEO4J_PASSWORD')
 
-        enable_user_agent = os.environ.get("ENABLE_USER_AGENT", "False").lower() in ("true", "1", "yes")
-        if enable_user_agent:
-            driver = GraphDatabase.driver(uri, auth=(username, password),database=database, user_agent=os.environ.get('NEO4J_USER_AGENT'))
-        else:
-            driver = GraphDatabase.driver(uri, auth=(username, password),database=database)
+        driver = get_shared_driver(uri, username, password, database)
         logging.info("Connection successful")
         return driver
     except Exception as e:
@@ -33,7 +30,7 @@ def get_graphDB_driver(uri, username, password,database="neo4j"):
         logging.error(error_message, exc_info=True)
 
 
-def execute_query(driver, query, document_names, doc_limit=None):
+def execute_query(driver, query, document_names, doc_limit=None, **params):
     """
     Executes a specified query using the Neo4j driver with document_names parameter.
 
@@ -42,13 +39,14 @@ def execute_query(driver, query, document_names, doc_limit=None):
         query (str): Cypher query to execute
         document_names (list): List of document names to filter by
         doc_limit (int, optional): Document limit (not used in current implementation)
+        params: Other query parameters
 
     Returns:
     tuple: Contains records, summary of the execution, and keys of the records.
     """
     try:
         logging.info(f"Executing query for documents: {document_names}")
-        records, summary, keys = driver.execute_query(query, document_names=document_names)
+        records, summary, keys = driver.execute_query(query, document_names=document_names, **params)
         return records, summary, keys
     except Exception as e:
         error_message = f"graph_query module: Failed to execute the query. Error: {str(e)}"
@@ -57,116 +55,47 @@ def execute_query(driver, query, document_names, doc_limit=None):
         raise
 
 
-def process_node(node):
-    """
-    Processes a node from a Neo4j database, extracting its ID, labels, and properties,
-    while omitting certain properties like 'embedding' and 'text'.
+# Properties too large to send to the graph visualization
+EXCLUDED_NODE_PROPERTIES = frozenset(["embedding", "text", "summary"])
 
-    Returns:
-    dict: A dictionary with the node's element ID, labels, and other properties,
-          with datetime objects formatted as ISO strings.
+def get_node_projection_params():
     """
-    try:
-        labels = set(node.labels)
-        labels.discard("__Entity__")
-        if not labels:
-            labels.add('*')
-        
-        node_element = {
-            "element_id": node.element_id,
-            "labels": list(labels),
-            "properties": {}
-        }
-        # logging.info(f"Processing node with element ID: {node.element_id}")
-
-        for key in node:
-            if key in ["embedding", "text", "summary"]:
-                continue
-            value = node.get(key)
-            if isinstance(value, time.DateTime):
-                node_element["properties"][key] = value.isoformat()
-                # logging.debug(f"Processed datetime property for {key}: {value.isoformat()}")
-            else:
-                node_element["properties"][key] = value
-
-        return node_element
-    except Exception as e:
-        logging.error("graph_query module:An unexpected error occurred while processing the node")
-
-def extract_node_elements(records):
+    Returns the parameters of GRAPH_NODE_PROJECTION: the GRAPH_NODE_PROPERTIES whitelist, a comma separated
+    list of the node properties sent to the graph visualization, and the properties excluded when it is empty.
     """
-    Extracts and processes unique nodes from a list of records, avoiding duplication by tracking seen element IDs.
+    node_properties = [key.strip() for key in os.environ.get('GRAPH_NODE_PROPERTIES', '').split(',') if key.strip()]
+    return {"node_properties": node_properties, "excluded_properties": sorted(EXCLUDED_NODE_PROPERTIES)}
 
-    Returns:
-    list of dict: A list containing processed node dictionaries.
+def process_projected_node(node):
     """
-    node_elements = []
-    seen_element_ids = set()  
-
-    try:
-        for record in records:
-            nodes = record.get("nodes", [])
-            if not nodes:
-                # logging.debug(f"No nodes found in record: {record}")
-                continue
-
-            for node in nodes:
-                if node.element_id in seen_element_ids:
-                    # logging.debug(f"Skipping already processed node with ID: {node.element_id}")
-                    continue
-                seen_element_ids.add(node.element_id)
-                node_element = process_node(node) 
-                node_elements.append(node_element)
-                # logging.info(f"Processed node with ID: {node.element_id}")
-
-        return node_elements
-    except Exception as e:
-        logging.error("graph_query module: An error occurred while extracting node elements from records")
-
-def extract_relationships(records):
+    Shapes a node map projected by GRAPH_NODE_PROJECTION for the graph visualization: the __Entity__ label
+    is dropped and datetime properties are formatted as ISO strings.
+    """
+    node["labels"] = [label for label in node["labels"] if label != "__Entity__"] or ['*']
+    properties = node["properties"]
+    for key, value in properties.items():
+        if isinstance(value, time.DateTime):
+            properties[key] = value.isoformat()
+    return node
+
+def extract_graph_elements(records):
     """
-    Extracts and processes relationships from a list of records, ensuring that each relationship is processed
-    only once by tracking seen element IDs.
+    Shapes the nodes and relationships of GRAPH_QUERY records for the graph visualization. The query
+    returns them distinct and projected, so only the node labels and datetime properties are reshaped.
+    A node that cannot be shaped is logged and left out instead of failing the whole graph.
 
     Returns:
-    list of dict: A list containing dictionaries of processed relationships.
+    tuple: The list of node dictionaries and the list of relationship dictionaries.
     """
-    all_relationships = []
-    seen_element_ids = set()
-
-    try:
-        for record in records:
-            relationships = []
-            relations = record.get("rels", [])
-            if not relations:
-                continue
-
-            for relation in relations:
-                if relation.element_id in seen_element_ids:
-                    # logging.debug(f"Skipping already processed relationship with ID: {relation.element_id}")
-                    continue
-                seen_element_ids.add(relation.element_id)
-
-                try:
-                    nodes = relation.nodes
-                    if len(nodes) < 2:
-                        logging.warning(f"Relationship with ID {relation.element_id} does not have two nodes.")
-                        continue
-
-                    relationship = {
-                        "element_id": relation.element_id,
-                        "type": relation.type,
-                        "start_node_element_id": process_node(nodes[0])["element_id"],
-                        "end_node_element_id": process_node(nodes[1])["element_id"],
-                    }
-                    relationships.append(relationship)
-
-                except Exception as inner_e:
-                    logging.error(f"graph_query module: Failed to process relationship with ID {relation.element_id}. Error: {inner_e}", exc_info=True)
-            all_relationships.extend(relationships)
-        return all_relationships
-    except Exception as e:
-        logging.error("graph_query module: An error occurred while extracting relationships from records", exc_info=True)
+    nodes = []
+    for record in records:
+        for node in record["nodes"]:
+            try:
+                nodes.append(process_projected_node(node))
+            except Exception as e:
+                logging.error(f"graph_query module: Failed to process node {node.get('element_id')}. Error: {e}", exc_info=True)
+    relationships = [relationship for record in records for relationship in record["rels"]]
+    return nodes, relationships
 
 
 def get_completed_documents(driver):
@@ -189,6 +118,30 @@ def get_completed_documents(driver):
     return documents
 
 
+def parse_document_names(document_names):
+    """
+    Parses the JSON list of document names sent by the UI.
+
+    Returns:
+    list: The document names, empty when document_names is empty, null or not provided.
+
+    Raises:
+    ValueError: When document_names is not valid JSON.
+    """
+    if not document_names or document_names.strip() == "" or document_names.lower() == "null":
+        logging.warning("document_names is empty, null, or not provided. Returning empty result.")
+        return []
+    try:
+        document_names_list = list(map(str, json.loads(document_names)))
+    except json.JSONDecodeError as json_error:
+        logging.error(f"Invalid JSON in document_names: {document_names}. Error: {json_error}")
+        raise ValueError(f"Invalid JSON format in document_names parameter: {document_names}")
+    logging.info(f"Parsed document_names: {document_names_list}")
+    if not document_names_list:
+        logging.warning("document_names list is empty. Returning empty result.")
+    return document_names_list
+
+
 def get_graph_results(uri, username, password, database, document_names):
     """
     Retrieves graph data by executing a specified Cypher query using credentials and parameters provided.
@@ -208,32 +161,16 @@ def get_graph_results(uri, username, password, database, document_names):
         logging.info(f"Starting graph query process")
         driver = get_graphDB_driver(uri, username, password, database)  
         
-        # Validate and parse document_names
-        if not document_names or document_names.strip() == "" or document_names.lower() == "null":
-            logging.warning("document_names is empty, null, or not provided. Returning empty result.")
+        document_names_list = parse_document_names(document_names)
+        if not document_names_list:
             return {
                 "nodes": [],
                 "relationships": []
             }
-        else:
-            try:
-                document_names_list = list(map(str, json.loads(document_names)))
-                logging.info(f"Parsed document_names: {document_names_list}")
-                
-                if not document_names_list:
-                    logging.warning("document_names list is empty. Returning empty result.")
-                    return {
-                        "nodes": [],
-                        "relationships": []
-                    }
-            except json.JSONDecodeError as json_error:
-                logging.error(f"Invalid JSON in document_names: {document_names}. Error: {json_error}")
-                raise ValueError(f"Invalid JSON format in document_names parameter: {document_names}")
-        
+
         query = GRAPH_QUERY.format(graph_chunk_limit=GRAPH_CHUNK_LIMIT)
-        records, summary, keys = execute_query(driver, query.strip(), document_names_list)
-        document_nodes = extract_node_elements(records)
-        document_relationships = extract_relationships(records)
+        records, summary, keys = execute_query(driver, query.strip(), document_names_list, **get_node_projection_params())
+        document_nodes, document_relationships = extract_graph_elements(records)
 
         logging.info(f"no of nodes : {len(document_nodes)}")
         logging.info(f"no of relations : {len(document_relationships)}")
@@ -247,9 +184,47 @@ def get_graph_results(uri, username, password, database, document_names):
     except Exception as e:
         logging.error(f"graph_query module: An error occurred in get_graph_results. Error: {str(e)}")
         raise Exception(f"graph_query module: An error occurred in get_graph_results. Please check the logs for more details.") from e
-    finally:
-        logging.info("Closing connection for graph_query api")
-        driver.close()
+
+
+def stream_graph_results(uri, username, password, database, document_names, page_size=None):
+    """
+    Streams the graph of the documents as pages of nodes and relationships, shaped like get_graph_results.
+    The query is not sorted, so pages are sent as the driver fetches the records instead of once the
+    whole graph was read, and nodes come before relationships, as the relationships branch of the query
+    runs after the nodes one.
+
+    Args:
+    uri (str): The URI for the Neo4j database.
+    username (str): The username for authentication.
+    password (str): The password for authentication.
+    database (str): The database name.
+    document_names (str): JSON string containing list of document names.
+    page_size (int): Nodes and relationships per page, defaults to GRAPH_STREAM_PAGE_SIZE.
+
+    Yields:
+    dict: Pages with nodes and relationships, then a last empty page with done set.
+    """
+    document_names_list = parse_document_names(document_names)
+    page_size = page_size or int(os.environ.get('GRAPH_STREAM_PAGE_SIZE', GRAPH_STREAM_PAGE_SIZE))
+    rows = 0
+    if document_names_list:
+        driver = get_graphDB_driver(uri, username, password, database)
+        query = GRAPH_STREAM_QUERY.format(graph_chunk_limit=GRAPH_CHUNK_LIMIT)
+        nodes, relationships = [], []
+        with driver.session(database=database) as session:
+            for record in session.run(query.strip(), document_names=document_names_list, **get_node_projection_params()):
+                rows += 1
+                if record["rel"] is None:
+                    nodes.append(process_projected_node(record["node"]))
+                else:
+                    relationships.append(record["rel"])
+                if len(nodes) + len(relationships) >= page_size:
+                    yield {"nodes": nodes, "relationships": relationships}
+                    nodes, relationships = [], []
+        if nodes or relationships:
+            yield {"nodes": nodes, "relationships": relationships}
+        logging.info(f"Streamed {rows} nodes and relationships")
+    yield {"nodes": [], "relationships": [], "done": True}
 
 
 def get_chunktext_results(uri, username, password, database, document_name, page_no):
@@ -282,9 +257,6 @@ def get_chunktext_results(uri, username, password, database, document_name, page
    except Exception as e:
        logging.error(f"An error occurred in get_chunktext_results. Error: {str(e)}")
        raise Exception("An error occurred in get_chunktext_results. Please check the logs for more details.") from e
-   finally:
-       if driver:
-           driver.close()
 
 
 def visualize_schema(uri, userName, password, database):
@@ -301,6 +273,3 @@ def visualize_schema(uri, userName, password, database):
    except Exception as e:
        logging.error(f"An error occurred schema retrieval. Error: {str(e)}")
        raise Exception(f"An error occurred schema retrieval. Error: {str(e)}")
-   finally:
-       if driver:
-           driver.close()
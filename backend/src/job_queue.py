@@ -0,0 +1,225 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+QUEUED = "Queued"
+RUNNING = "Running"
+COMPLETED = "Completed"
+FAILED = "Failed"
+
+# Credentials are never written to disk. They are kept in memory for the lifetime of the process,
+# so jobs interrupted by a restart fail and have to be resubmitted by the user who owns them.
+SECRET_FIELDS = ("password", "aws_secret_access_key", "access_token")
+RESUBMIT_MESSAGE = "The extraction job was interrupted by a restart and its credentials were not kept, resubmit the file"
+
+
+class JobQueue:
+    """
+    Durable FIFO queue of extraction jobs stored in SQLite, processed by a pool of asyncio workers.
+
+    A worker only picks a job when fewer than `max_jobs_per_model` jobs of the same model and fewer
+    than `max_jobs_per_database` jobs against the same database are running, otherwise it takes the
+    next eligible job. Jobs left by a previous process are marked Failed on start, see `recover`.
+    """
+
+    def __init__(self, path: str, max_workers: int = 2, max_jobs_per_model: int = 2, max_jobs_per_database: int = 2,
+                 poll_interval: float = 1.0):
+        self.path = path
+        self.max_workers = max(1, int(max_workers))
+        self.max_jobs_per_model = max(1, int(max_jobs_per_model))
+        self.max_jobs_per_database = max(1, int(max_jobs_per_database))
+        self.poll_interval = poll_interval
+        self._secrets = {}
+        self._lock = threading.Lock()
+        self._workers = []
+        self._wakeup = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT UNIQUE NOT NULL, "
+            "status TEXT NOT NULL, model TEXT, database_key TEXT, file_name TEXT, payload TEXT NOT NULL, "
+            "result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, "
+            "started_at REAL, finished_at REAL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, seq)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_file ON jobs (database_key, file_name)")
+
+    def enqueue(self, payload: dict, model: str, database_key: str, file_name: str) -> str:
+        job_id = uuid.uuid4().hex
+        stored_payload = {key: value for key, value in payload.items() if key not in SECRET_FIELDS}
+        with self._lock:
+            self._secrets[job_id] = {key: payload.get(key) for key in SECRET_FIELDS if key in payload}
+            self._connection.execute(
+                "INSERT INTO jobs (id, status, model, database_key, file_name, payload, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, model, database_key, file_name, json.dumps(stored_payload), time.time()))
+        logging.info(f"Queued extraction job {job_id} for {file_name} with model {model}")
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    def recover(self) -> int:
+        """
+        Queues again the Running jobs whose credentials are still known to this process. Jobs whose
+        credentials were lost with the previous process are marked Failed with a message asking to
+        resubmit them, as running them with other credentials would bypass the database's access control.
+
+        Returns:
+            int: the number of jobs queued again.
+        """
+        requeued = 0
+        failed = 0
+        with self._lock:
+            rows = self._connection.execute("SELECT id, status FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)).fetchall()
+            for row in rows:
+                if row["id"] not in self._secrets:
+                    self._connection.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                                             (FAILED, RESUBMIT_MESSAGE, time.time(), row["id"]))
+                    failed += 1
+                    continue
+                if row["status"] == RUNNING:
+                    self._connection.execute("UPDATE jobs SET status = ?, started_at = NULL WHERE id = ?", (QUEUED, row["id"]))
+                    requeued += 1
+        if requeued:
+            logging.info(f"Requeued {requeued} interrupted extraction jobs")
+        if failed:
+            logging.warning(f"Failed {failed} extraction jobs whose credentials were lost on restart")
+        return requeued
+
+    def claim_next(self):
+        """
+        Marks the oldest queued job that fits the per-model and per-database limits as Running.
+
+        Returns:
+            dict: the job with its payload (secrets included when still known), or None.
+        """
+        with self._lock:
+            running = self._connection.execute("SELECT model, database_key FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+            running_per_model = {}
+            running_per_database = {}
+            for row in running:
+                running_per_model[row["model"]] = running_per_model.get(row["model"], 0) + 1
+                running_per_database[row["database_key"]] = running_per_database.get(row["database_key"], 0) + 1
+            for row in self._connection.execute("SELECT * FROM jobs WHERE status = ? ORDER BY seq", (QUEUED,)):
+                if running_per_model.get(row["model"], 0) >= self.max_jobs_per_model:
+                    continue
+                if running_per_database.get(row["database_key"], 0) >= self.max_jobs_per_database:
+                    continue
+                self._connection.execute("UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                                         (RUNNING, time.time(), row["id"]))
+                job = self._row_to_job(row)
+                job["status"] = RUNNING
+                job["payload"].update(self._secrets.get(row["id"], {}))
+                return job
+        return None
+
+    def finish(self, job_id: str, status: str, result=None, error: str = None):
+        with self._lock:
+            self._connection.execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                                     (status, json.dumps(result, default=str) if result is not None else None, error, time.time(), job_id))
+            self._secrets.pop(job_id, None)
+
+    @staticmethod
+    def _row_to_job(row):
+        return {
+            "job_id": row["id"], "status": row["status"], "model": row["model"], "database_key": row["database_key"],
+            "file_name": row["file_name"], "payload": json.loads(row["payload"]),
+            "result": json.loads(row["result"]) if row["result"] else None, "error": row["error"],
+            "attempts": row["attempts"], "created_at": row["created_at"], "started_at": row["started_at"],
+            "finished_at": row["finished_at"], "seq": row["seq"],
+        }
+
+    def get_job(self, job_id: str):
+        with self._lock:
+            row = self._connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def get_latest_job(self, database_key: str, file_name: str):
+        with self._lock:
+            row = self._connection.execute("SELECT * FROM jobs WHERE database_key = ? AND file_name = ? ORDER BY seq DESC LIMIT 1",
+                                           (database_key, file_name)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def get_queue_position(self, job_id: str) -> int:
+        """Returns the 1-based position of a queued job, or 0 when it is not waiting."""
+        with self._lock:
+            row = self._connection.execute("SELECT seq, status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row["status"] != QUEUED:
+                return 0
+            return self._connection.execute("SELECT COUNT(*) FROM jobs WHERE status = ? AND seq <= ?", (QUEUED, row["seq"])).fetchone()[0]
+
+    def count_active_jobs(self) -> dict:
+        """Returns the number of Queued and Running jobs."""
+        with self._lock:
+            rows = self._connection.execute("SELECT status, COUNT(*) FROM jobs WHERE status IN (?, ?) GROUP BY status",
+                                            (QUEUED, RUNNING)).fetchall()
+        return {QUEUED: 0, RUNNING: 0, **{row[0]: row[1] for row in rows}}
+
+    async def _worker(self, index: int, handler):
+        while True:
+            job = await asyncio.to_thread(self.claim_next)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            logging.info(f"Worker {index} started extraction job {job['job_id']} for {job['file_name']}")
+            try:
+                result = await handler(job["payload"])
+                status = FAILED if isinstance(result, dict) and result.get("status") == "Failed" else COMPLETED
+                await asyncio.to_thread(self.finish, job["job_id"], status, result, result.get("error") if isinstance(result, dict) else None)
+            except asyncio.CancelledError:
+                # Left Running on purpose so that it is recovered on the next start
+                raise
+            except Exception as e:
+                logging.exception(f"Extraction job {job['job_id']} failed: {e}")
+                await asyncio.to_thread(self.finish, job["job_id"], FAILED, None, str(e))
+            logging.info(f"Worker {index} finished extraction job {job['job_id']}")
+            # A finished job may let a job held back by the per-model or per-database limit start
+            self._wakeup.set()
+
+    def start(self, handler):
+        """
+        Starts the worker pool on the running event loop.
+
+        Args:
+            handler: async callable receiving a job payload and returning its API response dict.
+        """
+        self.recover()
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.ensure_future(self._worker(index, handler)) for index in range(self.max_workers)]
+        logging.info(f"Started {self.max_workers} extraction workers, max {self.max_jobs_per_model} jobs per model "
+                     f"and {self.max_jobs_per_database} per database")
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+def is_job_queue_enabled() -> bool:
+    return os.environ.get("EXTRACT_JOB_QUEUE_ENABLED", "False").lower() in ("true", "1", "yes")
+
+
+_job_queue = None
+
+
+def get_job_queue() -> JobQueue:
+    """Returns the process-wide job queue configured from the EXTRACT_JOB_* environment variables."""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(
+            os.environ.get("EXTRACT_JOB_QUEUE_PATH") or os.path.join("data", "extract_jobs.sqlite"),
+            max_workers=int(os.environ.get("EXTRACT_JOB_WORKERS", 2)),
+            max_jobs_per_model=int(os.environ.get("EXTRACT_JOB_MAX_PER_MODEL", 2)),
+            max_jobs_per_database=int(os.environ.get("EXTRACT_JOB_MAX_PER_DATABASE", 2)),
+        )
+    return _job_queue
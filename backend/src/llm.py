@@ -1,4 +1,7 @@
+import hashlib
 import logging
+import threading
+import time
 from langchain.docstore.document import Document
 import os
 from langchain_openai import ChatOpenAI, AzureChatOpenAI
@@ -15,12 +18,27 @@ import boto3
 import google.auth
 from src.shared.constants import ADDITIONAL_INSTRUCTIONS
 from src.shared.llm_graph_builder_exception import LLMGraphBuilderException
+from src.shared.extraction_scheduler import get_extraction_scheduler, estimate_tokens
+from src.shared.extraction_cache import get_extraction_cache, extraction_cache_key, serialize_graph_document, deserialize_graph_document
+from src.shared.metrics import record_llm_request
+from functools import partial
 import re
 from typing import List
 from src.environment_config import get_env_var
 
+# Configured chat clients by model, with a hash of the LLM_MODEL_CONFIG_* value they were built from
+_llm_clients = {}
+_llm_clients_lock = threading.Lock()
+
+
 def get_llm(model: str):
-    """Retrieve the specified language model based on the model name."""
+    """
+    Retrieve the specified language model based on the model name.
+
+    Clients are built once per model and shared by every caller so that their HTTP connection pools
+    (and the Gemini credentials, which refresh themselves when they expire) are reused across batches
+    and chains. A client is rebuilt when its LLM_MODEL_CONFIG_* value changes.
+    """
     model = model.lower().strip()
     env_key = f"LLM_MODEL_CONFIG_{model}"
     env_value = get_env_var(env_key)
@@ -29,8 +47,23 @@ def get_llm(model: str):
         err = f"Environment variable '{env_key}' is not defined as per format or missing"
         logging.error(err)
         raise Exception(err)
-    
-    logging.info("Model: {}".format(env_key))
+
+    config_hash = hashlib.sha256(env_value.encode()).hexdigest()
+    with _llm_clients_lock:
+        cached = _llm_clients.get(model)
+        if cached is not None and cached[0] == config_hash:
+            return cached[1], cached[2]
+        # Built under the lock so that concurrent batches do not each construct a client
+        llm, model_name = create_llm(model, env_value)
+        if cached is not None:
+            logging.info(f"{env_key} changed, rebuilt LLM client")
+        _llm_clients[model] = (config_hash, llm, model_name)
+        return llm, model_name
+
+
+def create_llm(model: str, env_value: str):
+    """Build a new chat client for the model from its LLM_MODEL_CONFIG_* value."""
+    logging.info("Model: LLM_MODEL_CONFIG_{}".format(model))
     try:
         if "gemini" in model:
             model_name = env_value
@@ -165,7 +198,7 @@ def get_chunk_id_as_doc_metadata(chunkId_chunkDoc_list):
       
 
 async def get_graph_document_list(
-    llm, combined_chunk_document_list, allowedNodes, allowedRelationship, additional_instructions=None
+    llm, combined_chunk_document_list, allowedNodes, allowedRelationship, additional_instructions=None, model=None
 ):
     if additional_instructions:
         additional_instructions = sanitize_additional_instruction(additional_instructions)
@@ -196,8 +229,62 @@ async def get_graph_document_list(
     if isinstance(llm,DiffbotGraphTransformer):
         graph_document_list = llm_transformer.convert_to_graph_documents(combined_chunk_document_list)
     else:
-        graph_document_list = await llm_transformer.aconvert_to_graph_documents(combined_chunk_document_list)
-    return graph_document_list
+        scheduler = get_extraction_scheduler(model or get_llm_model_name(llm))
+        prompt_tokens = estimate_tokens(ADDITIONAL_INSTRUCTIONS + (additional_instructions or ""))
+        cache = get_extraction_cache()
+        cache_keys = [
+            extraction_cache_key(f"{model}:{get_llm_model_name(llm)}", allowedNodes, allowedRelationship,
+                                 ADDITIONAL_INSTRUCTIONS, additional_instructions, document.page_content)
+            for document in combined_chunk_document_list
+        ]
+        cached = get_cached_graph_documents(cache, cache_keys, combined_chunk_document_list)
+        graph_document_list = [cached.get(index) for index in range(len(combined_chunk_document_list))]
+        pending = [index for index, graph_document in enumerate(graph_document_list) if graph_document is None]
+        logging.info(f"Extraction cache hits: {len(combined_chunk_document_list) - len(pending)}/{len(combined_chunk_document_list)}")
+        requests = []
+        for index in pending:
+            tokens = prompt_tokens + estimate_tokens(combined_chunk_document_list[index].page_content)
+            requests.append((partial(extract_and_cache, llm_transformer, cache, cache_keys[index], combined_chunk_document_list[index],
+                                     scheduler.model, tokens),
+                             tokens, f"extraction of combined chunk {index}"))
+        extracted = await scheduler.run_all(requests)
+        for index, graph_document in zip(pending, extracted):
+            graph_document_list[index] = graph_document
+    return list(graph_document_list)
+
+def get_cached_graph_documents(cache, cache_keys, combined_chunk_document_list):
+    """Returns the cached GraphDocument per index of combined_chunk_document_list, skipping unreadable entries."""
+    if cache is None:
+        return {}
+    try:
+        values = cache.get_many(cache_keys)
+    except Exception as e:
+        logging.warning(f"Extraction cache lookup failed: {e}")
+        return {}
+    cached = {}
+    for index, key in enumerate(cache_keys):
+        if key in values:
+            try:
+                cached[index] = deserialize_graph_document(values[key], combined_chunk_document_list[index])
+            except Exception as e:
+                logging.warning(f"Ignoring unreadable extraction cache entry {key}: {e}")
+    return cached
+
+async def extract_and_cache(llm_transformer, cache, cache_key, document, model=None, estimated_tokens=0):
+    """Extracts one combined chunk and stores the result as soon as it arrives, so a later failure does not lose it."""
+    start = time.perf_counter()
+    try:
+        graph_document = await llm_transformer.aprocess_response(document)
+    except Exception:
+        record_llm_request(model, "extraction", time.perf_counter() - start, "error", estimated_tokens)
+        raise
+    record_llm_request(model, "extraction", time.perf_counter() - start, "success", estimated_tokens)
+    if cache is not None:
+        try:
+            cache.set(cache_key, serialize_graph_document(graph_document))
+        except Exception as e:
+            logging.warning(f"Failed to store extraction in cache: {e}")
+    return graph_document
 
 async def get_graph_from_llm(model, chunkId_chunkDoc_list, allowedNodes, allowedRelationship, chunks_to_combine, additional_instructions=None):
    try:
@@ -232,7 +319,8 @@ async def get_graph_from_llm(model, chunkId_chunkDoc_list, allowedNodes, allowed
            combined_chunk_document_list,
            allowed_nodes,
            allowed_relationships,
-           additional_instructions
+           additional_instructions,
+           model
        )
        logging.info(f"Generated {len(graph_document_list)} graph documents")
        return graph_document_list
@@ -5,15 +5,14 @@ from src.shared.constants import (BUCKET_UPLOAD,BUCKET_FAILED_FILE, PROJECT_ID,
                                   QUERY_TO_GET_LAST_PROCESSED_CHUNK_WITHOUT_ENTITY,
                                   START_FROM_BEGINNING,
                                   START_FROM_LAST_PROCESSED_POSITION,
-                                  DELETE_ENTITIES_AND_START_FROM_BEGINNING,
-                                  QUERY_TO_GET_NODES_AND_RELATIONS_OF_A_DOCUMENT)
+                                  DELETE_ENTITIES_AND_START_FROM_BEGINNING)
 from src.shared.schema_extraction import schema_extraction_from_text
 from dotenv import load_dotenv
 from datetime import datetime
 import logging
 from src.create_chunks import CreateChunksofDocument
 from src.graphDB_dataAccess import graphDBdataAccess
-from src.document_sources.local_file import get_documents_from_file_by_path
+from src.document_sources.local_file import iter_documents_from_file_by_path
 from src.entities.source_node import sourceNode
 from src.llm import get_graph_from_llm
 from src.document_sources.gcs_bucket import *
@@ -24,6 +23,17 @@ from src.shared.common_fn import *
 from src.make_relationships import *
 from src.document_sources.web_pages import *
 from src.graph_query import get_graphDB_driver
+from src.shared.pipeline import PipelineStage, run_pipeline
+from src.shared.progress_bus import publish_progress
+from src.shared.document_counts import DocumentCounts
+from src.shared.entity_normalization import EntityNormalizer
+from src.shared.batch_controller import get_batch_controller
+from src.shared.extraction_scheduler import get_extraction_scheduler
+from src.shared.cancellation import ExtractionCancelled, cancel_extraction, register_extraction, unregister_extraction
+from src.shared.tracing import current_span, start_span, trace_span
+import asyncio
+import itertools
+from functools import partial
 import re
 from langchain_community.document_loaders import WikipediaLoader, WebBaseLoader
 import warnings
@@ -231,14 +241,21 @@ async def extract_graph_from_file_local_file(uri, userName, password, database,
 
   logging.info(f'Process file name :{fileName}')
   if not retry_condition:
-    gcs_file_cache = os.environ.get('GCS_FILE_CACHE')
-    if gcs_file_cache == 'True':
-      folder_name = create_gcs_bucket_folder_name_hashed(uri, fileName)
-      file_name, pages = get_documents_from_gcs( PROJECT_ID, BUCKET_UPLOAD, folder_name, fileName)
-    else:
-      file_name, pages, file_extension = get_documents_from_file_by_path(merged_file_path,fileName)
-    if pages==None or len(pages)==0:
+    with trace_span("extract.load", {"source_type": "local file"}) as load_span:
+      gcs_file_cache = os.environ.get('GCS_FILE_CACHE')
+      if gcs_file_cache == 'True':
+        folder_name = create_gcs_bucket_folder_name_hashed(uri, fileName)
+        file_name, pages = get_documents_from_gcs( PROJECT_ID, BUCKET_UPLOAD, folder_name, fileName)
+      else:
+        file_name, pages, file_extension = iter_documents_from_file_by_path(merged_file_path,fileName)
+      # Pages are streamed, so only the first one is read here to check that the file has content;
+      # the time spent loading the other pages is part of the chunk spans
+      pages = iter(pages or [])
+      first_page = next(pages, None)
+      set_load_attributes(load_span, [first_page] if first_page is not None else [])
+    if first_page is None:
       raise LLMGraphBuilderException(f'File content is not available for file : {file_name}')
+    pages = itertools.chain([first_page], pages)
     return await processing_source(uri, userName, password, database, model, file_name, pages, allowedNodes, allowedRelationship, token_chunk_size, chunk_overlap, chunks_to_combine, True, merged_file_path, additional_instructions=additional_instructions)
   else:
     return await processing_source(uri, userName, password, database, model, fileName, [], allowedNodes, allowedRelationship, token_chunk_size, chunk_overlap, chunks_to_combine, True, merged_file_path, retry_condition, additional_instructions=additional_instructions)
@@ -249,7 +266,9 @@ async def extract_graph_from_file_s3(uri, userName, password, database, model, s
       raise LLMGraphBuilderException('Please provide AWS access and secret keys')
     else:
       logging.info("Insert in S3 Block")
-      file_name, pages = get_documents_from_s3(source_url, aws_access_key_id, aws_secret_access_key)
+      with trace_span("extract.load", {"source_type": "s3 bucket"}) as load_span:
+        file_name, pages = get_documents_from_s3(source_url, aws_access_key_id, aws_secret_access_key)
+        set_load_attributes(load_span, pages)
 
     if pages==None or len(pages)==0:
       raise LLMGraphBuilderException(f'File content is not available for file : {file_name}')
@@ -259,7 +278,9 @@ async def extract_graph_from_file_s3(uri, userName, password, database, model, s
   
 async def extract_graph_from_web_page(uri, userName, password, database, model, source_url, file_name, allowedNodes, allowedRelationship, token_chunk_size, chunk_overlap, chunks_to_combine, retry_condition, additional_instructions):
   if not retry_condition:
-    pages = get_documents_from_web_page(source_url)
+    with trace_span("extract.load", {"source_type": "web-url"}) as load_span:
+      pages = get_documents_from_web_page(source_url)
+      set_load_attributes(load_span, pages)
     if pages==None or len(pages)==0:
       raise LLMGraphBuilderException(f'Content is not available for given URL : {file_name}')
     return await processing_source(uri, userName, password, database, model, file_name, pages, allowedNodes, allowedRelationship, token_chunk_size, chunk_overlap, chunks_to_combine, additional_instructions=additional_instructions)
@@ -268,7 +289,9 @@ async def extract_graph_from_web_page(uri, userName, password, database, model,
   
 async def extract_graph_from_file_youtube(uri, userName, password, database, model, source_url, file_name, allowedNodes, allowedRelationship, token_chunk_size, chunk_overlap, chunks_to_combine, retry_condition, additional_instructions):
   if not retry_condition:
-    file_name, pages = get_documents_from_youtube(source_url)
+    with trace_span("extract.load", {"source_type": "youtube"}) as load_span:
+      file_name, pages = get_documents_from_youtube(source_url)
+      set_load_attributes(load_span, pages)
 
     if pages==None or len(pages)==0:
       raise LLMGraphBuilderException(f'Youtube transcript is not available for file : {file_name}')
@@ -278,7 +301,9 @@ async def extract_graph_from_file_youtube(uri, userName, password, database, mod
     
 async def extract_graph_from_file_Wikipedia(uri, userName, password, database, model, wiki_query, language, file_name, allowedNodes, allowedRelationship, token_chunk_size, chunk_overlap, chunks_to_combine, retry_condition, additional_instructions):
   if not retry_condition:
-    file_name, pages = get_documents_from_Wikipedia(wiki_query, language)
+    with trace_span("extract.load", {"source_type": "Wikipedia"}) as load_span:
+      file_name, pages = get_documents_from_Wikipedia(wiki_query, language)
+      set_load_attributes(load_span, pages)
     if pages==None or len(pages)==0:
       raise LLMGraphBuilderException(f'Wikipedia page is not available for file : {file_name}')
     return await processing_source(uri, userName, password, database, model, file_name, pages, allowedNodes, allowedRelationship, token_chunk_size, chunk_overlap, chunks_to_combine, additional_instructions=additional_instructions)
@@ -287,13 +312,23 @@ async def extract_graph_from_file_Wikipedia(uri, userName, password, database, m
 
 async def extract_graph_from_file_gcs(uri, userName, password, database, model, gcs_project_id, gcs_bucket_name, gcs_bucket_folder, gcs_blob_filename, access_token, file_name, allowedNodes, allowedRelationship, token_chunk_size, chunk_overlap, chunks_to_combine, retry_condition, additional_instructions):
   if not retry_condition:
-    file_name, pages = get_documents_from_gcs(gcs_project_id, gcs_bucket_name, gcs_bucket_folder, gcs_blob_filename, access_token)
+    with trace_span("extract.load", {"source_type": "gcs bucket"}) as load_span:
+      file_name, pages = get_documents_from_gcs(gcs_project_id, gcs_bucket_name, gcs_bucket_folder, gcs_blob_filename, access_token)
+      set_load_attributes(load_span, pages)
     if pages==None or len(pages)==0:
       raise LLMGraphBuilderException(f'File content is not available for file : {file_name}')
     return await processing_source(uri, userName, password, database, model, file_name, pages, allowedNodes, allowedRelationship, token_chunk_size, chunk_overlap, chunks_to_combine, additional_instructions=additional_instructions)
   else:
     return await processing_source(uri, userName, password, database, model, file_name, [], allowedNodes, allowedRelationship, token_chunk_size, chunk_overlap, chunks_to_combine, retry_condition=retry_condition, additional_instructions=additional_instructions)
   
+def set_load_attributes(span, pages):
+  if span.is_recording:
+    pages = pages or []
+    span.set_attributes(pages=len(pages), text_bytes=sum(len(page.page_content.encode('utf-8')) for page in pages))
+
+def chunk_text_bytes(chunks):
+  return sum(len(chunk['chunk_doc'].page_content.encode('utf-8')) for chunk in chunks)
+
 async def processing_source(uri, userName, password, database, model, file_name, pages, allowedNodes, allowedRelationship, token_chunk_size, chunk_overlap, chunks_to_combine, is_uploaded_from_local=None, merged_file_path=None, retry_condition=None, additional_instructions=None):
   """
    Extracts a Neo4jGraph from a PDF file based on the model.
@@ -313,6 +348,8 @@ async def processing_source(uri, userName, password, database, model, file_name,
   uri_latency = {}
   response = {}  
   start_time = datetime.now()
+  # Parent of the chunk and batch spans, which outlive the tasks that create them
+  extraction_span = current_span()
   processing_source_start_time = time.time()
   start_create_connection = time.time()
   graph = create_graph_database_connection(uri, userName, password, database)
@@ -322,13 +359,11 @@ async def processing_source(uri, userName, password, database, model, file_name,
   uri_latency["create_connection"] = f'{elapsed_create_connection:.2f}'
   graphDb_data_Access = graphDBdataAccess(graph)
   create_chunk_vector_index(graph)
+  # Chunks per batch, adapted after every batch when adaptive batching is enabled
+  batch_controller = get_batch_controller(chunks_to_combine)
   start_get_chunkId_chunkDoc_list = time.time()
-  total_chunks, chunkId_chunkDoc_list = get_chunkId_chunkDoc_list(graph, file_name, pages, token_chunk_size, chunk_overlap, retry_condition)
-  end_get_chunkId_chunkDoc_list = time.time()
-  elapsed_get_chunkId_chunkDoc_list = end_get_chunkId_chunkDoc_list - start_get_chunkId_chunkDoc_list
-  logging.info(f'Time taken to create list chunkids with chunk document: {elapsed_get_chunkId_chunkDoc_list:.2f} seconds')
-  uri_latency["create_list_chunk_and_document"] = f'{elapsed_get_chunkId_chunkDoc_list:.2f}'
-  uri_latency["total_chunks"] = total_chunks
+  total_chunks, chunk_windows = get_chunk_windows(graph, file_name, pages, token_chunk_size, chunk_overlap, retry_condition, lambda: batch_controller.batch_size)
+  elapsed_get_chunkId_chunkDoc_list = time.time() - start_get_chunkId_chunkDoc_list
 
   start_status_document_node = time.time()
   result = graphDb_data_Access.get_current_status_document_node(file_name)
@@ -359,56 +394,145 @@ async def processing_source(uri, userName, password, database, model, file_name,
       
       start_update_source_node = time.time()
       graphDb_data_Access.update_source_node(obj_source_node)
-      graphDb_data_Access.update_node_relationship_count(file_name)
+      # The only full recount before completion; batches then update the counts incrementally
+      initial_counts = graphDb_data_Access.update_node_relationship_count(file_name)
+      document_counts = DocumentCounts(initial_counts.get(file_name))
+      if retry_condition and retry_condition != DELETE_ENTITIES_AND_START_FROM_BEGINNING:
+        # Entities kept from the earlier run are in the initial counts and are extracted again
+        document_counts.add_existing_entities(*graphDb_data_Access.get_document_entity_keys(file_name))
+      entity_normalizer = EntityNormalizer()
+      publish_progress(uri, database, file_name, status=status, total_chunks=total_chunks, processed_chunk=obj_source_node.processed_chunk, model=model)
       end_update_source_node = time.time()
       elapsed_update_source_node = end_update_source_node - start_update_source_node
       logging.info(f'Time taken to update the document source node: {elapsed_update_source_node:.2f} seconds')
       uri_latency["update_source_node"] = f'{elapsed_update_source_node:.2f}'
 
       logging.info('Update the status as Processing')
-      update_graph_chunk_processed = int(os.environ.get('UPDATE_GRAPH_CHUNKS_PROCESSED'))
-      # selected_chunks = []
-      is_cancelled_status = False
+      pipeline_queue_size = int(os.environ.get('PIPELINE_QUEUE_SIZE', 1))
       job_status = "Completed"
-      for i in range(0, len(chunkId_chunkDoc_list), update_graph_chunk_processed):
-        select_chunks_upto = i+update_graph_chunk_processed
-        logging.info(f'Selected Chunks upto: {select_chunks_upto}')
-        if len(chunkId_chunkDoc_list) <= select_chunks_upto:
-          select_chunks_upto = len(chunkId_chunkDoc_list)
-        selected_chunks = chunkId_chunkDoc_list[i:select_chunks_upto]
-        
-        result = graphDb_data_Access.get_current_status_document_node(file_name)
-        is_cancelled_status = result[0]['is_cancelled']
-        logging.info(f"Value of is_cancelled : {result[0]['is_cancelled']}")
-        if bool(is_cancelled_status) == True:
-          job_status = "Cancelled"
-          logging.info('Exit from running loop of processing file')
-          break
-        else:
-          processing_chunks_start_time = time.time()
-          node_count,rel_count,latency_processed_chunk = await processing_chunks(selected_chunks,graph,uri, userName, password, database,file_name,model,allowedNodes,allowedRelationship,chunks_to_combine,node_count, rel_count, additional_instructions)
-          processing_chunks_end_time = time.time()
-          processing_chunks_elapsed_end_time = processing_chunks_end_time - processing_chunks_start_time
-          logging.info(f"Time taken {update_graph_chunk_processed} chunks processed upto {select_chunks_upto} completed in {processing_chunks_elapsed_end_time:.2f} seconds for file name {file_name}")
-          uri_latency[f'processed_combine_chunk_{i}-{select_chunks_upto}'] = f'{processing_chunks_elapsed_end_time:.2f}'
-          uri_latency[f'processed_chunk_detail_{i}-{select_chunks_upto}'] = latency_processed_chunk
-          end_time = datetime.now()
-          processed_time = end_time - start_time
-          
-          obj_source_node = sourceNode()
-          obj_source_node.file_name = file_name
-          obj_source_node.updated_at = end_time
-          obj_source_node.processing_time = processed_time
-          obj_source_node.processed_chunk = select_chunks_upto+select_chunks_with_retry
-          if retry_condition == START_FROM_BEGINNING:
-            result = execute_graph_query(graph,QUERY_TO_GET_NODES_AND_RELATIONS_OF_A_DOCUMENT, params={"filename":file_name})
-            obj_source_node.node_count = result[0]['nodes']
-            obj_source_node.relationship_count = result[0]['rels']
-          else:  
-            obj_source_node.node_count = node_count
-            obj_source_node.relationship_count = rel_count
-          graphDb_data_Access.update_source_node(obj_source_node)
-          graphDb_data_Access.update_node_relationship_count(file_name)
+      chunks_created = 0
+      # Signalled in-process by manually_cancelled_job, or by the watcher when the Document is
+      # cancelled from another process
+      cancellation_token = register_extraction(uri, database, file_name)
+      if bool(result[0]['is_cancelled']):
+        cancellation_token.cancel()
+
+      def traced_stage(name, stage_func, ends_batch=False):
+        async def run_stage(batch):
+          start_stage = time.time()
+          try:
+            cancellation_token.raise_if_cancelled()
+            with trace_span(f"extract.{name}", {"chunks": len(batch['chunks'])}, parent=batch['span']):
+              result = await stage_func(batch)
+          except BaseException as e:
+            batch['span'].end(error=e)
+            raise
+          batch['stage_seconds'][name] = time.time() - start_stage
+          if ends_batch:
+            batch['span'].end()
+          return result
+        return run_stage
+
+      async def chunk_batches():
+        # Windows are read, split and written to the graph only when the pipeline has room for them,
+        # so at most a few windows of chunks are in memory whatever the size of the file.
+        nonlocal job_status, chunks_created, elapsed_get_chunkId_chunkDoc_list
+        while True:
+          if cancellation_token.is_cancelled:
+            job_status = "Cancelled"
+            logging.info('Exit from running loop of processing file')
+            return
+          start_window = time.time()
+          chunk_span = start_span("extract.chunk", {"batch_start": chunks_created}, parent=extraction_span)
+          try:
+            window = await asyncio.to_thread(next, chunk_windows, None)
+          except BaseException as e:
+            chunk_span.end(error=e)
+            raise
+          elapsed_get_chunkId_chunkDoc_list += time.time() - start_window
+          if window is None:
+            chunk_span.end()
+            return
+          start = chunks_created
+          chunks_created += len(window)
+          text_bytes = chunk_text_bytes(window) if chunk_span.is_recording else None
+          chunk_span.set_attributes(chunks=len(window), text_bytes=text_bytes)
+          chunk_span.end()
+          logging.info(f'Selected Chunks upto: {chunks_created}')
+          batch_span = start_span("extract.batch", {"file_name": file_name, "batch_start": start, "batch_end": chunks_created,
+                                                    "chunks": len(window), "chunks_to_combine": chunks_to_combine,
+                                                    "text_bytes": text_bytes}, parent=extraction_span)
+          yield {'start': start, 'end': chunks_created, 'chunks': window, 'total_chunks': total_chunks or chunks_created,
+                 'stage_seconds': {}, 'latency': {}, 'start_time': time.time(),
+                 'span': batch_span}
+
+      async def count_stage(batch):
+        nonlocal node_count, rel_count
+        end_time = datetime.now()
+        processed_time = end_time - start_time
+        obj_source_node = sourceNode()
+        obj_source_node.file_name = file_name
+        obj_source_node.updated_at = end_time
+        obj_source_node.processing_time = processed_time
+        obj_source_node.processed_chunk = batch['end']+select_chunks_with_retry
+        obj_source_node.total_chunks = batch['total_chunks']
+        if not retry_condition:
+          # Chunks of a retried file were already in the graph and counted by the initial recount
+          document_counts.add_chunks(len(batch['chunks']), batch['start'] == 0)
+        document_counts.add_graph_documents(batch['graph_documents'])
+        document_counts.add_chunk_relationships(batch['has_entity_created'])
+        counts = document_counts.as_dict()
+        node_count, rel_count = counts['nodeCount'], counts['relationshipCount']
+        obj_source_node.node_count = node_count
+        obj_source_node.relationship_count = rel_count
+        await asyncio.to_thread(graphDb_data_Access.update_source_node, obj_source_node)
+        await asyncio.to_thread(graphDb_data_Access.update_document_counts, file_name, counts)
+        publish_progress(uri, database, file_name, **counts, processed_chunk=obj_source_node.processed_chunk,
+                         total_chunks=batch['total_chunks'], processingTime=round(processed_time.total_seconds(),2))
+        processing_chunks_elapsed_end_time = time.time() - batch['start_time']
+        transaction_rows = sum(len(graph_document.nodes) + len(graph_document.relationships) for graph_document in batch['graph_documents'])
+        decision = batch_controller.observe(len(batch['chunks']), batch['stage_seconds'], transaction_rows,
+                                            batch['llm_requests'], batch['llm_retries'])
+        if decision:
+          batch['latency']['adaptive_batch'] = decision
+        batch['span'].set_attributes(transaction_rows=transaction_rows, llm_requests=batch['llm_requests'], llm_retries=batch['llm_retries'],
+                                     node_count=node_count, relationship_count=rel_count)
+        logging.info(f"Time taken {len(batch['chunks'])} chunks processed upto {batch['end']} completed in {processing_chunks_elapsed_end_time:.2f} seconds for file name {file_name}")
+        uri_latency[f"processed_combine_chunk_{batch['start']}-{batch['end']}"] = f'{processing_chunks_elapsed_end_time:.2f}'
+        uri_latency[f"processed_chunk_detail_{batch['start']}-{batch['end']}"] = batch['latency']
+        return batch
+
+      stages = [
+        PipelineStage("embed", traced_stage("embed", partial(embed_chunk_batch, graph, file_name))),
+        PipelineStage("extract", traced_stage("extract", partial(extract_chunk_batch, model, allowedNodes, allowedRelationship, chunks_to_combine, additional_instructions,
+                                                                entity_normalizer=entity_normalizer))),
+        PipelineStage("save", traced_stage("save", partial(save_chunk_batch, graph))),
+        PipelineStage("link", traced_stage("link", partial(link_chunk_batch, graph))),
+        PipelineStage("count", traced_stage("count", count_stage, ends_batch=True)),
+      ]
+      # Batches still waiting between stages when the extraction stops end their span with the error;
+      # the final recount below accounts for whatever they had already written
+      pipeline_task = asyncio.ensure_future(run_pipeline(chunk_batches(), stages, queue_size=pipeline_queue_size,
+                                                         on_discard=lambda batch, error: batch['span'].end(error=error)))
+      # Cancelling the pipeline task also cancels the in-flight LLM requests of the extract stage
+      cancellation_token.cancel_task_on_signal(pipeline_task)
+      watcher_task = asyncio.ensure_future(watch_cancellation(graphDb_data_Access, file_name, cancellation_token))
+      try:
+        stage_busy_time = await pipeline_task
+      except (asyncio.CancelledError, ExtractionCancelled):
+        if not cancellation_token.is_cancelled:
+          raise
+        logging.info(f'Extraction of {file_name} cancelled after {chunks_created} chunks')
+        job_status = "Cancelled"
+        stage_busy_time = {}
+      finally:
+        watcher_task.cancel()
+        unregister_extraction(uri, database, file_name, cancellation_token)
+      uri_latency["pipeline_stage_busy_time"] = {name: f'{busy:.2f}' for name, busy in stage_busy_time.items()}
+      total_chunks = total_chunks or chunks_created
+      logging.info(f'Time taken to create list chunkids with chunk document: {elapsed_get_chunkId_chunkDoc_list:.2f} seconds')
+      uri_latency["create_list_chunk_and_document"] = f'{elapsed_get_chunkId_chunkDoc_list:.2f}'
+      uri_latency["total_chunks"] = total_chunks
       
       result = graphDb_data_Access.get_current_status_document_node(file_name)
       is_cancelled_status = result[0]['is_cancelled']
@@ -422,9 +546,15 @@ async def processing_source(uri, userName, password, database, model, file_name,
       obj_source_node.file_name = file_name.strip() if isinstance(file_name, str) else file_name
       obj_source_node.status = job_status
       obj_source_node.processing_time = processed_time
+      obj_source_node.total_chunks = total_chunks
 
       graphDb_data_Access.update_source_node(obj_source_node)
-      graphDb_data_Access.update_node_relationship_count(file_name)
+      count_response = graphDb_data_Access.update_node_relationship_count(file_name)
+      final_counts = count_response.get(file_name, {})
+      node_count = final_counts.get('nodeCount', node_count)
+      rel_count = final_counts.get('relationshipCount', rel_count)
+      publish_progress(uri, database, file_name, **final_counts, status=job_status, total_chunks=total_chunks,
+                       processingTime=round(processed_time.total_seconds(),2))
       logging.info('Updated the nodeCount and relCount properties in Document node')
       logging.info(f'file:{file_name} extraction has been completed')
 
@@ -453,6 +583,7 @@ async def processing_source(uri, userName, password, database, model, file_name,
       response["status"] = job_status
       response["model"] = model
       response["success_count"] = 1
+      response.update(final_counts)
       
       return uri_latency, response
     else:      
@@ -463,66 +594,121 @@ async def processing_source(uri, userName, password, database, model, file_name,
     logging.error(error_message)
     raise LLMGraphBuilderException(error_message)
 
-async def processing_chunks(chunkId_chunkDoc_list,graph,uri, userName, password, database,file_name,model,allowedNodes,allowedRelationship, chunks_to_combine, node_count, rel_count, additional_instructions=None):
-  #create vector index and update chunk node with embedding
-  latency_processing_chunk = {}
-  if graph is not None:
-    if graph._driver._closed:
-      graph = create_graph_database_connection(uri, userName, password, database)
-  else:
-    graph = create_graph_database_connection(uri, userName, password, database)
-  
+async def watch_cancellation(graphDb_data_Access, file_name, cancellation_token, interval=None):
+  """Signals cancellation_token when the Document is marked cancelled, e.g. by /cancelled_job in another worker process."""
+  interval = interval or float(os.environ.get('CANCELLATION_POLL_INTERVAL', 5))
+  while not cancellation_token.is_cancelled:
+    await asyncio.sleep(interval)
+    try:
+      result = await asyncio.to_thread(graphDb_data_Access.get_current_status_document_node, file_name)
+    except Exception as e:
+      logging.warning(f'Unable to read the cancellation status of {file_name}: {e}')
+      continue
+    if result and bool(result[0]['is_cancelled']):
+      logging.info(f'Document {file_name} was cancelled, stopping its extraction')
+      cancellation_token.cancel()
+
+async def embed_chunk_batch(graph, file_name, batch):
   start_update_embedding = time.time()
-  create_chunk_embeddings( graph, chunkId_chunkDoc_list, file_name)
-  end_update_embedding = time.time()
-  elapsed_update_embedding = end_update_embedding - start_update_embedding
+  embedding_stats = await asyncio.to_thread(create_chunk_embeddings, graph, batch['chunks'], file_name)
+  elapsed_update_embedding = time.time() - start_update_embedding
   logging.info(f'Time taken to update embedding in chunk node: {elapsed_update_embedding:.2f} seconds')
-  latency_processing_chunk["update_embedding"] = f'{elapsed_update_embedding:.2f}'
+  batch['latency']["update_embedding"] = f'{elapsed_update_embedding:.2f}'
+  batch['latency']["embedding_throughput"] = f'{embedding_stats["chunks_per_second"]:.2f} chunks/s'
+  batch['latency']["embedding_cache_hits"] = f'{embedding_stats["cache_hits"]}/{embedding_stats["chunks"]}'
+  current_span().set_attributes(embedding_cache_hits=embedding_stats["cache_hits"])
+  return batch
+
+async def extract_chunk_batch(model, allowedNodes, allowedRelationship, chunks_to_combine, additional_instructions, batch, entity_normalizer=None):
   logging.info("Get graph document list from models")
-  
   start_entity_extraction = time.time()
-  graph_documents =  await get_graph_from_llm(model, chunkId_chunkDoc_list, allowedNodes, allowedRelationship, chunks_to_combine, additional_instructions)
-  end_entity_extraction = time.time()
-  elapsed_entity_extraction = end_entity_extraction - start_entity_extraction
+  scheduler = get_extraction_scheduler(model)
+  requests_before, retries_before = scheduler.requests, scheduler.retries
+  graph_documents =  await get_graph_from_llm(model, batch['chunks'], allowedNodes, allowedRelationship, chunks_to_combine, additional_instructions)
+  # Shared with concurrent extractions of the same model, so this is the model's recent retry rate
+  batch['llm_requests'] = scheduler.requests - requests_before
+  batch['llm_retries'] = scheduler.retries - retries_before
+  elapsed_entity_extraction = time.time() - start_entity_extraction
   logging.info(f'Time taken to extract enitities from LLM Graph Builder: {elapsed_entity_extraction:.2f} seconds')
-  latency_processing_chunk["entity_extraction"] = f'{elapsed_entity_extraction:.2f}'
-  cleaned_graph_documents = handle_backticks_nodes_relationship_id_type(graph_documents)
-  
+  batch['latency']["entity_extraction"] = f'{elapsed_entity_extraction:.2f}'
+  batch['graph_documents'] = handle_backticks_nodes_relationship_id_type(graph_documents)
+  current_span().set_attributes(chunks_to_combine=chunks_to_combine, llm_requests=batch['llm_requests'], llm_retries=batch['llm_retries'],
+                                graph_documents=len(batch['graph_documents']))
+  if os.environ.get('ENTITY_NORMALIZATION', 'True').upper() == 'TRUE':
+    normalization_stats = (entity_normalizer or EntityNormalizer()).normalize(batch['graph_documents'])
+    logging.info(f'Normalized entities: {normalization_stats["nodes_before"]} nodes to {normalization_stats["nodes_after"]}, '
+                 f'{normalization_stats["relationships_before"]} relationships to {normalization_stats["relationships_after"]}, '
+                 f'{normalization_stats["ids_rewritten"]} ids rewritten')
+    batch['latency']["entity_normalization"] = normalization_stats
+    current_span().set_attributes(**normalization_stats)
+  return batch
+
+async def save_chunk_batch(graph, batch):
   start_save_graphDocuments = time.time()
-  save_graphDocuments_in_neo4j(graph, cleaned_graph_documents)
-  end_save_graphDocuments = time.time()
-  elapsed_save_graphDocuments = end_save_graphDocuments - start_save_graphDocuments
-  logging.info(f'Time taken to save graph document in neo4j: {elapsed_save_graphDocuments:.2f} seconds')
-  latency_processing_chunk["save_graphDocuments"] = f'{elapsed_save_graphDocuments:.2f}'
-
-  chunks_and_graphDocuments_list = get_chunk_and_graphDocument(cleaned_graph_documents, chunkId_chunkDoc_list)
-
+  write_stats = await asyncio.to_thread(save_graphDocuments_in_neo4j, graph, batch['graph_documents'])
+  batch['element_ids'] = write_stats.pop('element_ids')
+  elapsed_save_graphDocuments = time.time() - start_save_graphDocuments
+  logging.info(f'Time taken to save graph document in neo4j: {elapsed_save_graphDocuments:.2f} seconds, '
+               f'{write_stats["nodes_created"]} nodes and {write_stats["relationships_created"]} relationships created, '
+               f'{write_stats["nodes_merged"]} nodes and {write_stats["relationships_merged"]} relationships merged '
+               f'in {write_stats["transactions"]} transactions')
+  batch['latency']["save_graphDocuments"] = f'{elapsed_save_graphDocuments:.2f}'
+  current_span().set_attributes(nodes=sum(len(graph_document.nodes) for graph_document in batch['graph_documents']),
+                                relationships=sum(len(graph_document.relationships) for graph_document in batch['graph_documents']),
+                                **write_stats)
+  return batch
+
+async def link_chunk_batch(graph, batch):
+  chunks_and_graphDocuments_list = get_chunk_and_graphDocument(batch['graph_documents'], batch['chunks'])
   start_relationship = time.time()
-  merge_relationship_between_chunk_and_entites(graph, chunks_and_graphDocuments_list)
-  end_relationship = time.time()
-  elapsed_relationship = end_relationship - start_relationship
+  write_counters = await asyncio.to_thread(merge_relationship_between_chunk_and_entites, graph, chunks_and_graphDocuments_list,
+                                           batch.get('element_ids'))
+  batch['has_entity_created'] = write_counters['relationships_created']
+  current_span().set_attributes(relationships_created=write_counters['relationships_created'])
+  elapsed_relationship = time.time() - start_relationship
   logging.info(f'Time taken to create relationship between chunk and entities: {elapsed_relationship:.2f} seconds')
-  latency_processing_chunk["relationship_between_chunk_entity"] = f'{elapsed_relationship:.2f}'
-  
-  graphDb_data_Access = graphDBdataAccess(graph)
-  count_response = graphDb_data_Access.update_node_relationship_count(file_name)
-  node_count = count_response[file_name].get('nodeCount',"0")
-  rel_count = count_response[file_name].get('relationshipCount',"0")
-  return node_count,rel_count,latency_processing_chunk
+  batch['latency']["relationship_between_chunk_entity"] = f'{elapsed_relationship:.2f}'
+  return batch
+
+def normalize_pages(pages):
+  """Removes quotes and newlines from page content one page at a time."""
+  bad_chars = ['"', "\n", "'"]
+  for page in pages:
+    text = page.page_content
+    for j in bad_chars:
+      if j == '\n':
+        text = text.replace(j, ' ')
+      else:
+        text = text.replace(j, '')
+    yield Document(page_content=str(text), metadata=page.metadata)
+
+def get_chunk_windows(graph, file_name, pages, token_chunk_size, chunk_overlap, retry_condition, window_size):
+  """
+  Returns the total number of chunks and an iterator of chunk windows of at most window_size chunks,
+  where window_size is a number or a callable read again for every window.
+  For a new file the total is 0 because pages are streamed: they are normalized, split and written
+  to the graph one window at a time as the iterator is consumed. On retry the existing chunks are read back.
+  """
+  if not retry_condition:
+    logging.info("Break down file into chunks")
+    create_chunks_obj = CreateChunksofDocument(normalize_pages(pages), graph)
+    chunks = create_chunks_obj.iter_chunks(token_chunk_size, chunk_overlap)
+    return 0, iter_chunk_windows(graph, file_name, chunks, window_size)
+  total_chunks, chunkId_chunkDoc_list = get_chunkId_chunkDoc_list(graph, file_name, pages, token_chunk_size, chunk_overlap, retry_condition)
+  return total_chunks, iter_list_windows(chunkId_chunkDoc_list, window_size)
+
+def iter_list_windows(items, window_size):
+  current_window_size = window_size if callable(window_size) else lambda: window_size
+  start = 0
+  while start < len(items):
+    end = start + max(1, current_window_size())
+    yield items[start:end]
+    start = end
 
 def get_chunkId_chunkDoc_list(graph, file_name, pages, token_chunk_size, chunk_overlap, retry_condition):
   if not retry_condition:
     logging.info("Break down file into chunks")
-    bad_chars = ['"', "\n", "'"]
-    for i in range(0,len(pages)):
-      text = pages[i].page_content
-      for j in bad_chars:
-        if j == '\n':
-          text = text.replace(j, ' ')
-        else:
-          text = text.replace(j, '')
-      pages[i]=Document(page_content=str(text), metadata=pages[i].metadata)
-    create_chunks_obj = CreateChunksofDocument(pages, graph)
+    create_chunks_obj = CreateChunksofDocument(list(normalize_pages(pages)), graph)
     chunks = create_chunks_obj.split_file_into_chunks(token_chunk_size, chunk_overlap)
     chunkId_chunkDoc_list = create_relation_between_chunks(graph,file_name,chunks)
     return len(chunks), chunkId_chunkDoc_list
@@ -570,11 +756,8 @@ def get_source_list_from_graph(uri,userName,password,db_name=None):
    sorting the list by the last updated date. 
  """
   logging.info("Get existing files list from graph")
-  graph = Neo4jGraph(url=uri, database=db_name, username=userName, password=password)
+  graph = create_graph_database_connection(uri, userName, password, db_name)
   graph_DB_dataAccess = graphDBdataAccess(graph)
-  if not graph._driver._closed:
-      logging.info(f"closing connection for sources_list api")
-      graph._driver.close()
   return graph_DB_dataAccess.get_source_list()
 
 def update_graph(graph):
@@ -712,9 +895,11 @@ def manually_cancelled_job(graph, filenames, source_types, merged_dir, uri):
       obj_source_node.is_cancelled = True
       obj_source_node.status = 'Cancelled'
       obj_source_node.updated_at = datetime.now()
+      cancel_extraction(uri, graph._database, file_name)
       graphDb_data_Access = graphDBdataAccess(graph)
       graphDb_data_Access.update_source_node(obj_source_node)
       count_response = graphDb_data_Access.update_node_relationship_count(file_name)
+      publish_progress(uri, graph._database, file_name, status='Cancelled', is_cancelled=True)
       obj_source_node = None
       merged_file_path = os.path.join(merged_dir, file_name)
       if source_type == 'local file' and gcs_file_cache == 'True':
@@ -1,7 +1,10 @@
 from langchain_neo4j import Neo4jGraph
 from langchain.docstore.document import Document
-from src.shared.common_fn import load_embedding_model,execute_graph_query
-from src.shared.common_fn import load_embedding_model,execute_graph_query
+from src.shared.common_fn import load_embedding_model,execute_graph_query,execute_graph_write,get_embedding_batch_size,embed_documents_in_batches
+from src.shared.constants import CHUNK_WRITE_BATCH_SIZE, GRAPH_WRITE_BATCH_SIZE
+from src.shared.graph_writer import plan_chunk_entity_links
+from src.shared.embedding_cache import embed_texts_with_cache
+from src.shared.metrics import record_embeddings
 import logging
 from typing import List
 import os
@@ -13,146 +16,188 @@ logging.basicConfig(format='%(asctime)s - %(message)s',level='INFO')
 
 EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL')
 EMBEDDING_FUNCTION , EMBEDDING_DIMENSION = load_embedding_model(EMBEDDING_MODEL)
+EMBEDDING_BATCH_SIZE = get_embedding_batch_size(EMBEDDING_MODEL)
 
-def merge_relationship_between_chunk_and_entites(graph: Neo4jGraph, graph_documents_chunk_chunk_Id : list):
-    batch_data = []
+def merge_relationship_between_chunk_and_entites(graph: Neo4jGraph, graph_documents_chunk_chunk_Id : list, element_ids: dict = None):
+    """
+    Creates the HAS_ENTITY relationships between chunks and their entities with plan_chunk_entity_links,
+    looking entities up by the element ids returned by save_graphDocuments_in_neo4j.
+
+    Returns:
+        dict: write counters summed over the queries, whose relationships_created are the new HAS_ENTITY relationships.
+    """
     logging.info("Create HAS_ENTITY relationship between chunks and entities")
-    
-    for graph_doc_chunk_id in graph_documents_chunk_chunk_Id:
-        for node in graph_doc_chunk_id['graph_doc'].nodes:
-            query_data={
-                'chunk_id': graph_doc_chunk_id['chunk_id'],
-                'node_type': node.type,
-                'node_id': node.id
-            }
-            batch_data.append(query_data)
-          
-    if batch_data:
-        unwind_query = """
-                    UNWIND $batch_data AS data
-                    MATCH (c:Chunk {id: data.chunk_id})
-                    CALL apoc.merge.node([data.node_type], {id: data.node_id}) YIELD node AS n
-                    MERGE (c)-[:HAS_ENTITY]->(n)
-                """
-        execute_graph_query(graph,unwind_query, params={"batch_data": batch_data})
-        execute_graph_query(graph,unwind_query, params={"batch_data": batch_data})
+    batch_size = int(os.environ.get('GRAPH_WRITE_BATCH_SIZE', GRAPH_WRITE_BATCH_SIZE))
+    write_counters = {"nodes_created": 0, "relationships_created": 0, "nodes_deleted": 0, "relationships_deleted": 0, "properties_set": 0}
+    for write in plan_chunk_entity_links(graph_documents_chunk_chunk_Id, element_ids or {}, batch_size):
+        counters = execute_graph_write(graph, write["query"], params={"rows": write["rows"]})
+        for key in write_counters:
+            write_counters[key] += counters[key]
+    return write_counters
+
+
+def write_chunk_graph(graph, file_name, chunk_rows: list, batch_size: int = None) -> dict:
+    """
+    Writes Chunk nodes with their PART_OF, FIRST_CHUNK and NEXT_CHUNK relationships with one
+    idempotent UNWIND query per batch of rows.
+
+    Args:
+        graph: Neo4jGraph connection.
+        file_name: fileName of the Document the chunks belong to.
+        chunk_rows: list of dicts with `id` and optionally `properties` (set on the Chunk),
+            `first` (create FIRST_CHUNK) and `previous_id` (create NEXT_CHUNK from that chunk).
+        batch_size: rows per query, defaults to CHUNK_WRITE_BATCH_SIZE.
 
+    Returns:
+        dict: rows written, number of queries and elapsed seconds.
+    """
+    batch_size = batch_size or int(os.environ.get('CHUNK_WRITE_BATCH_SIZE', CHUNK_WRITE_BATCH_SIZE))
+    query_to_write_chunk_graph = """
+        UNWIND $rows AS row
+        MATCH (d:Document {fileName: $fileName})
+        MERGE (c:Chunk {id: row.id})
+        SET c += coalesce(row.properties, {})
+        MERGE (c)-[:PART_OF]->(d)
+        FOREACH (_ IN CASE WHEN row.first THEN [1] ELSE [] END |
+                MERGE (d)-[:FIRST_CHUNK]->(c))
+        WITH c, row
+        OPTIONAL MATCH (pc:Chunk {id: row.previous_id})
+        FOREACH (_ IN CASE WHEN pc IS NOT NULL THEN [1] ELSE [] END |
+                MERGE (pc)-[:NEXT_CHUNK]->(c))
+    """
+    start_time = time.time()
+    queries = 0
+    for start in range(0, len(chunk_rows), batch_size):
+        execute_graph_query(graph, query_to_write_chunk_graph, params={"fileName": file_name, "rows": chunk_rows[start:start + batch_size]})
+        queries += 1
+    stats = {"rows": len(chunk_rows), "queries": queries, "elapsed": time.time() - start_time}
+    logging.info(f'Wrote {stats["rows"]} chunk rows for {file_name} in {queries} queries, time taken: {stats["elapsed"]:.2f} seconds')
+    return stats
+
+
+def write_chunk_embeddings(graph, embedding_rows: list, batch_size: int = None) -> dict:
+    """
+    Sets the embedding of Chunk nodes already written by write_chunk_graph, with one UNWIND query
+    per batch of rows that only matches the chunk by id.
+
+    Args:
+        graph: Neo4jGraph connection.
+        embedding_rows: list of dicts with `id` and `embedding`.
+        batch_size: rows per query, defaults to CHUNK_WRITE_BATCH_SIZE.
+
+    Returns:
+        dict: rows written, number of queries and elapsed seconds.
+    """
+    batch_size = batch_size or int(os.environ.get('CHUNK_WRITE_BATCH_SIZE', CHUNK_WRITE_BATCH_SIZE))
+    query_to_write_chunk_embeddings = """
+        UNWIND $rows AS row
+        MATCH (c:Chunk {id: row.id})
+        SET c.embedding = row.embedding
+    """
+    start_time = time.time()
+    queries = 0
+    for start in range(0, len(embedding_rows), batch_size):
+        execute_graph_query(graph, query_to_write_chunk_embeddings, params={"rows": embedding_rows[start:start + batch_size]})
+        queries += 1
+    return {"rows": len(embedding_rows), "queries": queries, "elapsed": time.time() - start_time}
     
 def create_chunk_embeddings(graph, chunkId_chunkDoc_list, file_name):
+    """
+    Embeds the chunks in batches of EMBEDDING_BATCH_SIZE with embed_documents, reusing vectors
+    from the embedding cache for chunk texts seen before, and sets the
+    vectors on the Chunk nodes with write_chunk_embeddings.
+
+    Returns:
+        dict: number of embedded chunks, cache hits, embedding and write time, and chunks embedded per second.
+    """
     isEmbedding = os.getenv('IS_EMBEDDING')
+    stats = {"chunks": 0, "cache_hits": 0, "embedding_time": 0.0, "write_time": 0.0, "chunks_per_second": 0.0}
+    if not chunkId_chunkDoc_list or isEmbedding.upper() != "TRUE":
+        return stats
     
     embeddings, dimension = EMBEDDING_FUNCTION , EMBEDDING_DIMENSION
-    logging.info(f'embedding model:{embeddings} and dimesion:{dimension}')
-    data_for_query = []
+    logging.info(f'embedding model:{embeddings} and dimesion:{dimension}, batch size:{EMBEDDING_BATCH_SIZE}')
     logging.info(f"update embedding and vector index for chunks")
-    for row in chunkId_chunkDoc_list:
-        if isEmbedding.upper() == "TRUE":
-            embeddings_arr = embeddings.embed_query(row['chunk_doc'].page_content)
-                                    
-            data_for_query.append({
-                "chunkId": row['chunk_id'],
-                "embeddings": embeddings_arr
-            })
-    
-    query_to_create_embedding = """
-        UNWIND $data AS row
-        MATCH (d:Document {fileName: $fileName})
-        MERGE (c:Chunk {id: row.chunkId})
-        SET c.embedding = row.embeddings
-        MERGE (c)-[:PART_OF]->(d)
-    """       
-    execute_graph_query(graph,query_to_create_embedding, params={"fileName":file_name, "data":data_for_query})
-    execute_graph_query(graph,query_to_create_embedding, params={"fileName":file_name, "data":data_for_query})
+    start_time = time.time()
+    texts = [row['chunk_doc'].page_content for row in chunkId_chunkDoc_list]
+    embeddings_list, stats["cache_hits"] = embed_texts_with_cache(
+        EMBEDDING_MODEL, embeddings, dimension, texts,
+        lambda missing: embed_documents_in_batches(embeddings, missing, EMBEDDING_BATCH_SIZE))
+    stats["embedding_time"] = time.time() - start_time
+    data_for_query = [{"id": row['chunk_id'], "embedding": embeddings_arr}
+                      for row, embeddings_arr in zip(chunkId_chunkDoc_list, embeddings_list)]
+    stats["write_time"] = write_chunk_embeddings(graph, data_for_query)["elapsed"]
+    stats["chunks"] = len(data_for_query)
+    if stats["embedding_time"] > 0:
+        stats["chunks_per_second"] = stats["chunks"] / stats["embedding_time"]
+    record_embeddings(EMBEDDING_MODEL, stats["chunks"], stats["cache_hits"], stats["embedding_time"])
+    logging.info(f'Embedded {stats["chunks"]} chunks ({stats["cache_hits"]} from cache) in {stats["embedding_time"]:.2f} seconds '
+                 f'({stats["chunks_per_second"]:.2f} chunks/s), written in {stats["write_time"]:.2f} seconds')
+    return stats
     
 def create_relation_between_chunks(graph, file_name, chunks: List[Document])->list:
+    lst_chunks_including_hash = []
+    for window in iter_chunk_windows(graph, file_name, chunks, max(1, len(chunks))):
+        lst_chunks_including_hash.extend(window)
+    return lst_chunks_including_hash
+
+
+def iter_chunk_windows(graph, file_name, chunks, window_size):
+    """
+    Consumes chunks from any iterable, writes them to the graph `window_size` at a time with
+    write_chunk_graph and yields each window as a list of {'chunk_id', 'chunk_doc'} once it is written.
+    Positions, content offsets and NEXT_CHUNK links continue across windows. `window_size` may be a
+    callable, read again for every window.
+    """
+    current_window_size = window_size if callable(window_size) else lambda: window_size
     logging.info("creating FIRST_CHUNK and NEXT_CHUNK relationships between chunks")
     current_chunk_id = ""
     lst_chunks_including_hash = []
-    batch_data = []
-    relationships = []
+    chunk_rows = []
     offset=0
+    previous_length = 0
     for i, chunk in enumerate(chunks):
         page_content_sha1 = hashlib.sha1(chunk.page_content.encode())
         previous_chunk_id = current_chunk_id
         current_chunk_id = page_content_sha1.hexdigest()
         position = i + 1 
         if i>0:
-            offset += len(chunks[i-1].page_content)
-        if i == 0:
-            firstChunk = True
-        else:
-            firstChunk = False  
-        metadata = {"position": position,"length": len(chunk.page_content), "content_offset":offset}
-        chunk_document = Document(
-            page_content=chunk.page_content, metadata=metadata
-        )
+            offset += previous_length
+        previous_length = len(chunk.page_content)
         
-        chunk_data = {
-            "id": current_chunk_id,
-            "pg_content": chunk_document.page_content,
+        properties = {
+            "text": chunk.page_content,
             "position": position,
-            "length": chunk_document.metadata["length"],
-            "f_name": file_name,
-            "previous_id" : previous_chunk_id,
+            "length": len(chunk.page_content),
+            "fileName": file_name,
             "content_offset" : offset
         }
         
         if 'page_number' in chunk.metadata:
-            chunk_data['page_number'] = chunk.metadata['page_number']
+            properties['page_number'] = chunk.metadata['page_number']
          
         if 'start_timestamp' in chunk.metadata and 'end_timestamp' in chunk.metadata:
-            chunk_data['start_time'] = chunk.metadata['start_timestamp']
-            chunk_data['end_time'] = chunk.metadata['end_timestamp'] 
-               
-        batch_data.append(chunk_data)
+            properties['start_time'] = chunk.metadata['start_timestamp']
+            properties['end_time'] = chunk.metadata['end_timestamp'] 
         
-        lst_chunks_including_hash.append({'chunk_id': current_chunk_id, 'chunk_doc': chunk})
+        # The first chunk gets FIRST_CHUNK from the document, every other chunk NEXT_CHUNK from its predecessor
+        chunk_rows.append({
+            "id": current_chunk_id,
+            "properties": properties,
+            "first": i == 0,
+            "previous_id": previous_chunk_id if i > 0 else None
+        })
         
-        # create relationships between chunks
-        if firstChunk:
-            relationships.append({"type": "FIRST_CHUNK", "chunk_id": current_chunk_id})
-        else:
-            relationships.append({
-                "type": "NEXT_CHUNK",
-                "previous_chunk_id": previous_chunk_id,  # ID of previous chunk
-                "current_chunk_id": current_chunk_id
-            })
-          
-    query_to_create_chunk_and_PART_OF_relation = """
-        UNWIND $batch_data AS data
-        MERGE (c:Chunk {id: data.id})
-        SET c.text = data.pg_content, c.position = data.position, c.length = data.length, c.fileName=data.f_name, c.content_offset=data.content_offset
-        WITH data, c
-        SET c.page_number = CASE WHEN data.page_number IS NOT NULL THEN data.page_number END,
-            c.start_time = CASE WHEN data.start_time IS NOT NULL THEN data.start_time END,
-            c.end_time = CASE WHEN data.end_time IS NOT NULL THEN data.end_time END
-        WITH data, c
-        MATCH (d:Document {fileName: data.f_name})
-        MERGE (c)-[:PART_OF]->(d)
-    """
-    execute_graph_query(graph,query_to_create_chunk_and_PART_OF_relation, params={"batch_data": batch_data})
-    execute_graph_query(graph,query_to_create_chunk_and_PART_OF_relation, params={"batch_data": batch_data})
-    
-    query_to_create_FIRST_relation = """ 
-        UNWIND $relationships AS relationship
-        MATCH (d:Document {fileName: $f_name})
-        MATCH (c:Chunk {id: relationship.chunk_id})
-        FOREACH(r IN CASE WHEN relationship.type = 'FIRST_CHUNK' THEN [1] ELSE [] END |
-                MERGE (d)-[:FIRST_CHUNK]->(c))
-        """
-    execute_graph_query(graph,query_to_create_FIRST_relation, params={"f_name": file_name, "relationships": relationships})
-    execute_graph_query(graph,query_to_create_FIRST_relation, params={"f_name": file_name, "relationships": relationships})
+        lst_chunks_including_hash.append({'chunk_id': current_chunk_id, 'chunk_doc': chunk})
+        if len(chunk_rows) >= current_window_size():
+            write_chunk_graph(graph, file_name, chunk_rows)
+            yield lst_chunks_including_hash
+            chunk_rows = []
+            lst_chunks_including_hash = []
     
-    query_to_create_NEXT_CHUNK_relation = """ 
-        UNWIND $relationships AS relationship
-        MATCH (c:Chunk {id: relationship.current_chunk_id})
-        WITH c, relationship
-        MATCH (pc:Chunk {id: relationship.previous_chunk_id})
-        FOREACH(r IN CASE WHEN relationship.type = 'NEXT_CHUNK' THEN [1] ELSE [] END |
-                MERGE (c)<-[:NEXT_CHUNK]-(pc))
-        """  
-    execute_graph_query(graph,query_to_create_NEXT_CHUNK_relation, params={"relationships": relationships})
-    return lst_chunks_including_hash
+    if chunk_rows:
+        write_chunk_graph(graph, file_name, chunk_rows)
+        yield lst_chunks_including_hash
 
 
 def create_chunk_vector_index(graph):
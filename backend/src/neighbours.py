@@ -57,8 +57,3 @@ def get_neighbour_nodes(uri, username, password, database, element_id, query=NEI
     except Exception as e:
         logging.error(f"Error retrieving neighbours for element_id: {element_id}: {e}")
         return {"nodes": [], "relationships": []}
-    
-    finally:
-        if driver is not None:
-            driver.close()
-            logging.info("Database driver closed.")
\ No newline at end of file
@@ -0,0 +1,98 @@
+import logging
+import os
+
+DEFAULT_MIN_BATCH_SIZE = 5
+DEFAULT_MAX_BATCH_SIZE = 200
+DEFAULT_TARGET_BATCH_SECONDS = 30.0
+DEFAULT_MAX_TRANSACTION_ROWS = 20000
+DEFAULT_MAX_ERROR_RATE = 0.1
+
+
+class AdaptiveBatchController:
+    """
+    Chooses the number of chunks per pipeline batch from what was observed on the previous batches.
+
+    - When more than `max_error_rate` of the batch's LLM requests had to be retried, the batch size is halved.
+    - Otherwise the batch size is scaled so that the slowest stage takes about `target_batch_seconds`
+      per batch, by at most a factor two per decision.
+    - The batch size is then reduced so that the graph written for a batch stays under
+      `max_transaction_rows` nodes and relationships.
+
+    The batch size stays within its bounds and is a multiple of chunks_to_combine. Chunks are combined
+    within a batch, so the combined LLM requests, and with them the extraction cache keys, are the same
+    whatever batch sizes a run or its retry went through. chunks_to_combine itself is never changed.
+    """
+
+    def __init__(self, batch_size: int, chunks_to_combine: int, min_batch_size: int = DEFAULT_MIN_BATCH_SIZE,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE, target_batch_seconds: float = DEFAULT_TARGET_BATCH_SECONDS,
+                 max_transaction_rows: int = DEFAULT_MAX_TRANSACTION_ROWS, max_error_rate: float = DEFAULT_MAX_ERROR_RATE,
+                 enabled: bool = True):
+        self.min_batch_size = max(1, int(min_batch_size))
+        self.max_batch_size = max(self.min_batch_size, int(max_batch_size))
+        self.chunks_to_combine = max(1, int(chunks_to_combine or 1))
+        self.target_batch_seconds = target_batch_seconds
+        self.max_transaction_rows = max_transaction_rows
+        self.max_error_rate = max_error_rate
+        self.enabled = enabled
+        self.batch_size = self._bound_batch_size(batch_size) if enabled else max(1, int(batch_size))
+
+    def _bound_batch_size(self, size) -> int:
+        size = max(self.min_batch_size, min(self.max_batch_size, int(size)))
+        return max(self.chunks_to_combine, size - size % self.chunks_to_combine)
+
+    def observe(self, chunk_count: int, stage_seconds: dict, transaction_rows: int = 0, llm_requests: int = 0,
+                llm_retries: int = 0):
+        """
+        Updates batch_size from one processed batch.
+
+        Args:
+            chunk_count: chunks in the batch.
+            stage_seconds: seconds spent by the batch in each pipeline stage.
+            transaction_rows: nodes and relationships written for the batch.
+            llm_requests: LLM requests made for the batch.
+            llm_retries: retries of those requests.
+        Returns:
+            dict: the decision with the observations it was based on, or None when disabled.
+        """
+        if not self.enabled or chunk_count <= 0:
+            return None
+        error_rate = llm_retries / llm_requests if llm_requests else 0.0
+        slowest_stage, slowest_seconds = max(stage_seconds.items(), key=lambda item: item[1], default=(None, 0.0))
+        batch_size = self.batch_size
+        reasons = []
+        if error_rate > self.max_error_rate:
+            batch_size = batch_size // 2
+            reasons.append(f"llm error rate {error_rate:.2f}")
+        elif slowest_seconds > 0:
+            scaled = int(chunk_count * self.target_batch_seconds / slowest_seconds)
+            batch_size = max(batch_size // 2, min(batch_size * 2, scaled))
+            reasons.append(f"{slowest_stage} stage {slowest_seconds:.2f}s for {chunk_count} chunks")
+        if self.max_transaction_rows and transaction_rows > self.max_transaction_rows:
+            batch_size = min(batch_size, chunk_count * self.max_transaction_rows // transaction_rows)
+            reasons.append(f"{transaction_rows} rows written")
+        self.batch_size = self._bound_batch_size(batch_size)
+        decision = {
+            "batch_size": self.batch_size,
+            "slowest_stage": slowest_stage, "slowest_stage_time": f"{slowest_seconds:.2f}",
+            "llm_error_rate": f"{error_rate:.2f}", "transaction_rows": transaction_rows, "reason": "; ".join(reasons),
+        }
+        logging.info(f"Adaptive batching: {decision}")
+        return decision
+
+
+def get_batch_controller(chunks_to_combine) -> AdaptiveBatchController:
+    """
+    Returns a controller for one extraction, starting from UPDATE_GRAPH_CHUNKS_PROCESSED chunks per batch.
+    Adaptive batching is off unless ADAPTIVE_BATCHING_ENABLED is set, as it has not been benchmarked on
+    real extractions yet; when off the batch size never changes.
+    """
+    return AdaptiveBatchController(
+        int(os.environ.get('UPDATE_GRAPH_CHUNKS_PROCESSED', 20)),
+        chunks_to_combine,
+        min_batch_size=int(os.environ.get('ADAPTIVE_BATCH_MIN_CHUNKS', DEFAULT_MIN_BATCH_SIZE)),
+        max_batch_size=int(os.environ.get('ADAPTIVE_BATCH_MAX_CHUNKS', DEFAULT_MAX_BATCH_SIZE)),
+        target_batch_seconds=float(os.environ.get('ADAPTIVE_BATCH_TARGET_SECONDS', DEFAULT_TARGET_BATCH_SECONDS)),
+        max_transaction_rows=int(os.environ.get('ADAPTIVE_BATCH_MAX_TRANSACTION_ROWS', DEFAULT_MAX_TRANSACTION_ROWS)),
+        max_error_rate=float(os.environ.get('ADAPTIVE_BATCH_MAX_ERROR_RATE', DEFAULT_MAX_ERROR_RATE)),
+        enabled=os.environ.get('ADAPTIVE_BATCHING_ENABLED', 'False').lower() in ('true', '1', 'yes'),
+    )
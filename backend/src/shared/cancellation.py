@@ -0,0 +1,104 @@
+import logging
+import threading
+
+from src.shared.database_key import get_database_key
+
+
+class ExtractionCancelled(Exception):
+    """Raised by a stage of an extraction whose cancellation token was signalled."""
+
+
+class CancellationToken:
+    """
+    Cancellation signal of one running extraction.
+
+    Can be signalled from any thread; asyncio tasks registered with cancel_task_on_signal are
+    cancelled on their own event loop as soon as the token is signalled.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._tasks = []
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            self._cancel_task(task)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise ExtractionCancelled("Extraction was cancelled")
+
+    def cancel_task_on_signal(self, task):
+        with self._lock:
+            if not self._event.is_set():
+                self._tasks.append(task)
+                return
+        self._cancel_task(task)
+
+    @staticmethod
+    def _cancel_task(task):
+        try:
+            task.get_loop().call_soon_threadsafe(task.cancel)
+        except RuntimeError:
+            # The task's event loop is already closed
+            pass
+
+
+class CancellationRegistry:
+    """Cancellation tokens of the extractions running in this process, keyed by database and file name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = {}
+
+    def register(self, key) -> CancellationToken:
+        token = CancellationToken()
+        with self._lock:
+            self._tokens[key] = token
+        return token
+
+    def unregister(self, key, token: CancellationToken):
+        with self._lock:
+            if self._tokens.get(key) is token:
+                del self._tokens[key]
+
+    def cancel(self, key) -> bool:
+        """Signals the token of key, returns False when no extraction of key runs in this process."""
+        with self._lock:
+            token = self._tokens.get(key)
+        if token is None:
+            return False
+        token.cancel()
+        return True
+
+
+_cancellation_registry = CancellationRegistry()
+
+
+def get_cancellation_key(uri, database, file_name):
+    return get_database_key(uri, database), file_name
+
+
+def register_extraction(uri, database, file_name) -> CancellationToken:
+    return _cancellation_registry.register(get_cancellation_key(uri, database, file_name))
+
+
+def unregister_extraction(uri, database, file_name, token: CancellationToken):
+    _cancellation_registry.unregister(get_cancellation_key(uri, database, file_name), token)
+
+
+def cancel_extraction(uri, database, file_name) -> bool:
+    cancelled = _cancellation_registry.cancel(get_cancellation_key(uri, database, file_name))
+    if cancelled:
+        logging.info(f"Signalled cancellation of the running extraction of {file_name}")
+    return cancelled
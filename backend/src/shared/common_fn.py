@@ -15,6 +15,10 @@ from pathlib import Path
 from urllib.parse import urlparse
 import boto3
 from langchain_community.embeddings import BedrockEmbeddings
+from src.shared.constants import EMBEDDING_BATCH_SIZES, GRAPH_WRITE_BATCH_SIZE
+from src.shared.driver_registry import get_shared_graph
+from src.shared.graph_writer import BASE_ENTITY_LABEL, plan_graph_document_writes
+from src.shared.metrics import get_query_name, record_deadlock_retry, time_neo4j_query
 
 def check_url_source(source_type, yt_url:str=None, wiki_query:str=None):
     language=''
@@ -61,12 +65,8 @@ def get_chunk_and_graphDocument(graph_document_list, chunkId_chunkDoc_list):
   return lst_chunk_chunkId_document  
                  
 def create_graph_database_connection(uri, userName, password, database):
-  enable_user_agent = os.environ.get("ENABLE_USER_AGENT", "False").lower() in ("true", "1", "yes")
-  if enable_user_agent:
-    graph = Neo4jGraph(url=uri, database=database, username=userName, password=password, refresh_schema=False, sanitize=True,driver_config={'user_agent':os.environ.get('NEO4J_USER_AGENT')})  
-  else:
-    graph = Neo4jGraph(url=uri, database=database, username=userName, password=password, refresh_schema=False, sanitize=True)    
-  return graph
+  # Graphs are shared per uri/user/database so that requests reuse the driver's connection pool
+  return get_shared_graph(uri, userName, password, database)
 
 
 def load_embedding_model(embedding_model_name: str):
@@ -92,21 +92,71 @@ def load_embedding_model(embedding_model_name: str):
         logging.info(f"Embedding: Using Langchain HuggingFaceEmbeddings , Dimension:{dimension}")
     return embeddings, dimension
 
-def save_graphDocuments_in_neo4j(graph: Neo4jGraph, graph_document_list: List[GraphDocument], max_retries=3, delay=1):
-   retries = 0
-   while retries < max_retries:
-       try:
-           graph.add_graph_documents(graph_document_list, baseEntityLabel=True)
-           return
-       except TransientError as e:
-           if "DeadlockDetected" in str(e):
-               retries += 1
-               logging.info(f"Deadlock detected. Retrying {retries}/{max_retries} in {delay} seconds...")
-               time.sleep(delay)  # Wait before retrying
-           else:
-               raise
-   logging.error("Failed to execute query after maximum retries due to persistent deadlocks.")
-   raise RuntimeError("Query execution failed after multiple retries due to deadlock.")
+def get_embedding_batch_size(embedding_model_name: str) -> int:
+  """
+  Returns the number of texts embedded per embed_documents call for the given embedding backend.
+  EMBEDDING_BATCH_SIZE overrides the per-backend default from EMBEDDING_BATCH_SIZES.
+  """
+  backend = embedding_model_name if embedding_model_name in EMBEDDING_BATCH_SIZES else "huggingface"
+  batch_size = os.environ.get('EMBEDDING_BATCH_SIZE')
+  try:
+    return max(1, int(batch_size)) if batch_size else EMBEDDING_BATCH_SIZES[backend]
+  except ValueError:
+    logging.warning(f"Invalid EMBEDDING_BATCH_SIZE: {batch_size}, using default for {backend}")
+    return EMBEDDING_BATCH_SIZES[backend]
+
+def embed_documents_in_batches(embeddings, texts: List[str], batch_size: int) -> List[List[float]]:
+  """
+  Embeds texts with one embed_documents call per batch instead of one embed_query call per text.
+
+  Returns:
+      list: one embedding per text, in the same order as texts.
+  """
+  vectors = []
+  for start in range(0, len(texts), batch_size):
+    vectors.extend(embeddings.embed_documents(texts[start:start + batch_size]))
+  return vectors
+
+def save_graphDocuments_in_neo4j(graph: Neo4jGraph, graph_document_list: List[GraphDocument], batch_size: int = None):
+   """
+   Merges the entities and relationships of the graph documents with plan_graph_document_writes, one
+   transaction per batch of rows with the same labels and type, ordered so that concurrent extractions
+   lock shared entities in the same order.
+
+   Args:
+       graph: Neo4jGraph connection.
+       graph_document_list: graph documents returned by the LLM.
+       batch_size: rows per transaction, defaults to GRAPH_WRITE_BATCH_SIZE.
+
+   Returns:
+       dict: nodes and relationships created and merged into existing ones, the number of transactions,
+       and `element_ids`, the element id of every written entity by its id, for merge_relationship_between_chunk_and_entites.
+   """
+   batch_size = batch_size or int(os.environ.get('GRAPH_WRITE_BATCH_SIZE', GRAPH_WRITE_BATCH_SIZE))
+   ensure_entity_constraint(graph)
+   stats = {"nodes_created": 0, "nodes_merged": 0, "relationships_created": 0, "relationships_merged": 0, "transactions": 0,
+            "element_ids": {}}
+   for write in plan_graph_document_writes(graph_document_list, batch_size):
+       kind = write["kind"]
+       counters = execute_graph_write(graph, write["query"], params={"rows": write["rows"]}, query_name=f"save_graph_{kind}")
+       stats["element_ids"].update((record["id"], record["element_id"]) for record in counters["records"])
+       stats[f"{kind}_created"] += counters[f"{kind}_created"]
+       stats[f"{kind}_merged"] += len(write["rows"]) - counters[f"{kind}_created"]
+       stats["transactions"] += 1
+   return stats
+
+_entity_constraint_databases = set()
+
+def ensure_entity_constraint(graph: Neo4jGraph):
+   """Creates the uniqueness constraint on __Entity__ ids that entity merges rely on, once per database and process."""
+   key = (id(graph._driver), graph._database)
+   if key in _entity_constraint_databases:
+      return
+   try:
+      execute_graph_query(graph, f"CREATE CONSTRAINT IF NOT EXISTS FOR (e:`{BASE_ENTITY_LABEL}`) REQUIRE e.id IS UNIQUE")
+   except Exception as e:
+      logging.warning(f"Could not create the {BASE_ENTITY_LABEL} id constraint, entities are merged without it: {e}")
+   _entity_constraint_databases.add(key)
            
 def handle_backticks_nodes_relationship_id_type(graph_document_list:List[GraphDocument]):
   for graph_document in graph_document_list:
@@ -128,14 +178,17 @@ def handle_backticks_nodes_relationship_id_type(graph_document_list:List[GraphDo
     graph_document.nodes = cleaned_nodes
   return graph_document_list
 
-def execute_graph_query(graph: Neo4jGraph, query, params=None, max_retries=3, delay=2):
+def execute_graph_query(graph: Neo4jGraph, query, params=None, max_retries=3, delay=2, query_name=None):
+   query_name = get_query_name(query_name)
    retries = 0
    while retries < max_retries:
        try:
-           return graph.query(query, params) 
+           with time_neo4j_query(query_name):
+               return graph.query(query, params) 
        except TransientError as e:
            if "DeadlockDetected" in str(e):
                retries += 1
+               record_deadlock_retry(query_name)
                logging.info(f"Deadlock detected. Retrying {retries}/{max_retries} in {delay} seconds...")
                time.sleep(delay)  # Wait before retrying
            else:
@@ -143,6 +196,35 @@ def execute_graph_query(graph: Neo4jGraph, query, params=None, max_retries=3, de
    logging.error("Failed to execute query after maximum retries due to persistent deadlocks.")
    raise RuntimeError("Query execution failed after multiple retries due to deadlock.")
 
+def execute_graph_write(graph: Neo4jGraph, query, params=None, max_retries=3, delay=2, query_name=None):
+   """
+   Runs a write query on the graph's driver and returns its write counters, which Neo4jGraph.query discards.
+
+   Returns:
+       dict: nodes_created, relationships_created, nodes_deleted, relationships_deleted and properties_set,
+       and the records returned by the query as dicts.
+   """
+   query_name = get_query_name(query_name)
+   retries = 0
+   while retries < max_retries:
+       try:
+           with time_neo4j_query(query_name):
+               result = graph._driver.execute_query(query, params or {}, database_=graph._database)
+           counters = result.summary.counters
+           return {"nodes_created": counters.nodes_created, "relationships_created": counters.relationships_created,
+                   "nodes_deleted": counters.nodes_deleted, "relationships_deleted": counters.relationships_deleted,
+                   "properties_set": counters.properties_set, "records": [record.data() for record in result.records]}
+       except TransientError as e:
+           if "DeadlockDetected" in str(e):
+               retries += 1
+               record_deadlock_retry(query_name)
+               logging.info(f"Deadlock detected. Retrying {retries}/{max_retries} in {delay} seconds...")
+               time.sleep(delay)  # Wait before retrying
+           else:
+               raise
+   logging.error("Failed to execute query after maximum retries due to persistent deadlocks.")
+   raise RuntimeError("Query execution failed after multiple retries due to deadlock.")
+
 def delete_uploaded_local_file(merged_file_path, file_name):
   file_path = Path(merged_file_path)
   if file_path.exists():
@@ -5,10 +5,12 @@ BUCKET_UPLOAD = 'llm-graph-builder-upload'
 BUCKET_FAILED_FILE = 'llm-graph-builder-failed'
 PROJECT_ID = 'llm-experiments-387609' 
 GRAPH_CHUNK_LIMIT = 50 
+# Nodes and relationships per page of the /graph_query_stream response
+GRAPH_STREAM_PAGE_SIZE = 500
 
 
 #query 
-GRAPH_QUERY = """
+GRAPH_PATHS_QUERY = """
 MATCH docs = (d:Document) 
 WHERE d.fileName IN $document_names
 WITH docs, d 
@@ -60,27 +62,68 @@ CALL {{
 }}
 
 WITH apoc.coll.flatten(docs + chunks + chunkRels + entities + entityRels + communities + parentCommunities, true) AS paths
+"""
 
+# Only display properties are sent to the visualization: the whitelisted $node_properties, or every
+# property but the $excluded_properties (embeddings, texts and summaries) when the whitelist is empty
+GRAPH_NODE_PROJECTION = """{{
+    element_id: elementId(node),
+    labels: labels(node),
+    properties: apoc.map.fromPairs([key IN keys(node)
+      WHERE CASE WHEN size($node_properties) = 0 THEN NOT key IN $excluded_properties ELSE key IN $node_properties END
+      | [key, node[key]]])
+  }}"""
+GRAPH_RELATIONSHIP_PROJECTION = """{{
+    element_id: elementId(rel),
+    type: type(rel),
+    start_node_element_id: elementId(startNode(rel)),
+    end_node_element_id: elementId(endNode(rel))
+  }}"""
+
+# Collects the distinct nodes and relationships of the paths into a single record
+GRAPH_QUERY = GRAPH_PATHS_QUERY + """
 // Distinct nodes and relationships
 CALL {{
   WITH paths 
   UNWIND paths AS path 
   UNWIND nodes(path) AS node 
   WITH distinct node 
-  RETURN collect(node /* {{.*, labels:labels(node), elementId:elementId(node), embedding:null, text:null}} */) AS nodes 
+  RETURN collect(""" + GRAPH_NODE_PROJECTION + """) AS nodes 
 }}
 
 CALL {{
   WITH paths 
   UNWIND paths AS path 
   UNWIND relationships(path) AS rel 
-  RETURN collect(distinct rel) AS rels 
+  WITH distinct rel 
+  RETURN collect(""" + GRAPH_RELATIONSHIP_PROJECTION + """) AS rels 
 }}  
 
 RETURN nodes, rels
 
 """
 
+# Streams one record per distinct node, then per distinct relationship, ordered by kind and element id.
+# Rows after the ($after_kind, $after_key) keyset cursor continue an earlier response without
+# skipping the rows it already sent.
+GRAPH_STREAM_QUERY = GRAPH_PATHS_QUERY + """
+CALL {{
+  WITH paths
+  UNWIND paths AS path
+  UNWIND nodes(path) AS node
+  WITH DISTINCT node
+  RETURN """ + GRAPH_NODE_PROJECTION + """ AS node, null AS rel
+  UNION ALL
+  WITH paths
+  UNWIND paths AS path
+  UNWIND relationships(path) AS rel
+  WITH DISTINCT rel
+  RETURN null AS node, """ + GRAPH_RELATIONSHIP_PROJECTION + """ AS rel
+}}
+
+RETURN node, rel
+"""
+
 CHUNK_QUERY = """
 MATCH (chunk:Chunk)
 WHERE chunk.id IN $chunksIds
@@ -163,54 +206,69 @@ SKIP $skip
 LIMIT $limit
 """
 
-NODEREL_COUNT_QUERY_WITH_COMMUNITY = """
-MATCH (d:Document)
-WHERE d.fileName IS NOT NULL
-OPTIONAL MATCH (d)<-[po:PART_OF]-(c:Chunk)
-OPTIONAL MATCH (c)-[he:HAS_ENTITY]->(e:__Entity__)
-OPTIONAL MATCH (c)-[sim:SIMILAR]->(c2:Chunk)
-OPTIONAL MATCH (c)-[nc:NEXT_CHUNK]->(c3:Chunk)
-OPTIONAL MATCH (e)-[ic:IN_COMMUNITY]->(comm:__Community__)
-OPTIONAL MATCH (comm)-[pc1:PARENT_COMMUNITY]->(first_level:__Community__)
-OPTIONAL MATCH (first_level)-[pc2:PARENT_COMMUNITY]->(second_level:__Community__)
-OPTIONAL MATCH (second_level)-[pc3:PARENT_COMMUNITY]->(third_level:__Community__)
-WITH
-  d.fileName AS filename,
-  count(DISTINCT c) AS chunkNodeCount,
-  count(DISTINCT po) AS partOfRelCount,
-  count(DISTINCT he) AS hasEntityRelCount,
-  count(DISTINCT sim) AS similarRelCount,
-  count(DISTINCT nc) AS nextChunkRelCount,
-  count(DISTINCT e) AS entityNodeCount,
-  collect(DISTINCT e) AS entities,
-  count(DISTINCT comm) AS baseCommunityCount,
-  count(DISTINCT first_level) AS firstlevelcommCount,
-  count(DISTINCT second_level) AS secondlevelcommCount,
-  count(DISTINCT third_level) AS thirdlevelcommCount,
-  count(DISTINCT ic) AS inCommunityCount,
-  count(DISTINCT pc1) AS parentCommunityRelCount1,
-  count(DISTINCT pc2) AS parentCommunityRelCount2,
-  count(DISTINCT pc3) AS parentCommunityRelCount3
-WITH
-  filename,
-  chunkNodeCount,
-  partOfRelCount + hasEntityRelCount + similarRelCount + nextChunkRelCount AS chunkRelCount,
-  entityNodeCount,
-  entities,
-  baseCommunityCount + firstlevelcommCount + secondlevelcommCount + thirdlevelcommCount AS commCount,
-  inCommunityCount + parentCommunityRelCount1 + parentCommunityRelCount2 + parentCommunityRelCount3 AS communityRelCount
+# Counts of a partition of documents, with the same definitions as NODEREL_COUNT_QUERY_WITHOUT_COMMUNITY
+# plus the communities of their entities. Each part is counted in its own subquery so that the optional
+# matches are not multiplied into one row per combination of chunk, entity and community.
+NODEREL_COUNT_QUERY_FOR_DOCUMENTS = """
+UNWIND $filenames AS filename
+MATCH (d:Document {fileName: filename})
+CALL (d) {
+  OPTIONAL MATCH (d)<-[po:PART_OF]-(c:Chunk)
+  RETURN count(DISTINCT po) AS partOfRelCount, collect(DISTINCT c) AS chunks
+}
+CALL (chunks) {
+  UNWIND chunks AS c
+  OPTIONAL MATCH (c)-[he:HAS_ENTITY]->(e:__Entity__)
+  RETURN count(DISTINCT he) AS hasEntityRelCount, collect(DISTINCT e) AS entities
+}
+CALL (chunks) {
+  UNWIND chunks AS c
+  RETURN sum(COUNT { (c)-[:SIMILAR]->(:Chunk) }) + sum(COUNT { (c)-[:NEXT_CHUNK]->(:Chunk) }) AS chunkChunkRelCount
+}
 CALL (entities) {
   UNWIND entities AS e
   RETURN sum(COUNT { (e)-->(e2:__Entity__) WHERE e2 in entities }) AS entityEntityRelCount
 }
+CALL (entities) {
+  UNWIND entities AS e
+  OPTIONAL MATCH (e)-[ic:IN_COMMUNITY]->(comm:__Community__)
+  RETURN count(DISTINCT ic) AS inCommunityCount, collect(DISTINCT comm) AS baseCommunities
+}
+CALL (baseCommunities) {
+  UNWIND baseCommunities AS comm
+  OPTIONAL MATCH (comm)-[pc:PARENT_COMMUNITY]->(first_level:__Community__)
+  RETURN count(DISTINCT pc) AS parentCommunityRelCount1, collect(DISTINCT first_level) AS firstLevel
+}
+CALL (firstLevel) {
+  UNWIND firstLevel AS comm
+  OPTIONAL MATCH (comm)-[pc:PARENT_COMMUNITY]->(second_level:__Community__)
+  RETURN count(DISTINCT pc) AS parentCommunityRelCount2, collect(DISTINCT second_level) AS secondLevel
+}
+CALL (secondLevel) {
+  UNWIND secondLevel AS comm
+  OPTIONAL MATCH (comm)-[pc:PARENT_COMMUNITY]->(third_level:__Community__)
+  RETURN count(DISTINCT pc) AS parentCommunityRelCount3, count(DISTINCT third_level) AS thirdLevelCount
+}
 RETURN
   filename,
-  COALESCE(chunkNodeCount, 0) AS chunkNodeCount,
-  COALESCE(chunkRelCount, 0) AS chunkRelCount,
-  COALESCE(entityNodeCount, 0) AS entityNodeCount,
+  size(chunks) AS chunkNodeCount,
+  partOfRelCount + hasEntityRelCount + chunkChunkRelCount AS chunkRelCount,
+  size(entities) AS entityNodeCount,
   COALESCE(entityEntityRelCount, 0) AS entityEntityRelCount,
-  COALESCE(commCount, 0) AS communityNodeCount,
-  COALESCE(communityRelCount, 0) AS communityRelCount
+  size(baseCommunities) + size(firstLevel) + size(secondLevel) + thirdLevelCount AS communityNodeCount,
+  inCommunityCount + parentCommunityRelCount1 + parentCommunityRelCount2 + parentCommunityRelCount3 AS communityRelCount
+"""
+DOCUMENT_COUNTS_WRITE_QUERY = """
+UNWIND $rows AS row
+MATCH (d:Document {fileName: row.filename})
+SET d.chunkNodeCount = row.chunkNodeCount,
+    d.chunkRelCount = row.chunkRelCount,
+    d.entityNodeCount = row.entityNodeCount,
+    d.entityEntityRelCount = row.entityEntityRelCount,
+    d.communityNodeCount = row.communityNodeCount,
+    d.communityRelCount = row.communityRelCount,
+    d.nodeCount = row.nodeCount,
+    d.relationshipCount = row.relationshipCount
 """
 NODEREL_COUNT_QUERY_WITHOUT_COMMUNITY = """
 MATCH (d:Document)
@@ -246,6 +304,19 @@ RETURN
   COALESCE(entityEntityRelCount, 0) AS entityEntityRelCount
 """
 
+# Ids of the entities of a document and (source id, type, target id) of the relationships between them
+DOCUMENT_ENTITY_KEYS_QUERY = """
+MATCH (d:Document {fileName: $document_name})<-[:PART_OF]-(:Chunk)-[:HAS_ENTITY]->(e:__Entity__)
+WITH collect(DISTINCT e) AS entities
+CALL (entities) {
+  UNWIND entities AS e
+  MATCH (e)-[r]->(e2:__Entity__)
+  WHERE e2 IN entities
+  RETURN collect([e.id, type(r), e2.id]) AS relationship_keys
+}
+RETURN [e IN entities | e.id] AS entity_ids, relationship_keys
+"""
+
 
 ## CHAT SETUP
 CHAT_MAX_TOKENS = 1000
@@ -786,6 +857,22 @@ CHAT_MODE_CONFIG_MAP= {
     }
 YOUTUBE_CHUNK_SIZE_SECONDS = 60
 
+# Texts sent per embed_documents call for each embedding backend of load_embedding_model,
+# overridable with EMBEDDING_BATCH_SIZE. Local models run one forward pass per batch,
+# remote providers accept up to a few hundred inputs per request.
+EMBEDDING_BATCH_SIZES = {
+    "openai": 512,
+    "vertexai": 250,
+    "titan": 32,
+    "huggingface": 64,
+}
+CHUNK_WRITE_BATCH_SIZE = 1000
+# Entity or relationship rows merged per transaction by save_graphDocuments_in_neo4j
+GRAPH_WRITE_BATCH_SIZE = 500
+# Documents counted per query and queries run at the same time by the post-processing recount
+RECOUNT_PARTITION_SIZE = 100
+RECOUNT_MAX_CONCURRENCY = 4
+
 QUERY_TO_GET_CHUNKS = """
             MATCH (d:Document)
             WHERE d.fileName = $filename
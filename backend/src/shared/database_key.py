@@ -0,0 +1,9 @@
+import os
+
+
+def get_database_key(uri, database) -> str:
+    """
+    Identifies a Neo4j database across the job queue, progress bus and cancellation registry, defaulting
+    to NEO4J_URI and NEO4J_DATABASE like the connections do.
+    """
+    return f"{uri or os.environ.get('NEO4J_URI', '')}|{database or os.environ.get('NEO4J_DATABASE', 'neo4j')}"
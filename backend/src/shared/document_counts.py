@@ -0,0 +1,66 @@
+from src.shared.graph_writer import get_relationship_type
+
+COUNT_FIELDS = ("chunkNodeCount", "chunkRelCount", "entityNodeCount", "entityEntityRelCount", "communityNodeCount", "communityRelCount")
+
+
+class DocumentCounts:
+    """
+    Running node and relationship counts of one Document, kept up to date from each batch written
+    during extraction instead of recounting the whole document after every batch.
+
+    Chunks add their Chunk node and their PART_OF and NEXT_CHUNK relationships, entities and
+    relationships between entities are counted once per identity across batches, and HAS_ENTITY
+    relationships come from the write counters of the query that creates them. SIMILAR and community
+    relationships are created after extraction and are only known from a full recount.
+    """
+
+    def __init__(self, counts: dict = None):
+        counts = counts or {}
+        self.counts = {field: int(counts.get(field) or 0) for field in COUNT_FIELDS}
+        self._entities = set()
+        self._relationships = set()
+
+    def add_existing_entities(self, entity_ids, relationship_keys):
+        """
+        Marks the entities and entity relationships already in the graph, and so already in the counts,
+        as seen, so that a retried extraction does not count them again when it extracts them anew.
+
+        Args:
+            entity_ids: ids of the document's entities.
+            relationship_keys: (source id, type, target id) of the relationships between them.
+        """
+        self._entities.update(entity_ids)
+        self._relationships.update((source, get_relationship_type(rel_type), target) for source, rel_type, target in relationship_keys)
+
+    def add_chunks(self, chunk_count: int, is_first_window: bool):
+        """Counts a window of new consecutive chunks, linked to the previous window by NEXT_CHUNK."""
+        if chunk_count <= 0:
+            return
+        next_chunk_count = chunk_count - 1 if is_first_window else chunk_count
+        self.counts["chunkNodeCount"] += chunk_count
+        self.counts["chunkRelCount"] += chunk_count + next_chunk_count
+
+    def add_graph_documents(self, graph_documents):
+        """Counts the entities and entity relationships of a batch that were not seen in earlier batches."""
+        for graph_document in graph_documents:
+            for node in graph_document.nodes:
+                if node.id not in self._entities:
+                    self._entities.add(node.id)
+                    self.counts["entityNodeCount"] += 1
+            for relationship in graph_document.relationships:
+                # Types are normalized as save_graphDocuments_in_neo4j writes them
+                key = (relationship.source.id, get_relationship_type(relationship.type), relationship.target.id)
+                if key not in self._relationships:
+                    self._relationships.add(key)
+                    self.counts["entityEntityRelCount"] += 1
+
+    def add_chunk_relationships(self, relationships_created: int):
+        self.counts["chunkRelCount"] += int(relationships_created or 0)
+
+    def as_dict(self) -> dict:
+        """Returns the counts with their nodeCount and relationshipCount totals, as update_node_relationship_count."""
+        return {
+            **self.counts,
+            "nodeCount": self.counts["chunkNodeCount"] + self.counts["entityNodeCount"] + self.counts["communityNodeCount"],
+            "relationshipCount": self.counts["chunkRelCount"] + self.counts["entityEntityRelCount"] + self.counts["communityRelCount"],
+        }
@@ -0,0 +1,233 @@
+import contextvars
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_MAX_CONNECTION_POOL_SIZE = 100
+DEFAULT_CONNECTION_ACQUISITION_TIMEOUT = 60
+DEFAULT_MAX_CONNECTION_LIFETIME = 3600
+DEFAULT_LIVENESS_CHECK_TIMEOUT = 60
+DEFAULT_DRIVER_IDLE_TIMEOUT = 1800
+DEFAULT_REPLACED_DRIVER_CLOSE_DELAY = 300
+
+# Leases taken by get() inside connection_lease_scope(), released when the scope exits
+_lease_scope = contextvars.ContextVar("neo4j_connection_leases", default=None)
+
+
+def _password_hash(password) -> str:
+    return hashlib.sha256((password or "").encode()).hexdigest()
+
+
+class DriverRegistry:
+    """
+    Shares one connection object per (uri, user, database, user agent) across the process.
+
+    `factory(uri, username, password, database, user_agent)` creates the object, which must provide
+    verify_connectivity(). Entries are replaced when the password changes, re-verified when they were
+    not borrowed for `liveness_check_timeout` seconds and dropped after `idle_timeout` seconds unused.
+    Every get() inside connection_lease_scope() holds a lease on its entry until the scope exits, and
+    leased entries are never evicted as idle. Dropped entries may still be used by running requests, so
+    they are closed `replaced_close_delay` seconds later, or when their last lease is released if that
+    comes after.
+    """
+
+    def __init__(self, factory, liveness_check_timeout: float = DEFAULT_LIVENESS_CHECK_TIMEOUT,
+                 idle_timeout: float = DEFAULT_DRIVER_IDLE_TIMEOUT,
+                 replaced_close_delay: float = DEFAULT_REPLACED_DRIVER_CLOSE_DELAY, name: str = "driver"):
+        self.factory = factory
+        self.liveness_check_timeout = liveness_check_timeout
+        self.idle_timeout = idle_timeout
+        self.replaced_close_delay = replaced_close_delay
+        self.name = name
+        self._entries = {}
+        self._close_timers = {}
+        self._lock = threading.Lock()
+
+    def _evict_idle(self, now) -> list:
+        evicted = []
+        for key in [key for key, entry in self._entries.items()
+                    if not entry["leases"] and now - entry["last_used"] > self.idle_timeout]:
+            logging.info(f"Evicting idle Neo4j {self.name} for {key[0]} database {key[2]}")
+            evicted.append(self._entries.pop(key))
+        return evicted
+
+    def _close(self, entry):
+        try:
+            entry["connection"].close()
+        except Exception as e:
+            logging.warning(f"Failed to close Neo4j {self.name}: {e}")
+
+    def _close_later(self, entry):
+        def close():
+            with self._lock:
+                self._close_timers.pop(timer, None)
+                # Closed by the release of its last lease instead
+                entry["close_pending"] = entry["leases"] > 0
+                if entry["close_pending"]:
+                    return
+            self._close(entry)
+
+        timer = threading.Timer(self.replaced_close_delay, close)
+        timer.daemon = True
+        with self._lock:
+            self._close_timers[timer] = entry
+        timer.start()
+
+    def get(self, uri, username, password, database, user_agent=None):
+        key = (uri, username, database, user_agent)
+        password_hash = _password_hash(password)
+        now = time.monotonic()
+        replaced = None
+        with self._lock:
+            evicted = self._evict_idle(now)
+            entry = self._entries.get(key)
+            if entry is not None and entry["password_hash"] != password_hash:
+                logging.info(f"Credentials changed, replacing Neo4j {self.name} for {uri} database {database}")
+                replaced = self._entries.pop(key)
+                entry = None
+        for evicted_entry in evicted:
+            self._close_later(evicted_entry)
+        if replaced is not None:
+            self._close_later(replaced)
+        if entry is not None and now - entry["last_used"] > self.liveness_check_timeout:
+            try:
+                entry["connection"].verify_connectivity()
+            except Exception as e:
+                logging.warning(f"Neo4j {self.name} for {uri} database {database} failed liveness check, reconnecting: {e}")
+                with self._lock:
+                    dropped = self._entries.get(key) is entry
+                    if dropped:
+                        del self._entries[key]
+                if dropped:
+                    self._close_later(entry)
+                entry = None
+        if entry is None:
+            # Created outside the lock so a slow or unreachable server does not block other databases
+            connection = self.factory(uri, username, password, database, user_agent)
+            entry = {"connection": connection, "password_hash": password_hash, "last_used": now, "leases": 0,
+                     "close_pending": False}
+            with self._lock:
+                existing = self._entries.get(key)
+                if existing is not None and existing["password_hash"] == password_hash:
+                    entry = existing
+                else:
+                    self._entries[key] = entry
+        leases = _lease_scope.get()
+        with self._lock:
+            entry["last_used"] = now
+            if leases is not None:
+                entry["leases"] += 1
+                leases.append((self, entry))
+        return entry["connection"]
+
+    def _release(self, entry):
+        with self._lock:
+            entry["leases"] -= 1
+            entry["last_used"] = time.monotonic()
+            close = entry["leases"] == 0 and entry["close_pending"]
+            if close:
+                entry["close_pending"] = False
+        if close:
+            self._close(entry)
+
+    def close_all(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+            timers = dict(self._close_timers)
+            self._close_timers.clear()
+        for timer, entry in timers.items():
+            # Shutting down, so pending closes run now whether or not their entry is still leased
+            timer.cancel()
+            self._close(entry)
+        for entry in entries:
+            self._close(entry)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+@contextmanager
+def connection_lease_scope():
+    """Holds every shared graph and driver borrowed inside the block until it exits, so they are not closed under it."""
+    leases = []
+    token = _lease_scope.set(leases)
+    try:
+        yield
+    finally:
+        _lease_scope.reset(token)
+        for registry, entry in leases:
+            registry._release(entry)
+
+
+class ConnectionLeaseMiddleware:
+    """Runs every HTTP request, including its streamed response, inside connection_lease_scope()."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        with connection_lease_scope():
+            await self.app(scope, receive, send)
+
+
+def get_driver_config(user_agent=None) -> dict:
+    """Connection pool settings shared by every driver, from the NEO4J_* pool environment variables."""
+    config = {
+        "max_connection_pool_size": int(os.environ.get("NEO4J_MAX_CONNECTION_POOL_SIZE", DEFAULT_MAX_CONNECTION_POOL_SIZE)),
+        "connection_acquisition_timeout": float(os.environ.get("NEO4J_CONNECTION_ACQUISITION_TIMEOUT", DEFAULT_CONNECTION_ACQUISITION_TIMEOUT)),
+        "max_connection_lifetime": float(os.environ.get("NEO4J_MAX_CONNECTION_LIFETIME", DEFAULT_MAX_CONNECTION_LIFETIME)),
+        "liveness_check_timeout": float(os.environ.get("NEO4J_LIVENESS_CHECK_TIMEOUT", DEFAULT_LIVENESS_CHECK_TIMEOUT)),
+    }
+    if user_agent:
+        config["user_agent"] = user_agent
+    return config
+
+
+def get_user_agent():
+    enable_user_agent = os.environ.get("ENABLE_USER_AGENT", "False").lower() in ("true", "1", "yes")
+    return os.environ.get("NEO4J_USER_AGENT") if enable_user_agent else None
+
+
+def _create_graph(uri, username, password, database, user_agent):
+    from langchain_neo4j import Neo4jGraph
+    return Neo4jGraph(url=uri, database=database, username=username, password=password, refresh_schema=False,
+                      sanitize=True, driver_config=get_driver_config(user_agent))
+
+
+def _create_driver(uri, username, password, database, user_agent):
+    from neo4j import GraphDatabase
+    return GraphDatabase.driver(uri, auth=(username, password), database=database, **get_driver_config(user_agent))
+
+
+def _registry_settings():
+    return {
+        "liveness_check_timeout": float(os.environ.get("NEO4J_LIVENESS_CHECK_TIMEOUT", DEFAULT_LIVENESS_CHECK_TIMEOUT)),
+        "idle_timeout": float(os.environ.get("NEO4J_DRIVER_IDLE_TIMEOUT", DEFAULT_DRIVER_IDLE_TIMEOUT)),
+        "replaced_close_delay": float(os.environ.get("NEO4J_REPLACED_DRIVER_CLOSE_DELAY", DEFAULT_REPLACED_DRIVER_CLOSE_DELAY)),
+    }
+
+
+_graph_registry = DriverRegistry(_create_graph, name="graph", **_registry_settings())
+_driver_registry = DriverRegistry(_create_driver, name="driver", **_registry_settings())
+
+
+def get_shared_graph(uri, username, password, database):
+    """Returns the process-wide Neo4jGraph for these credentials, creating it on first use."""
+    return _graph_registry.get(uri, username, password, database, get_user_agent())
+
+
+def get_shared_driver(uri, username, password, database):
+    """Returns the process-wide neo4j Driver for these credentials, creating it on first use."""
+    return _driver_registry.get(uri, username, password, database, get_user_agent())
+
+
+def close_shared_connections():
+    _graph_registry.close_all()
+    _driver_registry.close_all()
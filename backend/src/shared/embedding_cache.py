@@ -0,0 +1,108 @@
+import hashlib
+import logging
+import os
+from array import array
+
+from src.shared.sqlite_cache import SQLiteCache
+
+DEFAULT_EMBEDDING_CACHE_PATH = os.path.join("cache", "embeddings.sqlite")
+DEFAULT_EMBEDDING_CACHE_MAX_ENTRIES = 200000
+
+
+def text_sha1(text: str) -> str:
+    """Same content hash used for Chunk ids in create_relation_between_chunks."""
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def get_embedding_namespace(embedding_model_name, embeddings, dimension) -> str:
+    """
+    Identifies the vectors produced by an embedding model so that switching the model, or the
+    provider model behind the same EMBEDDING_MODEL value, never returns stale vectors.
+    """
+    model = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None) or getattr(embeddings, "model_id", None)
+    return f"{embedding_model_name or 'huggingface'}:{model or type(embeddings).__name__}:{dimension}"
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding store keyed by (embedding model, dimension, sha1 of the text).
+    Vectors are stored as packed float64 arrays.
+    """
+
+    def __init__(self, cache: SQLiteCache):
+        self.cache = cache
+
+    @staticmethod
+    def _key(namespace, text):
+        return f"{namespace}:{text_sha1(text)}"
+
+    def get_or_embed(self, namespace, texts, embed_func):
+        """
+        Args:
+            namespace: value of get_embedding_namespace for the model in use.
+            texts: list of texts to embed.
+            embed_func: callable embedding a list of texts, called once with the cache misses only.
+        Returns:
+            tuple: one embedding per text in the same order as texts, and the number of texts found in the cache.
+        """
+        keys = [self._key(namespace, text) for text in texts]
+        cached = self.cache.get_many(keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = embed_func(list(missing.values()))
+            new_entries = {key: list(vector) for key, vector in zip(missing, vectors)}
+            self.cache.set_many([(key, array("d", vector).tobytes()) for key, vector in new_entries.items()])
+        else:
+            new_entries = {}
+        results = []
+        for key in keys:
+            if key in new_entries:
+                results.append(new_entries[key])
+            else:
+                results.append(array("d", cached[key]).tolist())
+        return results, sum(1 for key in keys if key in cached)
+
+    def stats(self):
+        return self.cache.stats()
+
+
+_embedding_cache = None
+
+
+def get_embedding_cache():
+    """
+    Returns the process-wide embedding cache, or None when EMBEDDING_CACHE_ENABLED is false.
+    The file location and size cap come from EMBEDDING_CACHE_PATH and EMBEDDING_CACHE_MAX_ENTRIES.
+    """
+    global _embedding_cache
+    if os.environ.get("EMBEDDING_CACHE_ENABLED", "True").lower() not in ("true", "1", "yes"):
+        return None
+    if _embedding_cache is None:
+        path = os.environ.get("EMBEDDING_CACHE_PATH") or DEFAULT_EMBEDDING_CACHE_PATH
+        max_entries = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", DEFAULT_EMBEDDING_CACHE_MAX_ENTRIES))
+        try:
+            _embedding_cache = EmbeddingCache(SQLiteCache(path, max_entries=max_entries, table="embeddings"))
+            logging.info(f"Embedding cache at {path} with {len(_embedding_cache.cache)} entries")
+        except Exception as e:
+            logging.warning(f"Embedding cache disabled, failed to open {path}: {e}")
+            return None
+    return _embedding_cache
+
+
+def embed_texts_with_cache(embedding_model_name, embeddings, dimension, texts, embed_func):
+    """
+    Embeds texts through the embedding cache when it is enabled, otherwise calls embed_func directly.
+
+    Returns:
+        tuple: list of embeddings in the order of texts, and the number of texts served from the cache.
+    """
+    cache = get_embedding_cache()
+    if cache is None:
+        return embed_func(texts), 0
+    vectors, hits = cache.get_or_embed(get_embedding_namespace(embedding_model_name, embeddings, dimension), texts, embed_func)
+    stats = cache.stats()
+    logging.info(f"Embedding cache hits: {stats['hits']}, misses: {stats['misses']}, hit rate: {stats['hit_rate']}")
+    return vectors, hits
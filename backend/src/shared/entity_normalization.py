@@ -0,0 +1,90 @@
+import re
+import unicodedata
+
+from src.shared.graph_writer import get_relationship_type
+
+DASHES = dict.fromkeys(map(ord, "‐‑‒–—―−"), "-")
+QUOTES = {**dict.fromkeys(map(ord, "‘’‚‛′`"), "'"), **dict.fromkeys(map(ord, "“”„‟″"), '"')}
+# Periods and commas are dropped unless they sit between digits, as in 3.5 or 1,000
+SEPARATOR_PUNCTUATION = re.compile(r"(?<!\d)[.,]|[.,](?!\d)")
+WHITESPACE = re.compile(r"\s+")
+
+
+def canonical_entity_key(entity_id: str) -> str:
+    """
+    Returns the key under which entity ids are considered the same entity: unicode NFKC form, case folded,
+    with unified dashes and quotes, surrounding quotes, periods and separating commas removed, and
+    whitespace collapsed. "Apple Inc.", "Apple  Inc" and "apple inc." share the key "apple inc".
+    """
+    key = unicodedata.normalize("NFKC", entity_id).casefold().translate(DASHES).translate(QUOTES)
+    key = SEPARATOR_PUNCTUATION.sub("", key)
+    return WHITESPACE.sub(" ", key).strip().strip("'\"").strip()
+
+
+def clean_entity_id(entity_id: str) -> str:
+    """Returns the id in NFKC form with whitespace collapsed, the form written when it is the first of its key."""
+    return WHITESPACE.sub(" ", unicodedata.normalize("NFKC", entity_id)).strip()
+
+
+class EntityNormalizer:
+    """
+    Rewrites the entity ids of graph documents to one id per canonical_entity_key before they are saved,
+    and collapses the nodes and relationships that become duplicates. The first id seen for a key is kept
+    for the rest of the extraction, so batches of one document agree on the ids they write.
+    """
+
+    def __init__(self):
+        self.canonical_ids = {}
+
+    def canonical_id(self, entity_id: str) -> str:
+        key = canonical_entity_key(entity_id)
+        if not key:
+            return entity_id
+        return self.canonical_ids.setdefault(key, clean_entity_id(entity_id))
+
+    def normalize(self, graph_documents) -> dict:
+        """
+        Normalizes the graph documents in place: within each document, nodes are unique by (id, type) with
+        their properties merged, and relationships are unique by endpoints and normalized type.
+        Relationships between two ids that collapsed into the same entity are dropped.
+
+        Returns:
+            dict: nodes and relationships before and after, and the number of rewritten ids.
+        """
+        stats = {"nodes_before": 0, "nodes_after": 0, "relationships_before": 0, "relationships_after": 0, "ids_rewritten": 0}
+        for graph_document in graph_documents:
+            stats["nodes_before"] += len(graph_document.nodes)
+            stats["relationships_before"] += len(graph_document.relationships)
+            # Endpoints may be the node objects themselves, so their ids are read before any is rewritten
+            distinct_endpoints = [relationship.source.id != relationship.target.id for relationship in graph_document.relationships]
+            nodes = {}
+            for node in graph_document.nodes:
+                stats["ids_rewritten"] += self._rewrite(node)
+                unique_node = nodes.setdefault((node.id, node.type), node)
+                if unique_node is not node and node.properties:
+                    unique_node.properties = {**(unique_node.properties or {}), **node.properties}
+
+            relationships = {}
+            for relationship, distinct_ids in zip(graph_document.relationships, distinct_endpoints):
+                self._rewrite(relationship.source)
+                self._rewrite(relationship.target)
+                if distinct_ids and relationship.source.id == relationship.target.id:
+                    continue
+                key = (relationship.source.id, relationship.source.type, get_relationship_type(relationship.type),
+                       relationship.target.id, relationship.target.type)
+                unique_relationship = relationships.setdefault(key, relationship)
+                if unique_relationship is not relationship and relationship.properties:
+                    unique_relationship.properties = {**(unique_relationship.properties or {}), **relationship.properties}
+
+            graph_document.nodes = list(nodes.values())
+            graph_document.relationships = list(relationships.values())
+            stats["nodes_after"] += len(graph_document.nodes)
+            stats["relationships_after"] += len(graph_document.relationships)
+        return stats
+
+    def _rewrite(self, node) -> bool:
+        canonical_id = self.canonical_id(node.id)
+        if canonical_id == node.id:
+            return False
+        node.id = canonical_id
+        return True
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import logging
+import os
+import zlib
+
+from src.shared.sqlite_cache import SQLiteCache
+
+DEFAULT_EXTRACTION_CACHE_PATH = os.path.join("cache", "extractions.sqlite")
+DEFAULT_EXTRACTION_CACHE_MAX_ENTRIES = 50000
+
+
+def extraction_cache_key(model, allowed_nodes, allowed_relationships, base_instructions, additional_instructions, content):
+    """
+    Key of one combined-chunk extraction: the model, the schema restrictions, a hash of the
+    built-in ADDITIONAL_INSTRUCTIONS, the sanitized user instructions and the content hash.
+    Any change to one of them produces a new key, so stale extractions are never replayed.
+    """
+    parts = {
+        "model": model,
+        "nodes": list(allowed_nodes or []),
+        "relationships": [list(relationship) for relationship in (allowed_relationships or [])],
+        "base_instructions": hashlib.sha1((base_instructions or "").encode()).hexdigest(),
+        "additional_instructions": additional_instructions or "",
+        "content": hashlib.sha1(content.encode()).hexdigest(),
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def serialize_graph_document(graph_document) -> bytes:
+    """
+    Stores nodes as [id, type, properties] and relationships as
+    [source id, source type, target id, target type, type, properties] in compressed JSON.
+    The source document is not stored; it is the combined chunk the key was built from.
+    """
+    data = {
+        "n": [[node.id, node.type, node.properties or {}] for node in graph_document.nodes],
+        "r": [[rel.source.id, rel.source.type, rel.target.id, rel.target.type, rel.type, rel.properties or {}]
+              for rel in graph_document.relationships],
+    }
+    return zlib.compress(json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode())
+
+
+def deserialize_graph_document(value: bytes, source):
+    from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
+
+    data = json.loads(zlib.decompress(value).decode())
+    nodes = [Node(id=node_id, type=node_type, properties=properties) for node_id, node_type, properties in data["n"]]
+    relationships = [
+        Relationship(source=Node(id=source_id, type=source_type), target=Node(id=target_id, type=target_type),
+                     type=rel_type, properties=properties)
+        for source_id, source_type, target_id, target_type, rel_type, properties in data["r"]
+    ]
+    return GraphDocument(nodes=nodes, relationships=relationships, source=source)
+
+
+_extraction_cache = None
+
+
+def get_extraction_cache():
+    """
+    Returns the process-wide extraction cache, or None when EXTRACTION_CACHE_ENABLED is false.
+    Configured with EXTRACTION_CACHE_PATH, EXTRACTION_CACHE_MAX_ENTRIES and EXTRACTION_CACHE_TTL_SECONDS.
+    """
+    global _extraction_cache
+    if os.environ.get("EXTRACTION_CACHE_ENABLED", "True").lower() not in ("true", "1", "yes"):
+        return None
+    if _extraction_cache is None:
+        path = os.environ.get("EXTRACTION_CACHE_PATH") or DEFAULT_EXTRACTION_CACHE_PATH
+        max_entries = int(os.environ.get("EXTRACTION_CACHE_MAX_ENTRIES", DEFAULT_EXTRACTION_CACHE_MAX_ENTRIES))
+        ttl_seconds = float(os.environ.get("EXTRACTION_CACHE_TTL_SECONDS", 0) or 0)
+        try:
+            _extraction_cache = SQLiteCache(path, max_entries=max_entries, ttl_seconds=ttl_seconds, table="extractions")
+            logging.info(f"Extraction cache at {path} with {len(_extraction_cache)} entries")
+        except Exception as e:
+            logging.warning(f"Extraction cache disabled, failed to open {path}: {e}")
+            return None
+    return _extraction_cache
@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+
+from src.shared.tracing import trace_span
+
+DEFAULT_MAX_CONCURRENT_REQUESTS = 10
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_BASE_DELAY = 1.0
+DEFAULT_RETRY_MAX_DELAY = 30.0
+CHARS_PER_TOKEN = 4
+
+RETRYABLE_ERROR_NAMES = ("ratelimit", "toomanyrequests", "throttl", "serviceunavailable", "internalservererror",
+                         "resourceexhausted", "apiconnection", "apitimeout", "overloaded")
+RETRYABLE_ERROR_MESSAGES = ("429", "rate limit", "rate_limit", "too many requests", "throttl", "500 internal",
+                            "502", "503", "504", "overloaded", "resource exhausted", "temporarily unavailable")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap prompt-size estimate used for rate limiting; roughly four characters per token."""
+    return max(1, len(text or "") // CHARS_PER_TOKEN)
+
+
+def get_error_status_code(error):
+    for candidate in (error, getattr(error, "response", None)):
+        status = getattr(candidate, "status_code", None) or getattr(candidate, "status", None)
+        if isinstance(status, int):
+            return status
+    code = getattr(error, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Returns True for rate-limit (429), server-side (5xx) and transient connection errors."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = get_error_status_code(error)
+    if status is not None:
+        return status == 429 or 500 <= status < 600
+    error_name = type(error).__name__.lower()
+    if any(name in error_name for name in RETRYABLE_ERROR_NAMES):
+        return True
+    message = str(error).lower()
+    return any(text in message for text in RETRYABLE_ERROR_MESSAGES)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `tokens_per_minute`; capacity is one minute of tokens.
+    Thread-safe, so that one bucket limits the requests of every event loop of the process. Tokens are
+    taken as soon as a request arrives and the request then waits until the bucket is back out of debt,
+    which serves requests in arrival order.
+    """
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, tokens: int):
+        # A single request larger than the bucket would wait forever, so it only waits for a full bucket.
+        tokens = min(float(tokens), self.capacity)
+        with self._lock:
+            self._refill()
+            self.tokens -= tokens
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            await asyncio.sleep(wait)
+
+
+class ConcurrencyLimit:
+    """
+    Caps the requests in flight across every event loop of the process, which an asyncio.Semaphore,
+    bound to one loop, cannot. Freed slots are handed to the waiters in arrival order.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, int(limit))
+        self.in_use = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    async def __aenter__(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.in_use < self.limit and not self._waiters:
+                self.in_use += 1
+                return self
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter not in self._waiters
+                if not granted:
+                    self._waiters.remove(waiter)
+            if granted:
+                # The slot was handed over while the request was being cancelled
+                self._release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._release()
+
+    def _release(self):
+        while True:
+            with self._lock:
+                if not self._waiters:
+                    self.in_use -= 1
+                    return
+                loop, future = self._waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_grant, future)
+                return
+            except RuntimeError:
+                # The waiter's event loop is closed, so the slot goes to the next waiter
+                continue
+
+
+def _grant(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ExtractionScheduler:
+    """
+    Runs LLM extraction requests for one model with a cap on in-flight requests, an optional
+    token-bucket rate limit on estimated prompt tokens and retries with jittered exponential backoff
+    on 429/5xx errors. Every request is retried on its own, so one failing combined chunk does not
+    re-run the rest of the batch.
+
+    The concurrency limit and token bucket can be passed in to share them with the schedulers of other
+    event loops; they are created for this scheduler alone otherwise.
+    """
+
+    def __init__(self, model: str, max_concurrency: int = DEFAULT_MAX_CONCURRENT_REQUESTS, tokens_per_minute: int = 0,
+                 max_retries: int = DEFAULT_MAX_RETRIES, base_delay: float = DEFAULT_RETRY_BASE_DELAY,
+                 max_delay: float = DEFAULT_RETRY_MAX_DELAY, concurrency_limit: ConcurrencyLimit = None,
+                 token_bucket: TokenBucket = None):
+        self.model = model
+        self.concurrency_limit = concurrency_limit or ConcurrencyLimit(max_concurrency)
+        self.max_concurrency = self.concurrency_limit.limit
+        self.max_retries = max(0, int(max_retries))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        if token_bucket is None and tokens_per_minute and tokens_per_minute > 0:
+            token_bucket = TokenBucket(tokens_per_minute)
+        self.token_bucket = token_bucket
+        # Totals since creation, read by callers that track the retry rate of their own requests
+        self.requests = 0
+        self.retries = 0
+
+    def backoff_delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def run(self, request_factory, estimated_tokens: int = 1, description: str = "request"):
+        """
+        Args:
+            request_factory: zero-argument callable returning a new awaitable for each attempt.
+            estimated_tokens: prompt tokens charged against the rate limit for each attempt.
+            description: label used in retry logs.
+        Returns:
+            The result of the first successful attempt.
+        """
+        attempt = 0
+        self.requests += 1
+        with trace_span("extract.llm_request", {"model": self.model, "description": description,
+                                                "estimated_tokens": estimated_tokens}) as span:
+            while True:
+                if self.token_bucket is not None:
+                    await self.token_bucket.acquire(estimated_tokens)
+                try:
+                    async with self.concurrency_limit:
+                        span.set_attribute("attempts", attempt + 1)
+                        return await request_factory()
+                except Exception as e:
+                    if attempt >= self.max_retries or not is_retryable_error(e):
+                        raise
+                    delay = self.backoff_delay(attempt)
+                    attempt += 1
+                    self.retries += 1
+                    logging.warning(f"LLM {self.model} {description} failed with retryable error: {e}. "
+                                    f"Retrying {attempt}/{self.max_retries} in {delay:.2f} seconds")
+                    await asyncio.sleep(delay)
+
+    async def run_all(self, requests):
+        """
+        Runs (request_factory, estimated_tokens, description) tuples concurrently under this scheduler's limits.
+        Results keep the order of `requests`; if one request fails for good, the others are cancelled.
+        """
+        tasks = [asyncio.ensure_future(self.run(factory, tokens, description)) for factory, tokens, description in requests]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+
+def _get_model_setting(name: str, model: str, default, cast):
+    value = os.environ.get(f"{name}_{model}", os.environ.get(name))
+    if value is None or str(value).strip() == "":
+        return default
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        logging.warning(f"Invalid value for {name}: {value}, using default: {default}")
+        return default
+
+
+# Schedulers by event loop and model, dropped with their event loop
+_schedulers = weakref.WeakKeyDictionary()
+_model_limits = {}
+_model_limits_lock = threading.Lock()
+
+
+def _get_model_limits(model: str):
+    """Returns the concurrency limit and token bucket of `model`, shared by its schedulers on every event loop."""
+    with _model_limits_lock:
+        limits = _model_limits.get(model)
+        if limits is None:
+            tokens_per_minute = _get_model_setting("LLM_TOKENS_PER_MINUTE", model, 0, int)
+            limits = (ConcurrencyLimit(_get_model_setting("LLM_MAX_CONCURRENT_REQUESTS", model, DEFAULT_MAX_CONCURRENT_REQUESTS, int)),
+                      TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None)
+            _model_limits[model] = limits
+        return limits
+
+
+def get_extraction_scheduler(model: str) -> ExtractionScheduler:
+    """
+    Returns the scheduler shared by every extraction for `model` on the running event loop. Schedulers
+    of different event loops share the model's concurrency limit and token bucket, so the limits hold
+    for the whole process.
+    Limits are read from LLM_MAX_CONCURRENT_REQUESTS, LLM_TOKENS_PER_MINUTE, LLM_MAX_RETRIES,
+    LLM_RETRY_BASE_DELAY and LLM_RETRY_MAX_DELAY; each can be overridden per model by suffixing
+    the model name, e.g. LLM_MAX_CONCURRENT_REQUESTS_openai_gpt_4o.
+    """
+    model = (model or "").lower().strip()
+    loop = asyncio.get_running_loop()
+    with _model_limits_lock:
+        loop_schedulers = _schedulers.setdefault(loop, {})
+    scheduler = loop_schedulers.get(model)
+    if scheduler is None:
+        concurrency_limit, token_bucket = _get_model_limits(model)
+        scheduler = ExtractionScheduler(
+            model,
+            max_retries=_get_model_setting("LLM_MAX_RETRIES", model, DEFAULT_MAX_RETRIES, int),
+            base_delay=_get_model_setting("LLM_RETRY_BASE_DELAY", model, DEFAULT_RETRY_BASE_DELAY, float),
+            max_delay=_get_model_setting("LLM_RETRY_MAX_DELAY", model, DEFAULT_RETRY_MAX_DELAY, float),
+            concurrency_limit=concurrency_limit,
+            token_bucket=token_bucket,
+        )
+        loop_schedulers[model] = scheduler
+        logging.info(f"Extraction scheduler for {model}: max_concurrency={scheduler.max_concurrency}, "
+                     f"tokens_per_minute={scheduler.token_bucket.capacity if scheduler.token_bucket else 'unlimited'}, "
+                     f"max_retries={scheduler.max_retries}")
+    return scheduler
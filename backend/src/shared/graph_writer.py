@@ -0,0 +1,114 @@
+BASE_ENTITY_LABEL = "__Entity__"
+
+
+def quote_name(name: str) -> str:
+    """Returns a label or relationship type as a backtick-quoted Cypher name."""
+    return "`" + name.replace("`", "") + "`"
+
+
+def get_relationship_type(rel_type: str) -> str:
+    """Normalizes a relationship type the same way Neo4jGraph.add_graph_documents does."""
+    return rel_type.replace(" ", "_").upper().replace("`", "")
+
+
+def node_write_query(label: str) -> str:
+    return f"""
+        UNWIND $rows AS row
+        MERGE (n:{quote_name(BASE_ENTITY_LABEL)} {{id: row.id}})
+        SET n += row.properties
+        SET n:{quote_name(label)}
+        RETURN row.id AS id, elementId(n) AS element_id
+    """
+
+
+def relationship_write_query(source_label: str, rel_type: str, target_label: str) -> str:
+    return f"""
+        UNWIND $rows AS row
+        MERGE (source:{quote_name(BASE_ENTITY_LABEL)} {{id: row.source}})
+        ON CREATE SET source:{quote_name(source_label)}
+        MERGE (target:{quote_name(BASE_ENTITY_LABEL)} {{id: row.target}})
+        ON CREATE SET target:{quote_name(target_label)}
+        MERGE (source)-[rel:{quote_name(rel_type)}]->(target)
+        ON CREATE SET rel += row.properties
+    """
+
+
+def plan_graph_document_writes(graph_documents, batch_size: int) -> list:
+    """
+    Splits the nodes and relationships of graph documents into write queries with static labels, giving
+    the same graph as Neo4jGraph.add_graph_documents with baseEntityLabel=True: entities are merged on
+    their id under the __Entity__ label and relationships are merged once between two entities.
+
+    Nodes are grouped by label and relationships by (source label, type, target label), duplicates
+    within a group are merged, and every group is sorted by id, then split into batches of at most
+    `batch_size` rows. Groups run nodes first, in sorted order, so concurrent writers take the locks
+    of shared entities in the same order instead of deadlocking on each other.
+
+    Returns:
+        list of dict: `kind` (nodes or relationships), `query`, and `rows` of each write, in run order.
+    """
+    node_groups = {}
+    relationship_groups = {}
+    for graph_document in graph_documents:
+        for node in graph_document.nodes:
+            rows = node_groups.setdefault(node.type.replace("`", ""), {})
+            rows.setdefault(node.id, {}).update(node.properties or {})
+        for relationship in graph_document.relationships:
+            key = (relationship.source.type.replace("`", ""), get_relationship_type(relationship.type),
+                   relationship.target.type.replace("`", ""))
+            rows = relationship_groups.setdefault(key, {})
+            rows.setdefault((relationship.source.id, relationship.target.id), {}).update(relationship.properties or {})
+
+    writes = []
+    for label in sorted(node_groups):
+        rows = [{"id": node_id, "properties": properties} for node_id, properties in sorted(node_groups[label].items())]
+        writes.extend({"kind": "nodes", "query": node_write_query(label), "rows": rows[start:start + batch_size]}
+                      for start in range(0, len(rows), batch_size))
+    for key in sorted(relationship_groups):
+        rows = [{"source": source, "target": target, "properties": properties}
+                for (source, target), properties in sorted(relationship_groups[key].items())]
+        writes.extend({"kind": "relationships", "query": relationship_write_query(*key), "rows": rows[start:start + batch_size]}
+                      for start in range(0, len(rows), batch_size))
+    return writes
+
+
+def chunk_entity_link_query(label: str, by_element_id: bool) -> str:
+    if by_element_id:
+        entity = f"MATCH (n:{quote_name(label)}) WHERE elementId(n) = row.element_id"
+    else:
+        entity = f"MERGE (n:{quote_name(BASE_ENTITY_LABEL)} {{id: row.node_id}}) ON CREATE SET n:{quote_name(label)}"
+    return f"""
+        UNWIND $rows AS row
+        MATCH (c:Chunk {{id: row.chunk_id}})
+        {entity}
+        MERGE (c)-[:HAS_ENTITY]->(n)
+    """
+
+
+def plan_chunk_entity_links(chunks_and_graph_documents: list, element_ids: dict, batch_size: int) -> list:
+    """
+    Splits the HAS_ENTITY relationships between chunks and the entities extracted from them into write
+    queries grouped by entity label. Entities written by save_graphDocuments_in_neo4j are looked up by
+    the element ids it returned; entities missing from `element_ids` are merged on their id instead.
+    Rows are deduplicated and sorted by chunk id, then entity, and split into batches of at most `batch_size` rows.
+
+    Returns:
+        list of dict: `query` and `rows` of each write, in run order.
+    """
+    groups = {}
+    for chunk_and_graph_document in chunks_and_graph_documents:
+        chunk_id = chunk_and_graph_document['chunk_id']
+        for node in chunk_and_graph_document['graph_doc'].nodes:
+            element_id = element_ids.get(node.id)
+            if element_id is not None:
+                groups.setdefault((node.type.replace("`", ""), True), set()).add((chunk_id, element_id))
+            else:
+                groups.setdefault((node.type.replace("`", ""), False), set()).add((chunk_id, node.id))
+
+    writes = []
+    for label, by_element_id in sorted(groups):
+        entity_key = "element_id" if by_element_id else "node_id"
+        rows = [{"chunk_id": chunk_id, entity_key: entity} for chunk_id, entity in sorted(groups[(label, by_element_id)])]
+        query = chunk_entity_link_query(label, by_element_id)
+        writes.extend({"query": query, "rows": rows[start:start + batch_size]} for start in range(0, len(rows), batch_size))
+    return writes
@@ -0,0 +1,140 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from starlette.routing import Match
+
+# prometheus_client picks its value storage when it is imported, so the mode is fixed for the life of the process
+MULTIPROCESS_MODE = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+LLM_LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+NEO4J_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+EMBEDDING_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests handled", ["method", "endpoint", "status"])
+HTTP_REQUEST_DURATION = Histogram("http_request_duration_seconds", "HTTP request latency", ["method", "endpoint"])
+HTTP_REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being handled", ["method", "endpoint"],
+                                  multiprocess_mode="livesum")
+
+LLM_REQUESTS = Counter("llm_requests_total", "LLM request attempts by outcome (success or error)", ["model", "kind", "outcome"])
+LLM_REQUEST_DURATION = Histogram("llm_request_duration_seconds", "LLM request attempt latency", ["model", "kind"],
+                                 buckets=LLM_LATENCY_BUCKETS)
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens; estimated prompt tokens for extraction, reported total tokens for chat",
+                     ["model", "kind"])
+
+EMBEDDED_CHUNKS = Counter("embedding_chunks_total", "Chunks embedded, including embedding cache hits", ["model"])
+EMBEDDING_CACHE_HITS = Counter("embedding_cache_hits_total", "Chunks whose embedding came from the embedding cache", ["model"])
+EMBEDDING_DURATION = Histogram("embedding_duration_seconds", "Time to embed one batch of chunks", ["model"],
+                               buckets=EMBEDDING_LATENCY_BUCKETS)
+
+NEO4J_QUERY_DURATION = Histogram("neo4j_query_duration_seconds", "Neo4j query latency, including deadlock retries", ["query"],
+                                 buckets=NEO4J_LATENCY_BUCKETS)
+NEO4J_QUERY_ERRORS = Counter("neo4j_query_errors_total", "Neo4j queries that failed", ["query"])
+NEO4J_DEADLOCK_RETRIES = Counter("neo4j_deadlock_retries_total", "Neo4j queries retried after a deadlock", ["query"])
+
+EXTRACTION_JOBS = Gauge("extraction_jobs", "Extraction jobs in the job queue by status", ["status"],
+                        multiprocess_mode="livemostrecent")
+
+
+def get_query_name(query_name=None, depth=2):
+    """
+    Returns query_name, or the name of the function that called the query helper `depth` frames up,
+    which names inline queries without adding an unbounded label such as the query text.
+    """
+    if query_name:
+        return query_name
+    try:
+        return sys._getframe(depth).f_code.co_name
+    except ValueError:
+        return "unknown"
+
+
+@contextmanager
+def time_neo4j_query(query_name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        NEO4J_QUERY_ERRORS.labels(query_name).inc()
+        raise
+    finally:
+        NEO4J_QUERY_DURATION.labels(query_name).observe(time.perf_counter() - start)
+
+
+def record_deadlock_retry(query_name: str):
+    NEO4J_DEADLOCK_RETRIES.labels(query_name).inc()
+
+
+def record_llm_request(model: str, kind: str, seconds: float, outcome: str, tokens: int = 0):
+    LLM_REQUESTS.labels(model, kind, outcome).inc()
+    LLM_REQUEST_DURATION.labels(model, kind).observe(seconds)
+    if tokens:
+        LLM_TOKENS.labels(model, kind).inc(tokens)
+
+
+def record_embeddings(model: str, chunks: int, cache_hits: int, seconds: float):
+    if chunks:
+        EMBEDDED_CHUNKS.labels(model).inc(chunks)
+        EMBEDDING_CACHE_HITS.labels(model).inc(cache_hits)
+        EMBEDDING_DURATION.labels(model).observe(seconds)
+
+
+def update_job_queue_metrics(job_counts: dict):
+    for status, count in job_counts.items():
+        EXTRACTION_JOBS.labels(status).set(count)
+
+
+def render_metrics():
+    """
+    Returns the metrics in the Prometheus text format with their content type. When the app runs in
+    several worker processes, PROMETHEUS_MULTIPROC_DIR must point to a directory shared by the workers
+    and emptied before they start, so that every worker's samples are aggregated.
+    """
+    if MULTIPROCESS_MODE:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def get_endpoint(scope) -> str:
+    """Returns the path template of the route handling the request, so path parameters do not create new series."""
+    app = scope.get("app")
+    for route in getattr(getattr(app, "router", None), "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Records the latency, status and concurrency of every HTTP request by method and route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        method = scope["method"]
+        endpoint = get_endpoint(scope)
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method, endpoint)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            HTTP_REQUEST_DURATION.labels(method, endpoint).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(method, endpoint, str(status["code"])).inc()
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import time
+
+_END_OF_STREAM = object()
+
+
+class PipelineStage:
+    """A named step of a staged pipeline. `func` is an async callable taking and returning the work item."""
+
+    def __init__(self, name, func):
+        self.name = name
+        self.func = func
+
+
+async def _iterate(source):
+    if hasattr(source, "__aiter__"):
+        async for item in source:
+            yield item
+    else:
+        for item in source:
+            yield item
+
+
+async def run_pipeline(source, stages, queue_size=1, on_discard=None):
+    """
+    Runs every item of `source` through `stages` with one worker per stage and a bounded
+    queue between consecutive stages, so item N+1 can be in stage k while item N is in stage k+1.
+
+    Items leave every stage in the order they entered it. The source is only pulled when the
+    first queue has room, so at most `queue_size` items wait in front of each stage.
+
+    Args:
+        source: sync or async iterable of work items.
+        stages: list of PipelineStage executed in order.
+        queue_size: capacity of each inter-stage queue.
+        on_discard: optional callable receiving each item waiting between stages, and the error, when the
+            pipeline stops on an error or cancellation. Items inside a stage see the error themselves.
+
+    Returns:
+        dict: total busy time in seconds per stage name.
+    """
+    queues = [asyncio.Queue(maxsize=max(1, int(queue_size))) for _ in stages]
+    stage_busy_time = {stage.name: 0.0 for stage in stages}
+    # Items waiting for room in a queue, by id, so that the item a blocked producer holds is discarded too
+    pending = {}
+
+    async def put(queue, item):
+        pending[id(item)] = item
+        await queue.put(item)
+        del pending[id(item)]
+
+    async def feed():
+        async for item in _iterate(source):
+            await put(queues[0], item)
+        await queues[0].put(_END_OF_STREAM)
+
+    async def work(index, stage):
+        inbox = queues[index]
+        outbox = queues[index + 1] if index + 1 < len(queues) else None
+        while True:
+            item = await inbox.get()
+            if item is _END_OF_STREAM:
+                if outbox is not None:
+                    await outbox.put(_END_OF_STREAM)
+                return
+            start = time.time()
+            result = await stage.func(item)
+            stage_busy_time[stage.name] += time.time() - start
+            if outbox is not None:
+                await put(outbox, result)
+
+    tasks = [asyncio.ensure_future(feed())]
+    tasks += [asyncio.ensure_future(work(index, stage)) for index, stage in enumerate(stages)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException as error:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if on_discard is not None:
+            discarded = list(pending.values())
+            for queue in queues:
+                while not queue.empty():
+                    discarded.append(queue.get_nowait())
+            for item in discarded:
+                if item is not _END_OF_STREAM:
+                    on_discard(item, error)
+        raise
+    logging.info("Pipeline stage busy time: " + ", ".join(f"{name}={busy:.2f}s" for name, busy in stage_busy_time.items()))
+    return stage_busy_time
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+
+from src.shared.database_key import get_database_key
+
+DEFAULT_MAX_TRACKED_FILES = 1000
+
+
+class ProgressBus:
+    """
+    In-process publish/subscribe of extraction progress, keyed by database and file name.
+
+    Publishers may run in worker threads; each publish merges its fields into the latest state of the
+    file and wakes the asyncio subscribers waiting on it. Only the most recently updated
+    `max_tracked_files` files are kept.
+    """
+
+    def __init__(self, max_tracked_files: int = DEFAULT_MAX_TRACKED_FILES):
+        self.max_tracked_files = max_tracked_files
+        self._lock = threading.Lock()
+        self._states = OrderedDict()
+        self._subscribers = {}
+
+    def publish(self, key, **fields):
+        with self._lock:
+            version, state = self._states.pop(key, (0, {}))
+            self._states[key] = (version + 1, {**state, **fields})
+            while len(self._states) > self.max_tracked_files:
+                self._states.popitem(last=False)
+            subscribers = list(self._subscribers.get(key, ()))
+        for loop, event in subscribers:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The subscriber's event loop is already closed
+                pass
+
+    def get(self, key):
+        """
+        Returns:
+            tuple: version and a copy of the latest published state, (0, {}) when nothing was published.
+        """
+        with self._lock:
+            version, state = self._states.get(key, (0, {}))
+            return version, dict(state)
+
+    async def wait_for_update(self, key, version: int, timeout: float):
+        """
+        Waits until the state of key is newer than version.
+
+        Returns:
+            tuple: the new version and state, or None when nothing was published within timeout seconds.
+        """
+        subscriber = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._subscribers.setdefault(key, set()).add(subscriber)
+        try:
+            current = self.get(key)
+            if current[0] > version:
+                return current
+            try:
+                await asyncio.wait_for(subscriber[1].wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return None
+            return self.get(key)
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(key)
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[key]
+
+
+_progress_bus = ProgressBus()
+
+
+def get_progress_bus() -> ProgressBus:
+    return _progress_bus
+
+
+def get_progress_key(uri, database, file_name):
+    return get_database_key(uri, database), file_name
+
+
+def publish_progress(uri, database, file_name, **fields):
+    """Publishes extraction progress fields (named as the Document node properties) for a file."""
+    try:
+        _progress_bus.publish(get_progress_key(uri, database, file_name), **fields)
+    except Exception as e:
+        logging.warning(f"Failed to publish progress for {file_name}: {e}")
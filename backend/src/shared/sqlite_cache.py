@@ -0,0 +1,120 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+class SQLiteCache:
+    """
+    Small persistent key/value cache stored in a single SQLite file.
+
+    Entries are evicted least-recently-used first once `max_entries` is exceeded, and
+    optionally expire `ttl_seconds` after they were written. Values are stored as bytes;
+    callers are responsible for serialization. Hit and miss counters are kept per instance.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100000, ttl_seconds: float = None, table: str = "cache"):
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds if ttl_seconds and ttl_seconds > 0 else None
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+            f"created_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+        self._connection.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed_at ON {table} (accessed_at)")
+
+    def _is_expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get_many(self, keys):
+        """
+        Args:
+            keys: list of cache keys.
+        Returns:
+            dict: cached value per key that was found and not expired.
+        """
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        found = {}
+        expired = []
+        now = time.time()
+        with self._lock:
+            # SQLite limits the number of bound variables per statement.
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._connection.execute(
+                    f"SELECT key, value, created_at FROM {self.table} WHERE key IN ({placeholders})", part).fetchall()
+                for key, value, created_at in rows:
+                    if self._is_expired(created_at, now):
+                        expired.append(key)
+                    else:
+                        found[key] = bytes(value)
+            if found:
+                self._connection.executemany(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?",
+                                             [(now, key) for key in found])
+            if expired:
+                self._connection.executemany(f"DELETE FROM {self.table} WHERE key = ?", [(key,) for key in expired])
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def set_many(self, items):
+        """
+        Stores (key, value) pairs and evicts the least recently used entries beyond `max_entries`.
+        """
+        now = time.time()
+        rows = [(key, sqlite3.Binary(value), now, now) for key, value in items]
+        if not rows:
+            return
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                self._connection.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)", rows)
+                count = self._connection.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+                if count > self.max_entries:
+                    self._connection.execute(
+                        f"DELETE FROM {self.table} WHERE key IN "
+                        f"(SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT ?)", (count - self.max_entries,))
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def set(self, key, value):
+        self.set_many([(key, value)])
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / total, 4) if total else 0.0}
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute(f"DELETE FROM {self.table}")
+            self.hits = 0
+            self.misses = 0
+
+    def close(self):
+        with self._lock:
+            try:
+                self._connection.close()
+            except sqlite3.Error as e:
+                logging.warning(f"Failed to close cache {self.path}: {e}")
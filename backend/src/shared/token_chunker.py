@@ -0,0 +1,53 @@
+import numpy as np
+import tiktoken
+
+# Same default encoding as langchain's TokenTextSplitter
+DEFAULT_ENCODING_NAME = "gpt2"
+
+
+class TokenArrayChunker:
+    """
+    Splits text into overlapping token windows like TokenTextSplitter, but encodes each text
+    once into a NumPy token array, computes every window by index arithmetic and decodes only
+    the windows that are returned.
+
+    Windows are `chunk_size` tokens long and consecutive windows share `chunk_overlap` tokens;
+    the last window ends at the last token.
+    """
+
+    def __init__(self, chunk_size: int, chunk_overlap: int, encoding_name: str = DEFAULT_ENCODING_NAME, encoding=None):
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"Got a larger chunk overlap ({chunk_overlap}) than chunk size ({chunk_size}), should be smaller.")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.encoding = encoding or tiktoken.get_encoding(encoding_name)
+
+    def encode(self, text: str) -> np.ndarray:
+        return np.asarray(self.encoding.encode_ordinary(text), dtype=np.uint32)
+
+    def window_bounds(self, token_count: int):
+        """
+        Returns:
+            tuple: arrays of start and end token indices of every window for a text of token_count tokens.
+        """
+        if token_count == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        step = self.chunk_size - self.chunk_overlap
+        window_count = 1 if token_count <= self.chunk_size else 1 + -(-(token_count - self.chunk_size) // step)
+        starts = np.arange(window_count, dtype=np.int64) * step
+        ends = np.minimum(starts + self.chunk_size, token_count)
+        return starts, ends
+
+    def split_text(self, text: str, max_chunks: int = None) -> list:
+        """
+        Args:
+            text: text to split.
+            max_chunks: when set, only the first max_chunks windows are decoded.
+        Returns:
+            list: decoded text of each window.
+        """
+        tokens = self.encode(text)
+        starts, ends = self.window_bounds(len(tokens))
+        if max_chunks is not None:
+            starts, ends = starts[:max_chunks], ends[:max_chunks]
+        return [self.encoding.decode(tokens[start:end].tolist()) for start, end in zip(starts, ends)]
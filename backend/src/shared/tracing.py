@@ -0,0 +1,300 @@
+import contextvars
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+
+DEFAULT_SERVICE_NAME = "llm-graph-builder"
+DEFAULT_EXPORT_BATCH_SIZE = 512
+DEFAULT_EXPORT_INTERVAL = 5.0
+SCOPE_NAME = "llm-graph-builder"
+
+STATUS_CODE_OK = 1
+STATUS_CODE_ERROR = 2
+SPAN_KIND_INTERNAL = 1
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict):
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+class Span:
+    """
+    One timed operation of a trace. Spans are created by a Tracer and exported when they end;
+    ending a span twice has no effect.
+    """
+
+    def __init__(self, tracer, name: str, trace_id: str, parent_span_id: str = None, attributes: dict = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.attributes = dict(attributes or {})
+        self.start_time_ns = time.time_ns()
+        self.end_time_ns = None
+        self.status_code = STATUS_CODE_OK
+        self.status_message = ""
+
+    @property
+    def is_recording(self) -> bool:
+        return self.end_time_ns is None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def record_error(self, error: BaseException):
+        self.status_code = STATUS_CODE_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def end(self, error: BaseException = None):
+        if self.end_time_ns is not None:
+            return
+        if error is not None:
+            self.record_error(error)
+        self.end_time_ns = time.time_ns()
+        self.tracer._on_end(self)
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start_time_ns),
+            "endTimeUnixNano": str(self.end_time_ns or time.time_ns()),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": self.status_code, "message": self.status_message},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+class _NoopSpan:
+    """Span returned while tracing is disabled; every operation is a no-op."""
+
+    name = None
+    is_recording = False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, **attributes):
+        pass
+
+    def record_error(self, error):
+        pass
+
+    def end(self, error=None):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class FileSpanExporter:
+    """Appends each export as one OTLP/JSON `ExportTraceServiceRequest` per line to a file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, request: dict):
+        line = json.dumps(request, separators=(",", ":"))
+        with self._lock, open(self.path, "a", encoding="utf-8") as trace_file:
+            trace_file.write(line + "\n")
+
+
+class OtlpHttpSpanExporter:
+    """Posts each export as OTLP/JSON to the `/v1/traces` endpoint of an OpenTelemetry collector."""
+
+    def __init__(self, endpoint: str, timeout: float = 10.0):
+        endpoint = endpoint.rstrip("/")
+        self.endpoint = endpoint if endpoint.endswith("/v1/traces") else endpoint + "/v1/traces"
+        self.timeout = timeout
+
+    def export(self, request: dict):
+        body = json.dumps(request, separators=(",", ":")).encode("utf-8")
+        http_request = urllib.request.Request(self.endpoint, data=body, method="POST",
+                                              headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(http_request, timeout=self.timeout) as response:
+            response.read()
+
+
+class Tracer:
+    """
+    Creates spans and exports the ended ones in the background with OpenTelemetry's OTLP/JSON encoding,
+    so they can be loaded by any OTLP collector or read from a file.
+
+    The current span is kept in a context variable, so spans opened with `span` nest across awaits,
+    asyncio tasks and `asyncio.to_thread`. Spans that outlive a single block, such as one pipeline batch,
+    are created with `start_span` and passed explicitly as `parent`.
+    """
+
+    def __init__(self, exporters=None, service_name: str = DEFAULT_SERVICE_NAME, enabled: bool = True,
+                 export_batch_size: int = DEFAULT_EXPORT_BATCH_SIZE, export_interval: float = DEFAULT_EXPORT_INTERVAL):
+        self.exporters = list(exporters or [])
+        self.service_name = service_name
+        self.enabled = enabled and bool(self.exporters)
+        self.export_batch_size = max(1, int(export_batch_size))
+        self.export_interval = export_interval
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def start_span(self, name: str, attributes: dict = None, parent=None):
+        """Starts a span without making it current; the parent defaults to the current span."""
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = parent if parent is not None else _current_span.get()
+        if isinstance(parent, Span):
+            return Span(self, name, parent.trace_id, parent.span_id, attributes)
+        return Span(self, name, secrets.token_hex(16), None, attributes)
+
+    @contextmanager
+    def span(self, name: str, attributes: dict = None, parent=None):
+        """Runs the block in a new current span, ended with an error status if the block raises."""
+        span = self.start_span(name, attributes, parent)
+        if span is NOOP_SPAN:
+            yield span
+            return
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def _on_end(self, span: Span):
+        self._queue.put(span)
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._export_loop, name="span-exporter", daemon=True)
+                    self._worker.start()
+
+    def _export_loop(self):
+        while True:
+            item = self._queue.get()
+            items = [item]
+            deadline = time.monotonic() + self.export_interval
+            # A None item is a flush request: the batch is exported without waiting for the interval
+            while item is not None and len(items) < self.export_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                items.append(item)
+            self._export([span for span in items if span is not None])
+            for _ in items:
+                self._queue.task_done()
+
+    def _export(self, spans):
+        if not spans:
+            return
+        request = self.to_otlp(spans)
+        for exporter in self.exporters:
+            try:
+                exporter.export(request)
+            except Exception as e:
+                logging.warning(f"Failed to export {len(spans)} spans with {type(exporter).__name__}: {e}")
+
+    def to_otlp(self, spans) -> dict:
+        return {"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+            "scopeSpans": [{"scope": {"name": SCOPE_NAME}, "spans": [span.to_otlp() for span in spans]}],
+        }]}
+
+    def flush(self):
+        """Blocks until every span ended so far has been exported."""
+        if self._worker is not None:
+            self._queue.put(None)
+            self._queue.join()
+
+
+def create_tracer() -> Tracer:
+    """
+    Builds the tracer from TRACING_ENABLED, TRACING_FILE_PATH, TRACING_OTLP_ENDPOINT and TRACING_SERVICE_NAME.
+    Tracing stays disabled unless it is enabled and at least one of the file path or endpoint is set.
+    """
+    enabled = os.environ.get("TRACING_ENABLED", "False").lower() in ("true", "1", "yes")
+    exporters = []
+    if enabled:
+        file_path = os.environ.get("TRACING_FILE_PATH")
+        endpoint = os.environ.get("TRACING_OTLP_ENDPOINT")
+        if file_path:
+            exporters.append(FileSpanExporter(file_path))
+        if endpoint:
+            exporters.append(OtlpHttpSpanExporter(endpoint))
+        if not exporters:
+            logging.warning("TRACING_ENABLED is set without TRACING_FILE_PATH or TRACING_OTLP_ENDPOINT, spans are not exported")
+    return Tracer(exporters, service_name=os.environ.get("TRACING_SERVICE_NAME", DEFAULT_SERVICE_NAME), enabled=enabled)
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = create_tracer()
+    return _tracer
+
+
+def start_span(name: str, attributes: dict = None, parent=None):
+    return get_tracer().start_span(name, attributes, parent)
+
+
+def trace_span(name: str, attributes: dict = None, parent=None):
+    return get_tracer().span(name, attributes, parent)
+
+
+def current_span():
+    """Returns the current span, or a no-op span outside of any span."""
+    return _current_span.get() or NOOP_SPAN
+
+
+def activate_span(span):
+    """Makes span the current span until deactivate_span is called with the returned token."""
+    return _current_span.set(span if isinstance(span, Span) else None)
+
+
+def deactivate_span(token):
+    _current_span.reset(token)
+
+
+def flush_tracing():
+    if _tracer is not None:
+        _tracer.flush()
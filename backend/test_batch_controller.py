@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Tests for the adaptive chunk batch controller
+"""
+
+from src.shared.batch_controller import AdaptiveBatchController, get_batch_controller
+
+
+def test_batch_grows_towards_target_time_by_at_most_two():
+    controller = AdaptiveBatchController(20, 5, max_batch_size=200, target_batch_seconds=30)
+    decision = controller.observe(20, {"embed": 1.0, "extract": 5.0, "save": 2.0})
+    # 20 chunks in 5s would allow 120 chunks in 30s, but growth is limited to 2x
+    assert controller.batch_size == 40
+    assert decision["slowest_stage"] == "extract"
+
+
+def test_batch_shrinks_when_slow_and_stays_in_bounds():
+    controller = AdaptiveBatchController(20, 5, min_batch_size=5, target_batch_seconds=30)
+    controller.observe(20, {"save": 100.0})
+    assert controller.batch_size == 10
+    controller.observe(10, {"save": 100.0})
+    controller.observe(5, {"save": 100.0})
+    assert controller.batch_size == 5
+
+
+def test_errors_halve_batch_and_leave_combining_unchanged():
+    controller = AdaptiveBatchController(40, 4, target_batch_seconds=30)
+    decision = controller.observe(40, {"extract": 30.0}, llm_requests=10, llm_retries=5)
+    assert (controller.batch_size, controller.chunks_to_combine) == (20, 4)
+    assert "error rate" in decision["reason"]
+    controller.observe(20, {"extract": 15.0}, llm_requests=5, llm_retries=0)
+    assert (controller.batch_size, controller.chunks_to_combine) == (40, 4)
+
+
+def test_batch_size_is_a_multiple_of_chunks_to_combine():
+    # Combined requests then cover the same chunks whatever the batch sizes, so retries hit the extraction cache
+    controller = AdaptiveBatchController(20, 3, min_batch_size=2, max_batch_size=100, target_batch_seconds=30)
+    assert controller.batch_size == 18
+    controller.observe(18, {"save": 20.0})
+    assert controller.batch_size == 27
+    controller.observe(27, {"save": 1000.0})
+    assert controller.batch_size == 12
+    controller.observe(12, {"save": 1000.0}, llm_requests=2, llm_retries=2)
+    assert controller.batch_size == 6
+
+
+def test_transaction_size_caps_batch():
+    controller = AdaptiveBatchController(100, 1, max_batch_size=500, target_batch_seconds=30, max_transaction_rows=1000)
+    controller.observe(100, {"save": 10.0}, transaction_rows=4000)
+    assert controller.batch_size == 25
+
+
+def test_adaptive_batching_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("ADAPTIVE_BATCHING_ENABLED", raising=False)
+    monkeypatch.setenv("UPDATE_GRAPH_CHUNKS_PROCESSED", "20")
+    controller = get_batch_controller(3)
+    assert controller.observe(20, {"save": 1.0}) is None
+    assert controller.batch_size == 20
+    monkeypatch.setenv("ADAPTIVE_BATCHING_ENABLED", "true")
+    assert get_batch_controller(3).enabled
+
+
+def test_disabled_controller_keeps_sizes():
+    controller = AdaptiveBatchController(20, 6, enabled=False)
+    assert controller.observe(20, {"extract": 100.0}, llm_requests=1, llm_retries=1) is None
+    assert (controller.batch_size, controller.chunks_to_combine) == (20, 6)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-process cancellation of running extractions
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from src.shared.cancellation import CancellationRegistry, CancellationToken, ExtractionCancelled
+
+
+def test_registry_signals_only_the_registered_token():
+    registry = CancellationRegistry()
+    token = registry.register(("db", "a.pdf"))
+    assert registry.cancel(("db", "b.pdf")) is False
+    assert registry.cancel(("db", "a.pdf")) is True
+    assert token.is_cancelled
+    with pytest.raises(ExtractionCancelled):
+        token.raise_if_cancelled()
+
+    registry.unregister(("db", "a.pdf"), token)
+    assert registry.cancel(("db", "a.pdf")) is False
+
+
+def test_newer_registration_is_not_unregistered_by_older_token():
+    registry = CancellationRegistry()
+    old = registry.register(("db", "a.pdf"))
+    new = registry.register(("db", "a.pdf"))
+    registry.unregister(("db", "a.pdf"), old)
+    assert registry.cancel(("db", "a.pdf")) is True
+    assert new.is_cancelled and not old.is_cancelled
+
+
+def test_cancel_from_another_thread_cancels_registered_task():
+    token = CancellationToken()
+
+    async def run():
+        task = asyncio.ensure_future(asyncio.sleep(10))
+        token.cancel_task_on_signal(task)
+        threading.Thread(target=token.cancel).start()
+        try:
+            await asyncio.wait_for(task, timeout=2)
+        except asyncio.CancelledError:
+            return "cancelled"
+        return "finished"
+
+    assert asyncio.run(run()) == "cancelled"
+
+
+def test_task_registered_after_cancel_is_cancelled_immediately():
+    token = CancellationToken()
+    token.cancel()
+
+    async def run():
+        task = asyncio.ensure_future(asyncio.sleep(10))
+        token.cancel_task_on_signal(task)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return task.cancelled()
+
+    assert asyncio.run(run())
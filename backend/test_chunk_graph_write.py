@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for the batched UNWIND writes of Chunk nodes, their relationships and embeddings
+"""
+
+import pytest
+
+pytest.importorskip("langchain_neo4j")
+
+from langchain.docstore.document import Document
+
+import src.shared.common_fn as common_fn
+
+
+class FakeEmbeddings:
+    def embed_documents(self, texts):
+        return [[float(len(text)), 0.5] for text in texts]
+
+
+@pytest.fixture(scope="module")
+def make_relationships():
+    # make_relationships loads the embedding model on import; the embedding test installs its own
+    load_embedding_model = common_fn.load_embedding_model
+    common_fn.load_embedding_model = lambda name: (None, 384)
+    try:
+        import src.make_relationships as module
+    finally:
+        common_fn.load_embedding_model = load_embedding_model
+    return module
+
+
+@pytest.fixture
+def queries(make_relationships, monkeypatch):
+    queries = []
+    monkeypatch.setattr(make_relationships, "execute_graph_query", lambda graph, query, params: queries.append((query, params)))
+    return queries
+
+
+def _chunks(count):
+    return [Document(page_content=f"chunk {index}", metadata={}) for index in range(count)]
+
+
+def test_rows_are_written_in_batches_of_chunk_write_batch_size(make_relationships, queries, monkeypatch):
+    monkeypatch.setenv("CHUNK_WRITE_BATCH_SIZE", "2")
+    rows = [{"id": f"c{index}"} for index in range(5)]
+    stats = make_relationships.write_chunk_graph(None, "a.pdf", rows)
+    assert [params["rows"] for _, params in queries] == [rows[0:2], rows[2:4], rows[4:5]]
+    assert all(params["fileName"] == "a.pdf" for _, params in queries)
+    assert (stats["rows"], stats["queries"]) == (5, 3)
+    assert len({query for query, _ in queries}) == 1
+    assert "MERGE (d)-[:FIRST_CHUNK]->(c)" in queries[0][0] and "MERGE (pc)-[:NEXT_CHUNK]->(c)" in queries[0][0]
+
+
+def test_new_chunks_get_one_first_chunk_row_and_next_chunk_pairs(make_relationships, queries, monkeypatch):
+    monkeypatch.setenv("CHUNK_WRITE_BATCH_SIZE", "2")
+    chunk_list = make_relationships.create_relation_between_chunks(None, "a.pdf", _chunks(3))
+    rows = [row for _, params in queries for row in params["rows"]]
+    ids = [chunk["chunk_id"] for chunk in chunk_list]
+    assert len(queries) == 2
+    assert [row["id"] for row in rows] == ids
+    assert [row["first"] for row in rows] == [True, False, False]
+    assert [(row["previous_id"], row["id"]) for row in rows[1:]] == list(zip(ids, ids[1:]))
+    assert all("embedding" not in row for row in rows)
+    assert [row["properties"]["text"] for row in rows] == ["chunk 0", "chunk 1", "chunk 2"]
+
+
+def test_embedding_rows_only_set_the_embedding(make_relationships, queries, monkeypatch):
+    monkeypatch.setenv("CHUNK_WRITE_BATCH_SIZE", "2")
+    monkeypatch.setenv("IS_EMBEDDING", "TRUE")
+    monkeypatch.setenv("EMBEDDING_CACHE_ENABLED", "False")
+    monkeypatch.setattr(make_relationships, "EMBEDDING_FUNCTION", FakeEmbeddings())
+    chunk_list = [{"chunk_id": f"c{index}", "chunk_doc": chunk} for index, chunk in enumerate(_chunks(3))]
+    stats = make_relationships.create_chunk_embeddings(None, chunk_list, "a.pdf")
+    rows = [row for _, params in queries for row in params["rows"]]
+    assert rows == [{"id": "c0", "embedding": [7.0, 0.5]}, {"id": "c1", "embedding": [7.0, 0.5]}, {"id": "c2", "embedding": [7.0, 0.5]}]
+    assert stats["chunks"] == 3
+    assert len(queries) == 2
+    # Chunks are already written, so the embedding write only matches them and touches no relationship
+    query = queries[0][0]
+    assert "MATCH (c:Chunk {id: row.id})" in query and "SET c.embedding = row.embedding" in query
+    assert "MERGE" not in query and "PART_OF" not in query and "Document" not in query
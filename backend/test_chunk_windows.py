@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming chunking of new files: page grouping, chunk splitting and chunk windows
+"""
+
+import hashlib
+from functools import partial
+
+import pytest
+
+pytest.importorskip("langchain_neo4j")
+pytest.importorskip("chardet")
+pytest.importorskip("numpy")
+pytest.importorskip("tiktoken")
+
+from langchain.docstore.document import Document
+
+import src.shared.common_fn as common_fn
+from src.shared.token_chunker import TokenArrayChunker
+
+
+class CharEncoding:
+    """One token per character, so chunk boundaries are easy to reason about."""
+
+    def encode_ordinary(self, text):
+        return [ord(char) for char in text]
+
+    def decode(self, tokens):
+        return "".join(chr(token) for token in tokens)
+
+
+def _counted(items, consumed):
+    for item in items:
+        consumed.append(item)
+        yield item
+
+
+@pytest.fixture(scope="module")
+def make_relationships():
+    # make_relationships loads the embedding model on import; these tests never embed
+    load_embedding_model = common_fn.load_embedding_model
+    common_fn.load_embedding_model = lambda name: (None, 384)
+    try:
+        import src.make_relationships as module
+    finally:
+        common_fn.load_embedding_model = load_embedding_model
+    return module
+
+
+@pytest.fixture
+def written_rows(make_relationships, monkeypatch):
+    writes = []
+    monkeypatch.setattr(make_relationships, "write_chunk_graph", lambda graph, file_name, rows: writes.append(list(rows)))
+    return writes
+
+
+@pytest.fixture
+def create_chunks(monkeypatch):
+    import src.create_chunks as module
+    monkeypatch.setattr(module, "TokenArrayChunker", partial(TokenArrayChunker, encoding=CharEncoding()))
+    return module
+
+
+@pytest.fixture
+def main(make_relationships):
+    return pytest.importorskip("src.main")
+
+
+def test_chunk_windows_continue_positions_offsets_and_links(make_relationships, written_rows):
+    texts = ["aa", "bbb", "c", "dddd", "ee"]
+    consumed = []
+    chunks = _counted([Document(page_content=text, metadata={"page_number": index + 1}) for index, text in enumerate(texts)], consumed)
+    window_size = [2]
+    windows = make_relationships.iter_chunk_windows(None, "a.pdf", chunks, lambda: window_size[0])
+
+    first = next(windows)
+    # The first window is written before the chunks after it are read
+    assert len(consumed) == 2 and len(written_rows) == 1
+    window_size[0] = 3
+    assert [len(window) for window in [first, *windows]] == [2, 3]
+
+    rows = [row for write in written_rows for row in write]
+    ids = [hashlib.sha1(text.encode()).hexdigest() for text in texts]
+    assert [row["id"] for row in rows] == ids
+    assert [row["properties"]["position"] for row in rows] == [1, 2, 3, 4, 5]
+    assert [row["properties"]["content_offset"] for row in rows] == [0, 2, 5, 6, 10]
+    assert [row["properties"]["page_number"] for row in rows] == [1, 2, 3, 4, 5]
+    assert [row["first"] for row in rows] == [True, False, False, False, False]
+    # NEXT_CHUNK continues from the last chunk of the previous window
+    assert [row["previous_id"] for row in rows] == [None, *ids[:-1]]
+
+
+def test_iter_chunks_numbers_pages_and_stops_reading_at_the_cap(create_chunks, monkeypatch):
+    monkeypatch.setenv("MAX_TOKEN_CHUNK_SIZE", "30")
+    consumed = []
+    pages = _counted([Document(page_content=f"page {index:05}", metadata={"page": index}) for index in range(10)], consumed)
+    chunks = list(create_chunks.CreateChunksofDocument(pages, None).iter_chunks(10, 2))
+    assert [chunk.page_content for chunk in chunks] == ["page 00000", "page 00001", "page 00002"]
+    assert [chunk.metadata for chunk in chunks] == [{"page_number": 1}, {"page_number": 2}, {"page_number": 3}]
+    # The page after the cap is pulled to find the cap reached, no further
+    assert len(consumed) == 4
+
+
+def test_iter_chunks_matches_split_file_into_chunks(create_chunks, monkeypatch):
+    monkeypatch.setenv("MAX_TOKEN_CHUNK_SIZE", "1000")
+    pages = [Document(page_content="x" * 25 + str(index), metadata={"source": "a.txt"}) for index in range(3)]
+    expected = create_chunks.CreateChunksofDocument(list(pages), None).split_file_into_chunks(10, 2)
+    chunks = list(create_chunks.CreateChunksofDocument(iter(pages), None).iter_chunks(10, 2))
+    assert [(chunk.page_content, chunk.metadata) for chunk in chunks] == [(chunk.page_content, chunk.metadata) for chunk in expected]
+
+
+def test_pages_are_yielded_before_the_next_page_is_read():
+    from src.document_sources.local_file import get_pages_with_page_numbers, iter_pages_with_page_numbers
+
+    metadata = {"source": "a.docx", "filename": "a.docx", "filetype": "docx"}
+    elements = [Document(page_content=text, metadata={**metadata, "category": category})
+                for text, category in (("a", "Title"), ("b", "NarrativeText"), ("", "PageBreak"), ("c", "NarrativeText"),
+                                       ("d", "NarrativeText"))]
+    consumed = []
+    pages = iter_pages_with_page_numbers(_counted(elements, consumed))
+    assert next(pages).page_content == "ab"
+    # One element past the page break is read to know whether it was the last
+    assert len(consumed) == 4
+    assert [page.page_content for page in pages] == ["cd"]
+    assert [page.page_content for page in get_pages_with_page_numbers(elements)] == ["ab", "cd"]
+
+
+def test_list_windows_read_the_window_size_for_every_window(main):
+    sizes = iter([2, 3, 10])
+    assert list(main.iter_list_windows(list(range(7)), lambda: next(sizes))) == [[0, 1], [2, 3, 4], [5, 6]]
+    assert list(main.iter_list_windows([1, 2], 0)) == [[1], [2]]
+
+
+def test_new_files_are_chunked_in_windows_as_they_are_consumed(main, create_chunks, written_rows, monkeypatch):
+    monkeypatch.setenv("MAX_TOKEN_CHUNK_SIZE", "1000")
+    pages = [Document(page_content='He said "hi"\nthere', metadata={"source": "a.txt"}), Document(page_content="bye", metadata={"source": "a.txt"})]
+    total_chunks, windows = main.get_chunk_windows(None, "a.txt", iter(pages), 100, 10, None, 1)
+    assert total_chunks == 0
+    assert written_rows == []
+    assert [[chunk["chunk_doc"].page_content for chunk in window] for window in windows] == [["He said hi there"], ["bye"]]
+    assert [row["properties"]["position"] for write in written_rows for row in write] == [1, 2]
+
+
+def test_retried_files_are_windowed_from_the_existing_chunks(main, monkeypatch):
+    existing = [{"chunk_id": f"c{index}"} for index in range(5)]
+    monkeypatch.setattr(main, "get_chunkId_chunkDoc_list", lambda *args: (5, existing))
+    total_chunks, windows = main.get_chunk_windows(None, "a.txt", [], 100, 10, "start_from_beginning", 2)
+    assert total_chunks == 5
+    assert [len(window) for window in windows] == [2, 2, 1]
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Tests for the batched embedding of community summaries
+"""
+
+import pytest
+
+pytest.importorskip("graphdatascience")
+pytest.importorskip("langchain_neo4j")
+
+from src.communities import embed_community_summaries
+
+
+class FailingEmbeddings:
+    """Fails every call that includes an empty summary."""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(len(texts))
+        if "" in texts:
+            raise ValueError("empty input")
+        return [[float(len(text))] for text in texts]
+
+
+@pytest.fixture(autouse=True)
+def no_embedding_cache(monkeypatch):
+    monkeypatch.setenv("EMBEDDING_CACHE_ENABLED", "False")
+
+
+def _rows(texts):
+    return [{"communityId": f"0-{index}", "text": text} for index, text in enumerate(texts)]
+
+
+def test_summaries_are_embedded_in_one_batch():
+    embeddings = FailingEmbeddings()
+    vectors = embed_community_summaries("openai", embeddings, 1, _rows(["a", "bb", "ccc"]), 10)
+    assert vectors == [[1.0], [2.0], [3.0]]
+    assert embeddings.calls == [3]
+
+
+def test_a_failing_summary_only_loses_its_own_embedding():
+    embeddings = FailingEmbeddings()
+    vectors = embed_community_summaries("openai", embeddings, 1, _rows(["a", "", "ccc"]), 10)
+    assert vectors == [[1.0], None, [3.0]]
+    assert embeddings.calls == [3, 1, 1, 1]
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Tests for the incremental Document node and relationship counts
+"""
+
+from types import SimpleNamespace
+
+from src.shared.document_counts import DocumentCounts
+
+
+def _graph_document(node_ids, relationships):
+    nodes = {node_id: SimpleNamespace(id=node_id, type="Person") for node_id in node_ids}
+    return SimpleNamespace(
+        nodes=list(nodes.values()),
+        relationships=[SimpleNamespace(source=nodes[source], type=rel_type, target=nodes[target])
+                       for source, rel_type, target in relationships])
+
+
+def test_chunk_windows_count_part_of_and_next_chunk():
+    counts = DocumentCounts()
+    counts.add_chunks(3, is_first_window=True)
+    counts.add_chunks(2, is_first_window=False)
+    result = counts.as_dict()
+    assert result["chunkNodeCount"] == 5
+    # 5 PART_OF and 4 NEXT_CHUNK
+    assert result["chunkRelCount"] == 9
+
+
+def test_entities_and_relationships_are_counted_once_across_batches():
+    counts = DocumentCounts()
+    counts.add_graph_documents([_graph_document(["alice", "bob"], [("alice", "KNOWS", "bob")])])
+    counts.add_graph_documents([_graph_document(["alice", "bob", "carol"], [("alice", "KNOWS", "bob"), ("bob", "KNOWS", "carol")])])
+    counts.add_chunk_relationships(5)
+    result = counts.as_dict()
+    assert result["entityNodeCount"] == 3
+    assert result["entityEntityRelCount"] == 2
+    assert result["nodeCount"] == 3
+    assert result["relationshipCount"] == 7
+
+
+def test_counts_start_from_a_recount():
+    counts = DocumentCounts({"chunkNodeCount": 10, "chunkRelCount": 19, "entityNodeCount": "4", "communityNodeCount": None})
+    counts.add_graph_documents([_graph_document(["dave"], [])])
+    result = counts.as_dict()
+    assert result["nodeCount"] == 15
+    assert result["relationshipCount"] == 19
+
+
+def test_entities_kept_from_an_earlier_run_are_not_counted_again():
+    counts = DocumentCounts({"entityNodeCount": 2, "entityEntityRelCount": 1})
+    counts.add_existing_entities(["alice", "bob"], [("alice", "KNOWS", "bob")])
+    counts.add_graph_documents([_graph_document(["alice", "bob", "carol"], [("alice", "knows", "bob"), ("bob", "knows", "carol")])])
+    result = counts.as_dict()
+    assert result["entityNodeCount"] == 3
+    assert result["entityEntityRelCount"] == 2
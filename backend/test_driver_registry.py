@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Tests for the process-wide Neo4j driver registry
+"""
+
+import threading
+import time
+
+from src.shared.driver_registry import DriverRegistry, connection_lease_scope
+
+
+class FakeDriver:
+    def __init__(self, password):
+        self.password = password
+        self.healthy = True
+        self.closed = False
+        self.checks = 0
+
+    def verify_connectivity(self):
+        self.checks += 1
+        if not self.healthy:
+            raise ConnectionError("connection lost")
+
+    def close(self):
+        self.closed = True
+
+
+def _registry(**kwargs):
+    created = []
+
+    def factory(uri, username, password, database, user_agent):
+        driver = FakeDriver(password)
+        created.append(driver)
+        return driver
+
+    return DriverRegistry(factory, **kwargs), created
+
+
+def test_drivers_are_shared_per_database():
+    registry, created = _registry()
+    first = registry.get("neo4j://a", "neo4j", "pw", "neo4j")
+    assert registry.get("neo4j://a", "neo4j", "pw", "neo4j") is first
+    other = registry.get("neo4j://a", "neo4j", "pw", "movies")
+    assert other is not first
+    assert len(created) == 2 and len(registry) == 2
+
+
+def test_password_change_replaces_driver_and_closes_the_old_one_later():
+    registry, created = _registry(replaced_close_delay=0.05)
+    first = registry.get("neo4j://a", "neo4j", "old", "neo4j")
+    second = registry.get("neo4j://a", "neo4j", "new", "neo4j")
+    assert second is not first and second.password == "new"
+    assert len(registry) == 1
+    # Requests that borrowed the old driver may still be using it
+    assert not first.closed
+    time.sleep(0.2)
+    assert first.closed and not second.closed
+
+
+def test_pending_close_of_replaced_driver_runs_on_shutdown():
+    registry, created = _registry(replaced_close_delay=60)
+    first = registry.get("neo4j://a", "neo4j", "old", "neo4j")
+    registry.get("neo4j://a", "neo4j", "new", "neo4j")
+    registry.close_all()
+    assert first.closed and created[1].closed
+
+
+def test_stale_driver_is_checked_and_replaced_when_dead():
+    registry, created = _registry(liveness_check_timeout=0, replaced_close_delay=0.05)
+    first = registry.get("neo4j://a", "neo4j", "pw", "neo4j")
+    time.sleep(0.001)
+    assert registry.get("neo4j://a", "neo4j", "pw", "neo4j") is first
+    assert first.checks == 1
+    first.healthy = False
+    time.sleep(0.001)
+    replacement = registry.get("neo4j://a", "neo4j", "pw", "neo4j")
+    assert replacement is not first and len(created) == 2
+    # Dropped from the registry at once but closed later, as other requests may still hold it
+    assert not first.closed
+    time.sleep(0.2)
+    assert first.closed and not replacement.closed
+
+
+def test_idle_drivers_are_evicted_and_all_closed_on_shutdown():
+    registry, created = _registry(idle_timeout=0, replaced_close_delay=60)
+    registry.get("neo4j://a", "neo4j", "pw", "neo4j")
+    time.sleep(0.001)
+    registry.get("neo4j://b", "neo4j", "pw", "neo4j")
+    assert len(registry) == 1
+    assert not created[0].closed
+    registry.close_all()
+    assert len(registry) == 0 and created[0].closed and created[1].closed
+
+
+def test_driver_held_past_the_idle_timeout_is_not_evicted_or_closed():
+    registry, created = _registry(idle_timeout=0.05, replaced_close_delay=0)
+    borrowed = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with connection_lease_scope():
+            registry.get("neo4j://a", "neo4j", "pw", "neo4j")
+            borrowed.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    borrowed.wait(5)
+    time.sleep(0.1)
+    assert registry.get("neo4j://a", "neo4j", "pw", "neo4j") is created[0]
+    registry.get("neo4j://b", "neo4j", "pw", "neo4j")
+    assert len(created) == 2 and not created[0].closed
+    release.set()
+    holder.join()
+    time.sleep(0.1)
+    # Once released it is idle like any other driver
+    registry.get("neo4j://b", "neo4j", "pw", "neo4j")
+    time.sleep(0.05)
+    assert created[0].closed and len(registry) == 1
+
+
+def test_dropped_driver_is_closed_when_its_last_lease_is_released():
+    registry, created = _registry(replaced_close_delay=0)
+    with connection_lease_scope():
+        first = registry.get("neo4j://a", "neo4j", "old", "neo4j")
+        registry.get("neo4j://a", "neo4j", "new", "neo4j")
+        time.sleep(0.05)
+        assert not first.closed
+    assert first.closed and not created[1].closed
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Tests for the batched embedding of chunk texts
+"""
+
+import pytest
+
+pytest.importorskip("langchain_neo4j")
+
+from src.shared.common_fn import embed_documents_in_batches, get_embedding_batch_size
+from src.shared.constants import EMBEDDING_BATCH_SIZES
+
+
+class RecordingEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(text)] for text in texts]
+
+
+def test_batch_size_defaults_per_backend(monkeypatch):
+    monkeypatch.delenv("EMBEDDING_BATCH_SIZE", raising=False)
+    assert get_embedding_batch_size("openai") == EMBEDDING_BATCH_SIZES["openai"]
+    assert get_embedding_batch_size("titan") == EMBEDDING_BATCH_SIZES["titan"]
+    # Unknown and unset models embed locally with HuggingFace
+    assert get_embedding_batch_size(None) == EMBEDDING_BATCH_SIZES["huggingface"]
+
+
+def test_batch_size_env_override(monkeypatch):
+    monkeypatch.setenv("EMBEDDING_BATCH_SIZE", "7")
+    assert get_embedding_batch_size("openai") == 7
+    monkeypatch.setenv("EMBEDDING_BATCH_SIZE", "0")
+    assert get_embedding_batch_size("openai") == 1
+
+
+def test_invalid_batch_size_falls_back_to_the_backend_default(monkeypatch):
+    monkeypatch.setenv("EMBEDDING_BATCH_SIZE", "many")
+    assert get_embedding_batch_size("vertexai") == EMBEDDING_BATCH_SIZES["vertexai"]
+
+
+def test_batches_keep_the_order_of_the_texts():
+    embeddings = RecordingEmbeddings()
+    texts = [str(index) for index in range(7)]
+    vectors = embed_documents_in_batches(embeddings, texts, 3)
+    assert embeddings.calls == [["0", "1", "2"], ["3", "4", "5"], ["6"]]
+    assert vectors == [[float(index)] for index in range(7)]
+    assert embed_documents_in_batches(embeddings, [], 3) == []
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Tests for the SQLite-backed embedding cache
+"""
+
+import time
+
+from src.shared.embedding_cache import EmbeddingCache
+from src.shared.sqlite_cache import SQLiteCache
+
+
+class FakeEmbeddings:
+    model = "fake-embedding"
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 0.5] for text in texts]
+
+
+def test_only_misses_are_embedded(tmp_path):
+    cache = EmbeddingCache(SQLiteCache(str(tmp_path / "embeddings.sqlite")))
+    embeddings = FakeEmbeddings()
+
+    vectors, hits = cache.get_or_embed("fake:384", ["a", "bb"], embeddings.embed_documents)
+    assert vectors == [[1.0, 0.5], [2.0, 0.5]]
+    assert hits == 0
+
+    vectors, hits = cache.get_or_embed("fake:384", ["bb", "ccc", "bb"], embeddings.embed_documents)
+    assert vectors == [[2.0, 0.5], [3.0, 0.5], [2.0, 0.5]]
+    assert hits == 2
+    assert embeddings.calls == [["a", "bb"], ["ccc"]]
+
+
+def test_namespaces_do_not_share_vectors(tmp_path):
+    cache = EmbeddingCache(SQLiteCache(str(tmp_path / "embeddings.sqlite")))
+    embeddings = FakeEmbeddings()
+    cache.get_or_embed("openai:1536", ["a"], embeddings.embed_documents)
+    cache.get_or_embed("huggingface:384", ["a"], embeddings.embed_documents)
+    assert len(embeddings.calls) == 2
+
+
+def test_cache_persists_across_instances(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    EmbeddingCache(SQLiteCache(path)).get_or_embed("fake:2", ["a"], FakeEmbeddings().embed_documents)
+    embeddings = FakeEmbeddings()
+    vectors, hits = EmbeddingCache(SQLiteCache(path)).get_or_embed("fake:2", ["a"], embeddings.embed_documents)
+    assert vectors == [[1.0, 0.5]] and hits == 1
+    assert embeddings.calls == []
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    time.sleep(0.01)
+    assert cache.get("a") == b"1"
+    cache.set("c", b"3")
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite"), ttl_seconds=0.01)
+    cache.set("a", b"1")
+    time.sleep(0.05)
+    assert cache.get("a") is None
+    assert len(cache) == 0
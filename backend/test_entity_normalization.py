@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Tests for entity id normalization and in-batch dedupe
+"""
+
+from types import SimpleNamespace
+
+from src.shared.entity_normalization import EntityNormalizer, canonical_entity_key
+
+
+def _node(node_id, node_type="Organization", **properties):
+    return SimpleNamespace(id=node_id, type=node_type, properties=properties)
+
+
+def _relationship(source, rel_type, target):
+    return SimpleNamespace(source=source, type=rel_type, target=target, properties={})
+
+
+def test_canonical_key_ignores_case_whitespace_punctuation_and_unicode_form():
+    assert canonical_entity_key("Apple Inc.") == canonical_entity_key(" apple  inc") == canonical_entity_key("ＡＰＰＬＥ Inc") == "apple inc"
+    assert canonical_entity_key("“GPT-3.5”") == canonical_entity_key("gpt–3.5") == "gpt-3.5"
+    assert canonical_entity_key("GPT-3.5") != canonical_entity_key("GPT-35")
+    assert canonical_entity_key("C++") != canonical_entity_key("C#")
+
+
+def test_duplicates_collapse_and_relationship_endpoints_are_rewritten():
+    apple, apple_lower, tim = _node("Apple Inc.", founded=1976), _node("apple inc", ceo="Tim Cook"), _node("Tim  Cook", "Person")
+    document = SimpleNamespace(nodes=[apple, apple_lower, tim], relationships=[
+        _relationship(_node("Tim Cook", "Person"), "works at", _node("Apple Inc")),
+        _relationship(_node("tim cook", "Person"), "WORKS_AT", apple_lower),
+        _relationship(apple, "SAME_AS", apple_lower),
+    ])
+    stats = EntityNormalizer().normalize([document])
+    assert [(node.id, node.type) for node in document.nodes] == [("Apple Inc.", "Organization"), ("Tim Cook", "Person")]
+    assert document.nodes[0].properties == {"founded": 1976, "ceo": "Tim Cook"}
+    assert len(document.relationships) == 1
+    relationship = document.relationships[0]
+    assert (relationship.source.id, relationship.target.id) == ("Tim Cook", "Apple Inc.")
+    assert stats == {"nodes_before": 3, "nodes_after": 2, "relationships_before": 3, "relationships_after": 1, "ids_rewritten": 2}
+
+
+def test_first_id_of_a_key_is_kept_across_batches():
+    normalizer = EntityNormalizer()
+    normalizer.normalize([SimpleNamespace(nodes=[_node("Neo4j, Inc.")], relationships=[])])
+    later_batch = SimpleNamespace(nodes=[_node("neo4j inc")], relationships=[])
+    normalizer.normalize([later_batch])
+    assert later_batch.nodes[0].id == "Neo4j, Inc."
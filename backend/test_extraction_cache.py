@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Tests for the LLM extraction result cache keys and serialization
+"""
+
+import json
+import zlib
+from types import SimpleNamespace
+
+from src.shared.extraction_cache import extraction_cache_key, serialize_graph_document
+
+
+def _key(**overrides):
+    args = dict(model="openai_gpt_4o:gpt-4o", allowed_nodes=["Person"], allowed_relationships=[("Person", "KNOWS", "Person")],
+                base_instructions="base", additional_instructions="", content="Alice knows Bob.")
+    args.update(overrides)
+    return extraction_cache_key(**args)
+
+
+def test_key_is_stable():
+    assert _key() == _key()
+
+
+def test_key_changes_with_every_input():
+    base = _key()
+    assert _key(model="openai_gpt_4o_mini:gpt-4o-mini") != base
+    assert _key(allowed_nodes=["Person", "City"]) != base
+    assert _key(allowed_relationships=[]) != base
+    assert _key(base_instructions="changed") != base
+    assert _key(additional_instructions="only people") != base
+    assert _key(content="Alice knows Carol.") != base
+
+
+def test_graph_document_is_serialized_compactly():
+    alice = SimpleNamespace(id="Alice", type="Person", properties={})
+    bob = SimpleNamespace(id="Bob", type="Person", properties={"description": "friend"})
+    relationship = SimpleNamespace(source=alice, target=bob, type="KNOWS", properties={})
+    document = SimpleNamespace(nodes=[alice, bob], relationships=[relationship], source=None)
+
+    data = json.loads(zlib.decompress(serialize_graph_document(document)))
+    assert data == {
+        "n": [["Alice", "Person", {}], ["Bob", "Person", {"description": "friend"}]],
+        "r": [["Alice", "Person", "Bob", "Person", "KNOWS", {}]],
+    }
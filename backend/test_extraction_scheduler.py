@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-model LLM extraction scheduler
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from src.shared.extraction_scheduler import (ConcurrencyLimit, ExtractionScheduler, TokenBucket, get_extraction_scheduler,
+                                             is_retryable_error)
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def test_retryable_errors():
+    assert is_retryable_error(RateLimitError("slow down"))
+    assert is_retryable_error(Exception("Error code: 503 - service unavailable"))
+    assert is_retryable_error(asyncio.TimeoutError())
+    assert not is_retryable_error(ValueError("invalid schema"))
+
+
+def test_only_failing_request_is_retried():
+    calls = {"a": 0, "b": 0}
+
+    def factory(name, failures):
+        async def request():
+            calls[name] += 1
+            if calls[name] <= failures:
+                raise RateLimitError("429 Too Many Requests")
+            return name
+        return request
+
+    async def run():
+        scheduler = ExtractionScheduler("test", max_retries=3, base_delay=0.001, max_delay=0.01)
+        results = await scheduler.run_all([(factory("a", 2), 1, "a"), (factory("b", 0), 1, "b")])
+        return results, scheduler.requests, scheduler.retries
+
+    assert asyncio.run(run()) == (["a", "b"], 2, 2)
+    assert calls == {"a": 3, "b": 1}
+
+
+def test_non_retryable_error_is_raised_without_retry():
+    calls = []
+
+    async def request():
+        calls.append(1)
+        raise ValueError("bad request")
+
+    async def run():
+        scheduler = ExtractionScheduler("test", max_retries=3, base_delay=0.001)
+        await scheduler.run(request)
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+    assert len(calls) == 1
+
+
+def test_concurrency_is_capped():
+    in_flight = {"now": 0, "max": 0}
+
+    async def request():
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.01)
+        in_flight["now"] -= 1
+
+    async def run():
+        scheduler = ExtractionScheduler("test", max_concurrency=2)
+        await scheduler.run_all([(request, 1, str(i)) for i in range(6)])
+
+    asyncio.run(run())
+    assert in_flight["max"] == 2
+
+
+def test_token_bucket_waits_for_refill():
+    async def run():
+        bucket = TokenBucket(tokens_per_minute=6000)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await bucket.acquire(6000)
+        await bucket.acquire(10)
+        return loop.time() - start
+
+    # 10 tokens at 100 tokens/second need about 0.1s
+    assert asyncio.run(run()) >= 0.08
+
+
+def test_concurrency_cap_holds_across_event_loops():
+    limit = ConcurrencyLimit(2)
+    in_flight = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    async def request():
+        with lock:
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.02)
+        with lock:
+            in_flight["now"] -= 1
+
+    def run_loop():
+        scheduler = ExtractionScheduler("test", concurrency_limit=limit)
+        asyncio.run(scheduler.run_all([(request, 1, str(i)) for i in range(4)]))
+
+    threads = [threading.Thread(target=run_loop) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert in_flight["max"] == 2
+    assert limit.in_use == 0
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def run():
+        limit = ConcurrencyLimit(1)
+        await limit.__aenter__()
+        waiter = asyncio.ensure_future(limit.__aenter__())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        await limit.__aexit__(None, None, None)
+        return limit.in_use
+
+    assert asyncio.run(run()) == 0
+
+
+def test_schedulers_of_each_event_loop_share_the_model_limits(monkeypatch):
+    monkeypatch.setenv("LLM_MAX_CONCURRENT_REQUESTS_shared_limits_model", "3")
+    monkeypatch.setenv("LLM_TOKENS_PER_MINUTE_shared_limits_model", "600")
+
+    async def schedulers():
+        return get_extraction_scheduler("shared_limits_model"), get_extraction_scheduler("Shared_Limits_Model ")
+
+    first, same_loop = asyncio.run(schedulers())
+    other, _ = asyncio.run(schedulers())
+    assert first is same_loop
+    assert other is not first
+    assert other.concurrency_limit is first.concurrency_limit and first.max_concurrency == 3
+    assert other.token_bucket is first.token_bucket and first.token_bucket.capacity == 600
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for the graph query stream and the shaping of graph query records
+"""
+
+import pytest
+
+pytest.importorskip("neo4j")
+
+from src import graph_query
+
+
+class FakeSession:
+    def __init__(self, records):
+        self.records = records
+        self.params = None
+        self.fetched = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def run(self, query, **params):
+        self.query = query
+        self.params = params
+        for record in self.records:
+            self.fetched += 1
+            yield record
+
+
+def _records(node_count, relationship_count):
+    nodes = [{"element_id": f"4:node:{index}", "labels": ["__Entity__", "Person"], "properties": {"id": f"Person {index}"}}
+             for index in range(node_count)]
+    relationships = [{"element_id": f"5:rel:{index}", "type": "KNOWS", "start_node_element_id": f"4:node:{index}",
+                      "end_node_element_id": f"4:node:{(index + 1) % node_count}"}
+                     for index in range(relationship_count)]
+    return [{"node": node, "rel": None} for node in nodes] + [{"node": None, "rel": rel} for rel in relationships]
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = FakeSession(_records(5, 3))
+    monkeypatch.setattr(graph_query, "get_graphDB_driver", lambda *args: type("Driver", (), {"session": lambda self, database: session})())
+    return session
+
+
+def test_pages_are_streamed_as_records_are_fetched(session):
+    pages = graph_query.stream_graph_results("uri", "user", "password", "neo4j", '["a.pdf"]', page_size=3)
+    first = next(pages)
+    # The first page is sent before the rest of the records are fetched
+    assert session.fetched == 3
+    pages = [first, *pages]
+    assert [len(page["nodes"]) + len(page["relationships"]) for page in pages[:-1]] == [3, 3, 2]
+    assert pages[0]["nodes"][0] == {"element_id": "4:node:0", "labels": ["Person"], "properties": {"id": "Person 0"}}
+    assert pages[2]["relationships"][-1] == {"element_id": "5:rel:2", "type": "KNOWS",
+                                             "start_node_element_id": "4:node:2", "end_node_element_id": "4:node:3"}
+    assert pages[-1] == {"nodes": [], "relationships": [], "done": True}
+    assert session.query.endswith("RETURN node, rel")
+
+
+def test_node_properties_whitelist_is_sent_as_query_parameter(session, monkeypatch):
+    list(graph_query.stream_graph_results("uri", "user", "password", "neo4j", '["a.pdf"]'))
+    assert session.params["node_properties"] == []
+    assert session.params["excluded_properties"] == ["embedding", "summary", "text"]
+    monkeypatch.setenv("GRAPH_NODE_PROPERTIES", "id, fileName,")
+    list(graph_query.stream_graph_results("uri", "user", "password", "neo4j", '["a.pdf"]'))
+    assert session.params["node_properties"] == ["id", "fileName"]
+
+
+def test_empty_document_names_end_the_stream_immediately():
+    assert list(graph_query.stream_graph_results("uri", "user", "password", "neo4j", "null")) == [
+        {"nodes": [], "relationships": [], "done": True}]
+
+
+def test_a_node_that_cannot_be_shaped_is_left_out():
+    records = [{"nodes": [{"element_id": "4:node:0", "labels": ["__Entity__"], "properties": {}},
+                          {"element_id": "4:node:1", "labels": None, "properties": {}}],
+                "rels": [{"element_id": "5:rel:0", "type": "KNOWS"}]}]
+    nodes, relationships = graph_query.extract_graph_elements(records)
+    assert nodes == [{"element_id": "4:node:0", "labels": ["*"], "properties": {}}]
+    assert relationships == [{"element_id": "5:rel:0", "type": "KNOWS"}]
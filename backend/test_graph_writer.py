@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Tests for the label-grouped graph document write plan
+"""
+
+from types import SimpleNamespace
+
+from src.shared.graph_writer import plan_chunk_entity_links, plan_graph_document_writes
+
+
+def _node(node_id, node_type, **properties):
+    return SimpleNamespace(id=node_id, type=node_type, properties=properties)
+
+
+def _graph_document(nodes, relationships):
+    return SimpleNamespace(nodes=nodes, relationships=[SimpleNamespace(source=source, type=rel_type, target=target, properties={})
+                                                       for source, rel_type, target in relationships])
+
+
+def test_nodes_and_relationships_are_grouped_deduplicated_and_sorted():
+    alice, bob, acme = _node("Alice", "Person", age=30), _node("Bob", "Person"), _node("Acme", "Organization")
+    documents = [
+        _graph_document([bob, alice, acme], [(bob, "works at", acme), (alice, "WORKS_AT", acme)]),
+        _graph_document([_node("Alice", "Person", city="Paris")], [(alice, "WORKS_AT", acme)]),
+    ]
+    writes = plan_graph_document_writes(documents, batch_size=100)
+    assert [write["kind"] for write in writes] == ["nodes", "nodes", "relationships"]
+    assert "SET n:`Organization`" in writes[0]["query"]
+    assert writes[1]["rows"] == [{"id": "Alice", "properties": {"age": 30, "city": "Paris"}},
+                                 {"id": "Bob", "properties": {}}]
+    assert "[rel:`WORKS_AT`]" in writes[2]["query"]
+    assert "source:`Person`" in writes[2]["query"] and "target:`Organization`" in writes[2]["query"]
+    assert [(row["source"], row["target"]) for row in writes[2]["rows"]] == [("Alice", "Acme"), ("Bob", "Acme")]
+
+
+def test_groups_are_split_into_bounded_batches():
+    nodes = [_node(f"Entity {index:02}", "Concept") for index in range(5)]
+    writes = plan_graph_document_writes([_graph_document(nodes, [])], batch_size=2)
+    assert [len(write["rows"]) for write in writes] == [2, 2, 1]
+    assert [row["id"] for write in writes for row in write["rows"]] == [node.id for node in nodes]
+
+
+def test_backticks_are_removed_from_names():
+    writes = plan_graph_document_writes([_graph_document([_node("x", "Bad`Label")], [])], batch_size=10)
+    assert "SET n:`BadLabel`" in writes[0]["query"]
+
+
+def test_chunk_links_use_written_element_ids_and_fall_back_to_entity_ids():
+    alice, acme = _node("Alice", "Person"), _node("Acme", "Organization")
+    chunks = [{"chunk_id": "c2", "graph_doc": _graph_document([alice, acme], [])},
+              {"chunk_id": "c1", "graph_doc": _graph_document([alice], [])}]
+    writes = plan_chunk_entity_links(chunks, {"Alice": "4:abc:1"}, batch_size=10)
+    assert len(writes) == 2
+    assert "MERGE (n:`__Entity__` {id: row.node_id}) ON CREATE SET n:`Organization`" in writes[0]["query"]
+    assert writes[0]["rows"] == [{"chunk_id": "c2", "node_id": "Acme"}]
+    assert "MATCH (n:`Person`) WHERE elementId(n) = row.element_id" in writes[1]["query"]
+    assert writes[1]["rows"] == [{"chunk_id": "c1", "element_id": "4:abc:1"}, {"chunk_id": "c2", "element_id": "4:abc:1"}]
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for the SQLite-backed extraction job queue
+"""
+
+import asyncio
+import json
+import sqlite3
+
+from src.job_queue import COMPLETED, FAILED, QUEUED, RESUBMIT_MESSAGE, RUNNING, JobQueue
+
+
+def _payload(file_name, model="openai_gpt_4o"):
+    return {"file_name": file_name, "model": model, "password": "secret", "uri": "neo4j://localhost"}
+
+
+def test_jobs_are_claimed_in_order_with_secrets_kept_off_disk(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    queue = JobQueue(path)
+    first = queue.enqueue(_payload("a.pdf"), "openai_gpt_4o", "db1", "a.pdf")
+    second = queue.enqueue(_payload("b.pdf"), "openai_gpt_4o", "db2", "b.pdf")
+    assert queue.get_queue_position(first) == 1
+    assert queue.get_queue_position(second) == 2
+
+    job = queue.claim_next()
+    assert job["job_id"] == first
+    assert job["payload"]["password"] == "secret"
+    assert queue.get_queue_position(second) == 1
+
+    stored = sqlite3.connect(path).execute("SELECT payload FROM jobs").fetchall()
+    assert all("password" not in json.loads(payload) for (payload,) in stored)
+
+
+def test_per_model_and_per_database_limits(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), max_jobs_per_model=1, max_jobs_per_database=1)
+    queue.enqueue(_payload("a.pdf"), "gpt", "db1", "a.pdf")
+    queue.enqueue(_payload("b.pdf"), "gpt", "db2", "b.pdf")
+    queue.enqueue(_payload("c.pdf", "gemini"), "gemini", "db1", "c.pdf")
+    queue.enqueue(_payload("d.pdf", "gemini"), "gemini", "db2", "d.pdf")
+
+    claimed = [queue.claim_next()["file_name"], queue.claim_next()["file_name"]]
+    # b.pdf waits for the gpt slot and c.pdf for the db1 slot
+    assert claimed == ["a.pdf", "d.pdf"]
+    assert queue.claim_next() is None
+    assert queue.count_active_jobs() == {"Queued": 2, "Running": 2}
+
+
+def test_jobs_fail_when_their_credentials_are_lost_on_restart(tmp_path, monkeypatch):
+    # Environment credentials for the same database are not substituted for the user's own
+    monkeypatch.setenv("NEO4J_URI", "neo4j://localhost")
+    monkeypatch.setenv("NEO4J_PASSWORD", "environment")
+    monkeypatch.setenv("NEO4J_DATABASE", "neo4j")
+    path = str(tmp_path / "jobs.sqlite")
+    queue = JobQueue(path)
+    running = queue.enqueue({**_payload("a.pdf"), "uri": "neo4j://localhost", "database": "neo4j"}, "gpt", "db1", "a.pdf")
+    queue.claim_next()
+    assert queue.get_job(running)["status"] == RUNNING
+    queued = queue.enqueue({**_payload("b.pdf"), "database": "movies"}, "gpt", "db2", "b.pdf")
+
+    restarted = JobQueue(path)
+    assert restarted.recover() == 0
+    assert restarted.claim_next() is None
+    for job_id in (running, queued):
+        job = restarted.get_job(job_id)
+        assert job["status"] == FAILED
+        assert job["error"] == RESUBMIT_MESSAGE
+
+
+def test_running_jobs_are_requeued_when_their_credentials_are_known(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    job_id = queue.enqueue(_payload("a.pdf"), "gpt", "db1", "a.pdf")
+    queue.claim_next()
+    assert queue.recover() == 1
+    job = queue.claim_next()
+    assert job["job_id"] == job_id
+    assert job["payload"]["password"] == _payload("a.pdf")["password"]
+
+
+def test_workers_process_queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), max_workers=2, poll_interval=0.01)
+
+    async def handler(payload):
+        await asyncio.sleep(0.01)
+        if payload["file_name"] == "bad.pdf":
+            return {"status": "Failed", "error": "LLM unable to parse content"}
+        return {"status": "Success", "data": {"fileName": payload["file_name"]}}
+
+    async def run():
+        queue.start(handler)
+        ids = [queue.enqueue(_payload(name), "gpt", "db1", name) for name in ("a.pdf", "bad.pdf", "c.pdf")]
+        for _ in range(200):
+            if all(queue.get_job(job_id)["status"] not in (QUEUED, RUNNING) for job_id in ids):
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return [queue.get_job(job_id) for job_id in ids]
+
+    jobs = asyncio.run(run())
+    assert [job["status"] for job in jobs] == [COMPLETED, FAILED, COMPLETED]
+    assert jobs[0]["result"]["data"]["fileName"] == "a.pdf"
+    assert jobs[1]["error"] == "LLM unable to parse content"
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-model registry of chat clients returned by get_llm
+"""
+
+import pytest
+
+pytest.importorskip("langchain_openai")
+pytest.importorskip("langchain_experimental")
+
+from src import llm
+
+
+@pytest.fixture
+def built(monkeypatch):
+    built = []
+
+    def create_llm(model, env_value):
+        client = object()
+        built.append((model, env_value, client))
+        return client, env_value.split(",")[0]
+
+    monkeypatch.setattr(llm, "create_llm", create_llm)
+    monkeypatch.setattr(llm, "_llm_clients", {})
+    monkeypatch.setenv("LLM_MODEL_CONFIG_openai_gpt_4o", "gpt-4o,key")
+    monkeypatch.setenv("LLM_MODEL_CONFIG_groq_llama3_70b", "llama3-70b,key")
+    return built
+
+
+def test_client_is_reused_for_the_same_config(built):
+    first = llm.get_llm("openai_gpt_4o")
+    assert llm.get_llm(" OpenAI_GPT_4o ") == first
+    assert first[1] == "gpt-4o"
+    assert llm.get_llm("groq_llama3_70b") != first
+    assert [model for model, _, _ in built] == ["openai_gpt_4o", "groq_llama3_70b"]
+
+
+def test_client_is_rebuilt_when_the_config_changes(built, monkeypatch):
+    first, _ = llm.get_llm("openai_gpt_4o")
+    monkeypatch.setenv("LLM_MODEL_CONFIG_openai_gpt_4o", "gpt-4o-mini,key")
+    second, model_name = llm.get_llm("openai_gpt_4o")
+    assert second is not first
+    assert model_name == "gpt-4o-mini"
+    assert llm.get_llm("openai_gpt_4o")[0] is second
+    assert len(built) == 2
+
+
+def test_missing_config_raises(built):
+    with pytest.raises(Exception, match="LLM_MODEL_CONFIG_no_such_model"):
+        llm.get_llm("no_such_model")
+    assert built == []
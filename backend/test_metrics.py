@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Tests for the Prometheus metrics helpers
+"""
+
+import pytest
+
+pytest.importorskip("prometheus_client")
+
+from prometheus_client import REGISTRY
+
+from src.shared.metrics import get_query_name, record_deadlock_retry, render_metrics, time_neo4j_query
+
+
+def _sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def run_query_helper(query_name=None):
+    return get_query_name(query_name)
+
+
+def test_query_name_defaults_to_the_caller_of_the_helper():
+    def update_document_counts():
+        return run_query_helper()
+
+    assert update_document_counts() == "update_document_counts"
+    assert run_query_helper("recount_documents") == "recount_documents"
+
+
+def test_neo4j_query_latency_errors_and_deadlock_retries_are_recorded():
+    labels = {"query": "test_write"}
+    count_before = _sample("neo4j_query_duration_seconds_count", labels)
+    errors_before = _sample("neo4j_query_errors_total", labels)
+    with time_neo4j_query("test_write"):
+        pass
+    with pytest.raises(RuntimeError):
+        with time_neo4j_query("test_write"):
+            raise RuntimeError("failed")
+    record_deadlock_retry("test_write")
+    assert _sample("neo4j_query_duration_seconds_count", labels) == count_before + 2
+    assert _sample("neo4j_query_errors_total", labels) == errors_before + 1
+    assert _sample("neo4j_deadlock_retries_total", labels) >= 1
+    content, content_type = render_metrics()
+    assert b'neo4j_query_duration_seconds_bucket{query="test_write",le="0.005"}' in content
+    assert content_type.startswith("text/plain")
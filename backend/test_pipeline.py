@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Tests for the staged chunk-batch pipeline used by processing_source
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from src.shared.pipeline import PipelineStage, run_pipeline
+
+
+def _sleeping_stage(name, delay, seen):
+    async def stage(item):
+        await asyncio.sleep(delay)
+        seen.append((name, item))
+        return item
+    return PipelineStage(name, stage)
+
+
+def test_items_keep_order_through_every_stage():
+    seen = []
+    stages = [_sleeping_stage(name, 0.001, seen) for name in ("embed", "extract", "save")]
+    asyncio.run(run_pipeline(range(5), stages))
+    for name in ("embed", "extract", "save"):
+        assert [item for stage, item in seen if stage == name] == list(range(5))
+
+
+def test_stages_overlap():
+    stages = [_sleeping_stage(name, 0.05, []) for name in ("embed", "extract", "save", "link")]
+    start = time.time()
+    busy = asyncio.run(run_pipeline(range(4), stages))
+    elapsed = time.time() - start
+    # Sequential execution would take 4 items * 4 stages * 0.05s = 0.8s
+    assert elapsed < 0.6
+    assert set(busy) == {"embed", "extract", "save", "link"}
+
+
+def test_async_source_can_stop_early():
+    async def source():
+        for i in range(10):
+            if i == 3:
+                return
+            yield i
+
+    seen = []
+    asyncio.run(run_pipeline(source(), [_sleeping_stage("count", 0, seen)]))
+    assert [item for _, item in seen] == [0, 1, 2]
+
+
+def test_stage_error_is_raised():
+    async def failing(item):
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        asyncio.run(run_pipeline(range(3), [_sleeping_stage("embed", 0, []), PipelineStage("extract", failing)]))
+
+
+def test_items_waiting_between_stages_are_discarded_on_cancellation():
+    discarded = []
+
+    async def blocked(item):
+        await asyncio.sleep(10)
+
+    async def main():
+        task = asyncio.ensure_future(run_pipeline(range(10), [_sleeping_stage("embed", 0, []), PipelineStage("extract", blocked)],
+                                                  on_discard=lambda item, error: discarded.append((item, type(error)))))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    # Item 0 is inside the extract stage, 1 waits in its queue, 2 is held by the embed worker, 3 waits in
+    # front of embed and 4 is held by the feeder
+    assert sorted(item for item, _ in discarded) == [1, 2, 3, 4]
+    assert {error for _, error in discarded} == {asyncio.CancelledError}
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-process extraction progress bus
+"""
+
+import asyncio
+import threading
+
+from src.shared.progress_bus import ProgressBus
+
+
+def test_publish_merges_fields_and_bounds_tracked_files():
+    bus = ProgressBus(max_tracked_files=2)
+    bus.publish("a.pdf", status="Processing", processed_chunk=0)
+    bus.publish("a.pdf", processed_chunk=20)
+    assert bus.get("a.pdf") == (2, {"status": "Processing", "processed_chunk": 20})
+    bus.publish("b.pdf", status="Processing")
+    bus.publish("c.pdf", status="Processing")
+    assert bus.get("a.pdf") == (0, {})
+
+
+def test_subscriber_is_woken_by_publish_from_another_thread():
+    bus = ProgressBus()
+
+    async def run():
+        waiting = asyncio.ensure_future(bus.wait_for_update("a.pdf", 0, timeout=5))
+        await asyncio.sleep(0.01)
+        publisher = threading.Thread(target=bus.publish, args=("a.pdf",), kwargs={"status": "Completed"})
+        publisher.start()
+        update = await waiting
+        publisher.join()
+        return update
+
+    assert asyncio.run(run()) == (1, {"status": "Completed"})
+    assert not bus._subscribers
+
+
+def test_wait_returns_newer_state_immediately_and_none_on_timeout():
+    bus = ProgressBus()
+    bus.publish("a.pdf", status="Processing")
+
+    async def run():
+        newer = await bus.wait_for_update("a.pdf", 0, timeout=5)
+        timed_out = await bus.wait_for_update("a.pdf", newer[0], timeout=0.01)
+        return newer, timed_out
+
+    newer, timed_out = asyncio.run(run())
+    assert newer == (1, {"status": "Processing"})
+    assert timed_out is None
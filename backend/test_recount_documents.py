@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Tests for the partitioned recount of every Document's nodes and relationships
+"""
+
+import threading
+
+import pytest
+
+pytest.importorskip("neo4j")
+pytest.importorskip("langchain_neo4j")
+
+from src.graphDB_dataAccess import graphDBdataAccess
+from src.shared.constants import DOCUMENT_COUNTS_WRITE_QUERY, NODEREL_COUNT_QUERY_FOR_DOCUMENTS
+
+
+class FakeGraph:
+    def __init__(self, filenames):
+        self.filenames = filenames
+        self.partitions = []
+        self.writes = []
+        self._database = "neo4j"
+        self._lock = threading.Lock()
+
+    def query(self, query, params=None, session_params=None):
+        if query == NODEREL_COUNT_QUERY_FOR_DOCUMENTS:
+            with self._lock:
+                self.partitions.append(params["filenames"])
+            # Chunk counts grow with the number in the file name so that every document has its own counts
+            return [{"filename": filename, "chunkNodeCount": int(filename[0]) + 1, "chunkRelCount": 2 * int(filename[0]) + 1,
+                     "entityNodeCount": 3, "entityEntityRelCount": 1, "communityNodeCount": None, "communityRelCount": 0}
+                    for filename in params["filenames"]]
+        if query == "CALL db.labels":
+            return [{"label": "Document"}, {"label": "__Community__"}]
+        if query == DOCUMENT_COUNTS_WRITE_QUERY:
+            self.writes.append(params["rows"])
+            return []
+        return [{"filename": filename} for filename in self.filenames]
+
+
+def test_documents_are_counted_in_partitions_and_written_once():
+    graph = FakeGraph([f"{index}.pdf" for index in range(7)])
+    progress = []
+    response = graphDBdataAccess(graph).recount_documents(partition_size=3, max_concurrency=2,
+                                                          progress_callback=lambda done, total: progress.append((done, total)))
+
+    assert sorted(len(partition) for partition in graph.partitions) == [1, 3, 3]
+    assert sorted(filename for partition in graph.partitions for filename in partition) == sorted(graph.filenames)
+    assert sorted(response) == sorted(graph.filenames)
+    assert response["4.pdf"] == {"chunkNodeCount": 5, "chunkRelCount": 9, "entityNodeCount": 3, "entityEntityRelCount": 1,
+                                 "communityNodeCount": 0, "communityRelCount": 0, "nodeCount": 8, "relationshipCount": 10}
+    assert len(graph.writes) == 1
+    assert {row["filename"]: row["nodeCount"] for row in graph.writes[0]} == {filename: counts["nodeCount"] for filename, counts in response.items()}
+    assert [total for _, total in progress] == [7, 7, 7]
+    assert progress[-1][0] == 7
+
+
+def test_recounting_all_documents_reports_progress():
+    graph = FakeGraph([f"{index}.pdf" for index in range(4)])
+    progress = []
+    response = graphDBdataAccess(graph).update_node_relationship_count("", progress_callback=lambda done, total: progress.append((done, total)))
+    assert sorted(response) == sorted(graph.filenames)
+    assert progress[-1] == (4, 4)
+
+
+def test_no_documents_writes_nothing():
+    graph = FakeGraph([])
+    assert graphDBdataAccess(graph).recount_documents(partition_size=3) == {}
+    assert graph.partitions == []
+    assert graph.writes == []
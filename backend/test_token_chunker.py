@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tests for the token-array chunker used by CreateChunksofDocument
+"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("tiktoken")
+
+from src.shared.token_chunker import TokenArrayChunker
+
+
+class CharEncoding:
+    """One token per character, so windows are easy to reason about."""
+
+    def encode_ordinary(self, text):
+        return [ord(char) for char in text]
+
+    def decode(self, tokens):
+        return "".join(chr(token) for token in tokens)
+
+
+def reference_split(text, chunk_size, chunk_overlap):
+    # Window loop of langchain's split_text_on_tokens
+    input_ids = CharEncoding().encode_ordinary(text)
+    splits = []
+    start_idx = 0
+    cur_idx = min(start_idx + chunk_size, len(input_ids))
+    while start_idx < len(input_ids):
+        splits.append(CharEncoding().decode(input_ids[start_idx:cur_idx]))
+        if cur_idx == len(input_ids):
+            break
+        start_idx += chunk_size - chunk_overlap
+        cur_idx = min(start_idx + chunk_size, len(input_ids))
+    return splits
+
+
+@pytest.mark.parametrize("length", [0, 1, 9, 10, 11, 25, 26, 100])
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(10, 0), (10, 3), (10, 9)])
+def test_windows_match_token_text_splitter(length, chunk_size, chunk_overlap):
+    text = "".join(chr(ord("a") + i % 26) for i in range(length))
+    chunker = TokenArrayChunker(chunk_size, chunk_overlap, encoding=CharEncoding())
+    assert chunker.split_text(text) == reference_split(text, chunk_size, chunk_overlap)
+
+
+def test_max_chunks_limits_decoded_windows():
+    chunker = TokenArrayChunker(10, 2, encoding=CharEncoding())
+    assert chunker.split_text("x" * 100, max_chunks=3) == ["x" * 10] * 3
+
+
+def test_overlap_must_be_smaller_than_chunk_size():
+    with pytest.raises(ValueError):
+        TokenArrayChunker(10, 10, encoding=CharEncoding())
+
+
+def test_same_chunks_as_token_text_splitter():
+    text_splitters = pytest.importorskip("langchain_text_splitters")
+    text = "The quick brown fox jumps over the lazy dog. " * 200
+    expected = text_splitters.TokenTextSplitter(chunk_size=50, chunk_overlap=10).split_text(text)
+    assert TokenArrayChunker(50, 10).split_text(text) == expected
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Tests for span tracing and its OTLP/JSON export
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from src.shared.tracing import NOOP_SPAN, FileSpanExporter, Tracer, current_span
+
+
+class RecordingExporter:
+    def __init__(self):
+        self.requests = []
+
+    def export(self, request):
+        self.requests.append(request)
+
+    @property
+    def spans(self):
+        return [span for request in self.requests
+                for resource_spans in request["resourceSpans"]
+                for scope_spans in resource_spans["scopeSpans"]
+                for span in scope_spans["spans"]]
+
+
+def test_spans_nest_across_tasks_and_threads():
+    exporter = RecordingExporter()
+    tracer = Tracer([exporter], export_interval=0.01)
+
+    async def run():
+        with tracer.span("extract", {"file_name": "a.pdf"}):
+            batch_span = tracer.start_span("extract.batch", {"chunks": 2})
+            with tracer.span("extract.embed", parent=batch_span):
+                await asyncio.to_thread(lambda: tracer.start_span("extract.embed_request").end())
+            batch_span.end()
+            await asyncio.ensure_future(asyncio.sleep(0))
+
+    asyncio.run(run())
+    tracer.flush()
+    spans = {span["name"]: span for span in exporter.spans}
+    assert set(spans) == {"extract", "extract.batch", "extract.embed", "extract.embed_request"}
+    assert len({span["traceId"] for span in spans.values()}) == 1
+    assert "parentSpanId" not in spans["extract"]
+    assert spans["extract.batch"]["parentSpanId"] == spans["extract"]["spanId"]
+    assert spans["extract.embed"]["parentSpanId"] == spans["extract.batch"]["spanId"]
+    assert spans["extract.embed_request"]["parentSpanId"] == spans["extract.embed"]["spanId"]
+    assert spans["extract.batch"]["attributes"] == [{"key": "chunks", "value": {"intValue": "2"}}]
+    assert int(spans["extract"]["endTimeUnixNano"]) >= int(spans["extract"]["startTimeUnixNano"])
+    assert current_span() is NOOP_SPAN
+
+
+def test_failed_block_sets_error_status():
+    exporter = RecordingExporter()
+    tracer = Tracer([exporter])
+    with pytest.raises(ValueError):
+        with tracer.span("extract.save"):
+            raise ValueError("write failed")
+    tracer.flush()
+    assert exporter.spans[0]["status"] == {"code": 2, "message": "ValueError: write failed"}
+
+
+def test_disabled_tracer_returns_noop_spans():
+    tracer = Tracer([RecordingExporter()], enabled=False)
+    with tracer.span("extract") as span:
+        span.set_attributes(chunks=1)
+        assert span is NOOP_SPAN
+    assert not Tracer([]).enabled
+
+
+def test_file_exporter_writes_one_otlp_request_per_line(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer([FileSpanExporter(str(path))], service_name="test-service")
+    with tracer.span("chat.retrieval", {"documents": 3, "mode": "vector"}):
+        pass
+    tracer.flush()
+    request = json.loads(path.read_text().splitlines()[0])
+    resource_spans = request["resourceSpans"][0]
+    assert resource_spans["resource"]["attributes"] == [{"key": "service.name", "value": {"stringValue": "test-service"}}]
+    span = resource_spans["scopeSpans"][0]["spans"][0]
+    assert span["name"] == "chat.retrieval"
+    assert len(span["traceId"]) == 32 and len(span["spanId"]) == 16